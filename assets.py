@@ -0,0 +1,61 @@
+"""
+🖼️ COVENANT COMMAND CENTER - STATIC ASSETS
+Bundled logo, favicon and stylesheet, prepared once per process
+
+Everything is read from files shipped next to the app (no network), and
+the logo is decoded and downsized to display size a single time. Reruns
+get the cached bytes back, so no click re-reads or re-decodes an image.
+"""
+
+import io
+import os
+
+import streamlit as st
+
+ASSET_DIR = os.path.dirname(os.path.abspath(__file__))
+LOGO_PATH = os.path.join(ASSET_DIR, "logo.jpg")
+STYLESHEET_PATH = os.path.join(ASSET_DIR, "styles.css")
+
+LOGO_WIDTH = 120  # sidebar display width in pixels
+FAVICON_SIZE = 64
+FALLBACK_ICON = "🏦"  # page icon when the logo file is missing
+
+
+def _thumbnail(path, size, image_format):
+    """Image file downsized to fit size x size pixels, as encoded bytes"""
+    from PIL import Image  # only needed the first time each asset is prepared
+
+    with Image.open(path) as image:
+        image = image.convert("RGB")
+        image.thumbnail((size, size))
+        buffer = io.BytesIO()
+        image.save(buffer, format=image_format)
+    return buffer.getvalue()
+
+
+@st.cache_resource(show_spinner=False)
+def logo_image():
+    """Sidebar logo as JPEG bytes at twice the display width (sharp on high-DPI screens); None if missing"""
+    try:
+        return _thumbnail(LOGO_PATH, LOGO_WIDTH * 2, "JPEG")
+    except OSError:
+        return None
+
+
+@st.cache_resource(show_spinner=False)
+def page_icon():
+    """Favicon as PNG bytes, or an emoji when the logo file is missing"""
+    try:
+        return _thumbnail(LOGO_PATH, FAVICON_SIZE, "PNG")
+    except OSError:
+        return FALLBACK_ICON
+
+
+@st.cache_resource(show_spinner=False)
+def stylesheet():
+    """The app's custom CSS as a <style> block ('' if the file is missing)"""
+    try:
+        with open(STYLESHEET_PATH, encoding="utf-8") as f:
+            return f"<style>\n{f.read()}</style>"
+    except OSError:
+        return ""
@@ -0,0 +1,197 @@
+"""
+⏱️ COVENANT COMMAND CENTER - PAGE LATENCY BENCHMARK
+Times every page's data-loading path on synthetic portfolios of increasing size
+
+For each portfolio size a fresh database is generated, then every case is
+timed cold (result cache cleared) and warm (served from cache). Results are
+written as JSON so runs can be diffed and regressions caught in CI.
+
+Usage:
+    python benchmark.py --sizes 1000 10000 100000 --output benchmark_report.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import tempfile
+import time
+from datetime import datetime
+
+import covenant_engine
+import database
+import exports
+import portfolio_data
+import portfolio_generator
+import query_builder
+import query_cache
+import snapshot_worker
+
+DEFAULT_SIZES = [1_000, 10_000, 100_000]
+
+
+def _deep_page_cursor(db_path, query, depth):
+    """Cursor of the row `depth` rows into a paginated query (setup, not timed)"""
+    sql, params = query.build(limit=depth)
+    df = portfolio_data.load_data(db_path, sql, params)
+    return query_builder.cursor_of(df.iloc[-1]) if len(df) else None
+
+
+def build_cases(db_path, page_size=50):
+    """(page, case name, callable) for every data-loading path the pages run"""
+    load = portfolio_data.load_data
+    default_covenants = query_builder.covenant_status_query(
+        statuses=["BREACH", "AT_RISK", "COMPLIANT"], covenant_types=["Financial"],
+    )
+    one_loan = load(db_path, "SELECT deal_name FROM loan_agreements ORDER BY loan_id LIMIT 1")
+    single_loan_covenants = query_builder.covenant_status_query(
+        statuses=["BREACH", "AT_RISK", "COMPLIANT"],
+        deal_names=one_loan['deal_name'].tolist(),
+        covenant_types=["Financial"],
+    )
+    default_alerts = query_builder.alert_groups_query(alert_types=["BREACH", "WARNING"])
+    active_alerts = query_builder.alert_groups_query(alert_types=["BREACH", "WARNING"], status="Active")
+    alert_details = query_builder.alert_details_query(1, "BREACH")
+    deep_covenant_cursor = _deep_page_cursor(db_path, default_covenants, page_size * 100)
+    deep_alert_cursor = _deep_page_cursor(db_path, default_alerts, page_size * 100)
+    this_month = portfolio_data.rollup_month()
+    year_ago = portfolio_data.rollup_month(365)
+
+    def page(query, after=None):
+        return lambda: load(db_path, *query.build(after=after, limit=page_size + 1))
+
+    def count(query):
+        return lambda: load(db_path, *query.build_count(10_000))
+
+    def export(query, fmt):
+        def run():
+            path, rows = exports.export_query(db_path, *query.build(), fmt=fmt)
+            os.remove(path)
+            return rows
+        return run
+
+    return [
+        ("Sidebar", "portfolio_stats", lambda: portfolio_data.get_portfolio_stats(db_path)),
+        ("Sidebar", "snapshot_build", lambda: snapshot_worker.read_snapshot(db_path)),
+        ("Dashboard", "banner_status", lambda: portfolio_data.get_banner_status(db_path)),
+        ("Dashboard", "breach_details", lambda: load(
+            db_path, portfolio_data.BREACH_DETAILS_QUERY, [portfolio_data.BANNER_DETAIL_ROWS])),
+        ("Dashboard", "missing_data_details", lambda: load(
+            db_path, portfolio_data.MISSING_DATA_QUERY, [portfolio_data.BANNER_DETAIL_ROWS])),
+        ("Dashboard", "covenant_table", lambda: load(db_path, portfolio_data.DASHBOARD_COVENANTS_QUERY)),
+        ("Dashboard", "recent_alerts", lambda: load(db_path, portfolio_data.RECENT_ALERTS_QUERY)),
+        ("Covenant Status", "loan_filter_options", lambda: load(db_path, portfolio_data.LOAN_NAMES_QUERY)),
+        ("Covenant Status", "default_filters_first_page", page(default_covenants)),
+        ("Covenant Status", "default_filters_page_100", page(default_covenants, deep_covenant_cursor)),
+        ("Covenant Status", "single_loan_filter", page(single_loan_covenants)),
+        ("Covenant Status", "count_estimate", count(default_covenants)),
+        ("Covenant Status", "csv_export", export(default_covenants, 'csv')),
+        ("Covenant Status", "parquet_export", export(default_covenants, 'parquet')),
+        ("Alerts", "summary_counts", lambda: load(db_path, portfolio_data.ALERT_SUMMARY_QUERY)),
+        ("Alerts", "all_statuses_first_page", page(default_alerts)),
+        ("Alerts", "all_statuses_page_100", page(default_alerts, deep_alert_cursor)),
+        ("Alerts", "active_first_page", page(active_alerts)),
+        ("Alerts", "count_estimate", count(default_alerts)),
+        ("Alerts", "group_details", lambda: load(db_path, *alert_details.build(limit=50))),
+        ("Upload Data", "active_loan_selector", lambda: load(db_path, portfolio_data.ACTIVE_LOANS_QUERY)),
+        ("Upload Data", "loan_test_history", lambda: load(db_path, portfolio_data.LOAN_TEST_HISTORY_QUERY, [1])),
+        ("Analytics", "compliance_trend_last_year", lambda: portfolio_data.get_compliance_trend(db_path, year_ago, this_month)),
+        ("Analytics", "covenant_types", lambda: load(db_path, portfolio_data.COVENANT_TYPE_QUERY)),
+        ("Analytics", "breaches_by_borrower", lambda: load(db_path, portfolio_data.BREACHES_BY_BORROWER_QUERY, [year_ago])),
+    ]
+
+
+def _rows(result):
+    """Row count of a case result (DataFrame, row count, dict or other)"""
+    if isinstance(result, int):
+        return result
+    return len(result) if hasattr(result, '__len__') and not isinstance(result, dict) else 1
+
+
+def time_case(db_path, func, repeat):
+    """Median cold (cache cleared) and warm (cached) latency in milliseconds"""
+    cache = query_cache.get_cache(db_path)
+    cold, warm = [], []
+    rows = 0
+    for _ in range(repeat):
+        cache.clear()
+        start = time.perf_counter()
+        result = func()
+        cold.append((time.perf_counter() - start) * 1000)
+        rows = _rows(result)
+
+        start = time.perf_counter()
+        func()
+        warm.append((time.perf_counter() - start) * 1000)
+    return {
+        'cold_ms': round(statistics.median(cold), 3),
+        'warm_ms': round(statistics.median(warm), 3),
+        'cold_max_ms': round(max(cold), 3),
+        'rows': rows,
+    }
+
+
+def run_size(loans, workdir, repeat, covenants_per_loan, quarters, seed):
+    """Generate one portfolio size and time every case against it"""
+    db_path = os.path.join(workdir, f"benchmark_{loans}.db")
+    start = time.perf_counter()
+    counts = portfolio_generator.generate_portfolio(
+        db_path, loans=loans, covenants_per_loan=covenants_per_loan, quarters=quarters, seed=seed,
+    )
+    generate_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    covenant_engine.backfill_history(db_path)
+    history_seconds = time.perf_counter() - start
+
+    cases = {}
+    for page, name, func in build_cases(db_path):
+        result = cases[f"{page} / {name}"] = dict(page=page, **time_case(db_path, func, repeat))
+        print(f"  {loans:>9,} loans  {page:<16} {name:<28} "
+              f"cold {result['cold_ms']:>9.2f} ms  warm {result['warm_ms']:>7.3f} ms")
+
+    database.get_pool(db_path).close()
+    return {
+        'generate_seconds': round(generate_seconds, 2),
+        'history_seconds': round(history_seconds, 2),
+        'db_bytes': os.path.getsize(db_path),
+        'rows': counts,
+        'cases': cases,
+    }
+
+
+def run_benchmark(sizes=DEFAULT_SIZES, repeat=5, covenants_per_loan=4, quarters=8, seed=42, workdir=None):
+    """Run the full suite and return the report dictionary"""
+    report = {
+        'generated_at': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'sqlite': sqlite3.sqlite_version,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'sizes': {},
+    }
+    with tempfile.TemporaryDirectory(dir=workdir) as tmp:
+        for loans in sizes:
+            report['sizes'][str(loans)] = run_size(loans, tmp, repeat, covenants_per_loan, quarters, seed)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark page data-loading latency")
+    parser.add_argument("--sizes", type=int, nargs="+", default=DEFAULT_SIZES, help="portfolio sizes (loans)")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--covenants-per-loan", type=int, default=4)
+    parser.add_argument("--quarters", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--workdir", default=None, help="where to build the temporary databases")
+    parser.add_argument("--output", default="benchmark_report.json")
+    args = parser.parse_args()
+
+    report = run_benchmark(
+        sizes=args.sizes, repeat=args.repeat, covenants_per_loan=args.covenants_per_loan,
+        quarters=args.quarters, seed=args.seed, workdir=args.workdir,
+    )
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
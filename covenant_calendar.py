@@ -0,0 +1,123 @@
+"""
+📅 COVENANT COMMAND CENTER - COVENANT TEST CALENDAR
+Test frequency, reporting lag and next test date for every covenant
+
+A covenant is tested once per period of its frequency, `reporting_lag_days`
+after the period closes (when the compliance certificate is due). Period
+ends follow the calendar: quarters end in Mar/Jun/Sep/Dec, half-years in
+Jun/Dec, years in Dec. Each test run rolls the tested covenants' next test
+date forward to the period after the one tested. Dashboard lookups are
+range queries on a partial index of next_test_date; "how many are due"
+is read from covenant_tests_due, a per-day count kept current by triggers.
+"""
+
+import json
+from datetime import date, timedelta
+
+TEST_FREQUENCIES = {'Monthly': 1, 'Quarterly': 3, 'Semi-Annual': 6, 'Annual': 12}  # months per period
+DEFAULT_FREQUENCY = 'Quarterly'
+DEFAULT_REPORTING_LAG_DAYS = 45
+
+UPCOMING_TESTS_LIMIT = 10  # rows listed per banner section
+
+# Active covenants due in a date range, soonest first (params: from, to, limit)
+UPCOMING_TESTS_QUERY = """
+    SELECT l.deal_name, c.covenant_name, c.covenant_type, c.test_frequency, c.next_test_date
+    FROM covenants c
+    JOIN loan_agreements l ON l.loan_id = c.loan_id
+    WHERE c.is_active = 1 AND c.next_test_date BETWEEN ? AND ?
+    ORDER BY c.next_test_date, c.covenant_id
+    LIMIT ?
+"""
+
+# Number of active covenants due in a date range (one row per day in the range)
+TESTS_DUE_COUNT_QUERY = """
+    SELECT IFNULL(SUM(covenant_count), 0)
+    FROM covenant_tests_due
+    WHERE test_date BETWEEN ? AND ?
+"""
+
+NEXT_TEST_DATE_QUERY = """
+    SELECT MIN(next_test_date) FROM covenants
+    WHERE is_active = 1 AND next_test_date >= ?
+"""
+
+
+def month_end(year, month):
+    """Last day of a month"""
+    return date(year + month // 12, month % 12 + 1, 1) - timedelta(days=1)
+
+
+def period_end(period):
+    """Last day of a 'YYYY-QN' reporting period"""
+    year, quarter = period.split('-Q')
+    return month_end(int(year), int(quarter) * 3)
+
+
+def first_due_date(frequency, lag_days, on_or_after):
+    """Earliest test date on or after a day for a covenant's frequency and reporting lag"""
+    step = TEST_FREQUENCIES.get(frequency, TEST_FREQUENCIES[DEFAULT_FREQUENCY])
+    lag = timedelta(days=DEFAULT_REPORTING_LAG_DAYS if lag_days is None else int(lag_days))
+    # Periods closing on or after this day are the ones still to be tested
+    closes_after = on_or_after - lag
+    month = ((closes_after.month - 1) // step + 1) * step
+    return month_end(closes_after.year, month) + lag
+
+
+def due_date_after(period, frequency, lag_days):
+    """Test date of the first period after a tested reporting period"""
+    lag = DEFAULT_REPORTING_LAG_DAYS if lag_days is None else int(lag_days)
+    return first_due_date(frequency, lag, period_end(period) + timedelta(days=lag + 1))
+
+
+def roll_forward(conn, tested):
+    """Move tested covenants' next test date past the period they were tested for; returns rows moved"""
+    # tested: covenant_id, reporting_period, test_frequency and reporting_lag_days per covenant
+    if tested.empty:
+        return 0
+    moved = 0
+    # One date per (period, frequency, lag) - a handful of UPDATEs however large the run
+    groups = tested.groupby(['reporting_period', 'test_frequency', 'reporting_lag_days'])
+    for (period, frequency, lag_days), group in groups:
+        next_date = due_date_after(period, frequency, lag_days).isoformat()
+        ids = json.dumps([int(covenant_id) for covenant_id in group['covenant_id']])
+        # Never move a date backwards (a restated older quarter leaves the schedule alone)
+        moved += conn.execute("""
+            UPDATE covenants SET next_test_date = ?
+            WHERE covenant_id IN (SELECT value FROM json_each(?))
+            AND (next_test_date IS NULL OR next_test_date < ?)
+        """, (next_date, ids, next_date)).rowcount
+    return moved
+
+
+def schedule_unscheduled(conn, today=None):
+    """Give active covenants without a next test date their first upcoming one; returns rows scheduled"""
+    today = today or date.today()
+    groups = conn.execute("""
+        SELECT DISTINCT test_frequency, reporting_lag_days FROM covenants
+        WHERE next_test_date IS NULL AND is_active = 1
+    """).fetchall()
+    scheduled = 0
+    for frequency, lag_days in groups:
+        scheduled += conn.execute("""
+            UPDATE covenants SET next_test_date = ?
+            WHERE next_test_date IS NULL AND is_active = 1
+            AND test_frequency IS ? AND reporting_lag_days IS ?
+        """, (first_due_date(frequency, lag_days, today).isoformat(), frequency, lag_days)).rowcount
+    return scheduled
+
+
+def upcoming_tests(cursor, days, today=None, limit=UPCOMING_TESTS_LIMIT):
+    """(count, first rows) of active covenants due in the next `days` days, today included"""
+    today = today or date.today()
+    bounds = (today.isoformat(), (today + timedelta(days=days)).isoformat())
+    count = cursor.execute(TESTS_DUE_COUNT_QUERY, bounds).fetchone()[0]
+    rows = cursor.execute(UPCOMING_TESTS_QUERY, bounds + (limit,)).fetchall() if count else []
+    return count, rows
+
+
+def next_test_date(cursor, today=None):
+    """Soonest upcoming test date in the book (None if nothing is scheduled)"""
+    today = today or date.today()
+    value = cursor.execute(NEXT_TEST_DATE_QUERY, (today.isoformat(),)).fetchone()[0]
+    return date.fromisoformat(value) if value else None
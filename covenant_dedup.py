@@ -0,0 +1,232 @@
+"""
+🧹 COVENANT COMMAND CENTER - COVENANT DEDUPLICATION
+Decides which statement of each covenant a loan is monitored against
+
+An agreement states the same covenant several times - the covenant
+section, a summary table, a footnote that modifies it - and amendments
+restate it again. Extracted candidates, together with the loan's active
+covenants from other documents, are blocked on (loan, standard name):
+one dict pass groups them, so only statements of the same covenant are
+ever compared and thousands of hits resolve in near-linear time.
+
+Each block keeps one statement:
+  1. the newest document (by effective date) wins - amendments supersede;
+  2. within a document, table > footnote > main text;
+  3. then the later upload, then the earliest page.
+An undated document can't be ranked against dated ones, so it is refused
+for a loan that already has dated statements. Every statement dropped is
+written to covenant_dedup_log with the statement that beat it and why;
+re-extracting a document doesn't log the same decision again.
+"""
+
+import time
+from datetime import datetime
+
+import covenant_engine
+
+# Source authority within one document (higher wins); manual/unknown rows rank lowest
+AUTHORITY = {'table': 3, 'footnote': 2, 'text': 1}
+
+# Active covenants of a loan from other documents (params: loan_id, source_document)
+EXISTING_COVENANTS_QUERY = """
+    SELECT covenant_id, canonical_name, source_document, source_date, source_section, source_page,
+           threshold_text, threshold_operator, threshold_value, threshold_unit
+    FROM covenants
+    WHERE loan_id = ? AND is_active = 1 AND source_document IS NOT ?
+"""
+
+# Whether a loan has active statements from dated documents other than this one (params: loan_id, source_document)
+DATED_STATEMENTS_QUERY = """
+    SELECT EXISTS (
+        SELECT 1 FROM covenants
+        WHERE loan_id = ? AND is_active = 1 AND source_date IS NOT NULL AND source_document IS NOT ?
+    ) AS dated
+"""
+
+# Latest logged decision for each dropped statement of a loan (params: loan_id twice)
+LATEST_DECISIONS_QUERY = """
+    SELECT canonical_name, dropped_source, dropped_threshold, kept_source, kept_threshold, reason
+    FROM covenant_dedup_log
+    WHERE loan_id = ? AND log_id IN (
+        SELECT MAX(log_id) FROM covenant_dedup_log WHERE loan_id = ? GROUP BY canonical_name, dropped_source
+    )
+"""
+
+# One loan's dedup decisions, newest first (param: loan_id)
+DEDUP_LOG_QUERY = """
+    SELECT
+        datetime(decided_at, 'unixepoch', 'localtime') AS 'Decided',
+        canonical_name AS 'Covenant',
+        kept_threshold AS 'Kept',
+        kept_source AS 'Kept From',
+        dropped_threshold AS 'Dropped',
+        dropped_source AS 'Dropped From',
+        reason AS 'Reason'
+    FROM covenant_dedup_log
+    WHERE loan_id = ?
+    ORDER BY decided_at DESC, log_id DESC
+    LIMIT 200
+"""
+
+
+def rank(candidate):
+    """Sort key of a statement - the highest in a block is kept"""
+    return (
+        candidate.get('source_date') or '',
+        AUTHORITY.get(candidate.get('section'), 0),
+        candidate.get('upload_order', 0),
+        -(candidate.get('page') or 0),
+    )
+
+
+def block(candidates):
+    """{(loan_id, standard name): [candidates]} - hash blocking, one pass"""
+    blocks = {}
+    for candidate in candidates:
+        blocks.setdefault((candidate['loan_id'], candidate['covenant_name']), []).append(candidate)
+    return blocks
+
+
+def _where(candidate):
+    """'Credit Agreement.pdf p.12 (table)' for log rows and reasons"""
+    where = candidate.get('source_document') or 'manual entry'
+    if candidate.get('page'):
+        where += f" p.{candidate['page']}"
+    if candidate.get('section'):
+        where += f" ({candidate['section']})"
+    return where
+
+
+def reason(kept, dropped):
+    """Why one statement of a covenant was kept over another"""
+    if (kept.get('source_date') or '') != (dropped.get('source_date') or ''):
+        return f"superseded by a newer document ({kept.get('source_date')})"
+    kept_authority = AUTHORITY.get(kept.get('section'), 0)
+    dropped_authority = AUTHORITY.get(dropped.get('section'), 0)
+    if kept_authority != dropped_authority:
+        return f"{kept.get('section')} outranks {dropped.get('section') or 'manual entry'}"
+    if kept.get('upload_order', 0) != dropped.get('upload_order', 0):
+        return "superseded by a later upload"
+    if kept['threshold_text'] == dropped['threshold_text']:
+        return "same covenant restated"
+    return f"first statement is on page {kept.get('page')}"
+
+
+def resolve(candidates):
+    """[(kept, [(dropped, reason)])] - one entry per (loan, standard name) block"""
+    resolved = []
+    for group in block(candidates).values():
+        kept = max(group, key=rank)
+        resolved.append((kept, [(other, reason(kept, other)) for other in group if other is not kept]))
+    return resolved
+
+
+def dedupe(covenants):
+    """Kept statements of one document's detections, in page order (no database)"""
+    for covenant in covenants:
+        covenant.setdefault('loan_id', None)
+        covenant.setdefault('threshold_text', covenant_engine.format_threshold(
+            covenant['operator'], covenant['value'], covenant['unit']))
+    kept = [kept for kept, _ in resolve(covenants)]
+    return sorted(kept, key=lambda covenant: covenant['page'])
+
+
+def _existing_candidates(conn, loan_id, source_document):
+    """The loan's active covenants from other documents, as candidates"""
+    return [
+        {
+            'loan_id': loan_id, 'covenant_id': covenant_id, 'covenant_name': canonical_name,
+            'source_document': document, 'source_date': source_date, 'section': section, 'page': page,
+            'threshold_text': threshold_text, 'operator': operator, 'value': value, 'unit': unit,
+            'upload_order': 0,
+        }
+        for (covenant_id, canonical_name, document, source_date, section, page,
+             threshold_text, operator, value, unit) in conn.execute(EXISTING_COVENANTS_QUERY, (loan_id, source_document))
+        if canonical_name
+    ]
+
+
+def apply(conn, loan_id, source_document, covenants, source_date=None):
+    """Dedupe a document's detections against the loan and write the kept statements (inside a transaction)"""
+    loan_id = int(loan_id)
+    if source_date is None and conn.execute(DATED_STATEMENTS_QUERY, (loan_id, source_document)).fetchone()[0]:
+        # Undated, it would lose to every dated document - including ones it amends
+        raise ValueError("This loan already has covenants from dated documents - "
+                         "enter the document's effective date so it can be ranked against them")
+    now = datetime.now().isoformat()
+    candidates = [
+        dict(covenant, loan_id=loan_id, source_document=source_document, source_date=source_date, upload_order=1,
+             threshold_text=covenant_engine.format_threshold(covenant['operator'], covenant['value'], covenant['unit']))
+        for covenant in covenants
+    ]
+    # Rows saved from an earlier extraction of this same document are replaced, not competed with
+    previous = dict(conn.execute("""
+        SELECT canonical_name, covenant_id FROM covenants
+        WHERE loan_id = ? AND source_document = ?
+    """, (loan_id, source_document)).fetchall())
+
+    summary = {'inserted': 0, 'updated': 0, 'superseded': 0, 'dropped': 0, 'outranked': 0}
+    log = []
+    logged = set(conn.execute(LATEST_DECISIONS_QUERY, (loan_id, loan_id)).fetchall())
+    for kept, dropped in resolve(_existing_candidates(conn, loan_id, source_document) + candidates):
+        if not kept.get('upload_order') and not any(other.get('upload_order') for other, _ in dropped):
+            continue  # this document doesn't state the covenant - existing rows are left alone
+        name = kept['covenant_name']
+        previous_id = previous.get(name)
+        if kept.get('upload_order'):
+            kept['covenant_id'] = _write(conn, loan_id, source_document, source_date, kept, previous_id, now)
+            summary['updated' if previous_id is not None else 'inserted'] += 1
+        else:
+            # Another document's statement wins - this document's earlier row stops being monitored
+            summary['outranked'] += 1
+            if previous_id is not None:
+                conn.execute("UPDATE covenants SET is_active = 0, updated_at = ? WHERE covenant_id = ? AND is_active = 1",
+                             (now, previous_id))
+
+        for other, why in dropped:
+            if other.get('covenant_id') is not None:
+                # An older document's statement - keep the row for history, stop monitoring it
+                conn.execute("UPDATE covenants SET is_active = 0, updated_at = ? WHERE covenant_id = ?",
+                             (now, other['covenant_id']))
+                summary['superseded'] += 1
+            summary['dropped'] += 1
+            decision = (name, _where(other), other['threshold_text'], _where(kept), kept['threshold_text'], why)
+            if decision in logged:
+                continue  # same decision as last time this statement was dropped
+            log.append((
+                int(time.time()), loan_id, name, source_document,
+                kept['covenant_id'], _where(kept), kept['threshold_text'],
+                other.get('covenant_id'), _where(other), other['threshold_text'], why,
+            ))
+    conn.executemany("""
+        INSERT INTO covenant_dedup_log
+        (decided_at, loan_id, canonical_name, source_document,
+         kept_covenant_id, kept_source, kept_threshold,
+         dropped_covenant_id, dropped_source, dropped_threshold, reason)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, log)
+    return summary
+
+
+def _write(conn, loan_id, source_document, source_date, covenant, covenant_id, now):
+    """Insert or update the covenants row holding a kept statement; returns its covenant_id"""
+    values = (
+        covenant['threshold_text'], covenant['operator'], covenant['value'], covenant['unit'],
+        covenant['page'], covenant['section'], source_date, now,
+    )
+    if covenant_id is not None:
+        conn.execute("""
+            UPDATE covenants
+            SET threshold_text = ?, threshold_operator = ?, threshold_value = ?, threshold_unit = ?,
+                source_page = ?, source_section = ?, source_date = ?, updated_at = ?, is_active = 1
+            WHERE covenant_id = ?
+        """, values + (covenant_id,))
+        return covenant_id
+    return conn.execute("""
+        INSERT INTO covenants
+        (threshold_text, threshold_operator, threshold_value, threshold_unit,
+         source_page, source_section, source_date, updated_at,
+         loan_id, covenant_name, canonical_name, covenant_type, current_value, compliance_status,
+         is_active, source_document)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, 'Financial', 'N/A', 'NOT_TESTED', 1, ?)
+    """, values + (loan_id, covenant['covenant_name'], covenant['covenant_name'], source_document)).lastrowid
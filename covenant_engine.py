@@ -0,0 +1,484 @@
+"""
+🧮 COVENANT COMMAND CENTER - COVENANT TESTING ENGINE
+Tests every active covenant against reported financials in one vectorized pass
+
+Ratios are computed column-wise for all loans at once, matched to covenants
+by metric, and turned into verdicts with the same headroom rule as the
+`numeric_status` column (BREACH below the limit, AT_RISK within
+covenant_parser.AT_RISK_HEADROOM of it). Only covenants whose value or
+status actually changed are written back; covenants of loans that have not
+reported for the tested period are left as they are. Status transitions
+raise alerts (BREACH, WARNING, or INFO when a covenant recovers).
+
+Every verdict is also appended to covenant_test_results, one row per
+covenant per reporting period, so what a covenant tested at in any quarter
+stays on record after `covenants` moves on. A re-test that changes a
+period's verdict (restated financials) adds a new revision - earlier
+verdicts are never overwritten. Tested covenants' next test
+dates are rolled forward to the following period (see covenant_calendar).
+
+Usage:
+    python covenant_engine.py covenant_demo.db [--period 2025-Q4]
+    python covenant_engine.py covenant_demo.db --backfill-history
+    python covenant_engine.py covenant_demo.db --prune-history 12
+"""
+
+import argparse
+import json
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+import covenant_calendar
+import covenant_parser
+import database
+import migrations
+
+# Metric tested by a covenant, matched on its name (first match wins)
+METRIC_PATTERNS = [
+    ('leverage', r'leverage|debt\s*(?:to|/)\s*ebitda'),
+    ('interest_coverage', r'interest\s+coverage'),
+    ('current_ratio', r'current\s+ratio'),
+    ('net_worth', r'net\s+worth'),
+    ('ebitda', r'ebitda'),
+]
+
+# Tested when a loan has no covenants the engine can evaluate
+DEFAULT_COVENANTS = pd.DataFrame([
+    ('Maximum Leverage Ratio', '≤ 4.50x', '<=', 4.5, 'x'),
+    ('Minimum Interest Coverage', '≥ 3.00x', '>=', 3.0, 'x'),
+    ('Minimum Current Ratio', '≥ 1.20x', '>=', 1.2, 'x'),
+], columns=['covenant_name', 'threshold_text', 'threshold_operator', 'threshold_value', 'threshold_unit'])
+
+# Alert raised when a re-test moves a covenant into a status: (alert_type, message)
+TRANSITION_ALERTS = {
+    'BREACH': ('BREACH', '{name} breach detected: {actual} (Limit: {threshold})'),
+    'AT_RISK': ('WARNING', '{name} approaching threshold: {actual} (Limit: {threshold})'),
+    'COMPLIANT': ('INFO', '{name} back in compliance: {actual} (Limit: {threshold})'),
+}
+
+FINANCIAL_COLUMNS = ['total_debt', 'ebitda', 'interest_expense', 'current_assets', 'current_liabilities', 'net_worth']
+
+# One reporting period per loan (latest upload wins if a period was sent twice)
+FINANCIALS_QUERY = """
+    SELECT loan_id, reporting_period, total_debt, ebitda, interest_expense,
+           current_assets, current_liabilities, net_worth
+    FROM (
+        SELECT f.*, ROW_NUMBER() OVER (
+            PARTITION BY f.loan_id ORDER BY f.financial_id DESC
+        ) AS rn
+        FROM financial_data f
+        WHERE f.reporting_period = ?
+    )
+    WHERE rn = 1
+"""
+
+# Latest reported period of each loan in a JSON array of loan ids (two index seeks per loan)
+LOANS_LATEST_FINANCIALS_QUERY = """
+    SELECT f.loan_id, f.reporting_period, f.total_debt, f.ebitda, f.interest_expense,
+           f.current_assets, f.current_liabilities, f.net_worth
+    FROM json_each(?) j
+    JOIN financial_data f ON f.loan_id = j.value
+    AND f.reporting_period = (SELECT MAX(reporting_period) FROM financial_data WHERE loan_id = j.value)
+"""
+
+LOANS_COVENANTS_QUERY = """
+    SELECT covenant_id, loan_id, covenant_name, compliance_status,
+           threshold_operator, threshold_value, threshold_unit, actual_value,
+           test_frequency, reporting_lag_days
+    FROM covenants
+    WHERE is_active = 1 AND loan_id IN (SELECT value FROM json_each(?))
+"""
+
+# Only the columns the engine needs - this reads every active covenant
+ACTIVE_COVENANTS_QUERY = """
+    SELECT covenant_id, loan_id, covenant_name, compliance_status,
+           threshold_operator, threshold_value, threshold_unit, actual_value,
+           test_frequency, reporting_lag_days
+    FROM covenants
+    WHERE is_active = 1
+"""
+
+LOAN_COVENANTS_QUERY = """
+    SELECT covenant_id, loan_id, covenant_name, threshold_text, compliance_status,
+           threshold_operator, threshold_value, threshold_unit, actual_value,
+           test_frequency, reporting_lag_days
+    FROM covenants
+    WHERE is_active = 1 AND loan_id = ?
+"""
+
+# Insert only: a re-test adds the period's next revision, and only if the verdict changed
+HISTORY_INSERT_SQL = """
+    INSERT INTO covenant_test_results
+    (reporting_period, covenant_id, revision, loan_id, tested_value, headroom, status, tested_at)
+    SELECT ?1, ?2, IFNULL(latest.revision, 0) + 1, ?3, ?4, ?5, ?6, ?7
+    FROM (SELECT 1)
+    LEFT JOIN (
+        SELECT revision, tested_value, status FROM covenant_test_results
+        WHERE reporting_period = ?1 AND covenant_id = ?2
+        ORDER BY revision DESC LIMIT 1
+    ) latest
+    WHERE latest.revision IS NULL OR latest.tested_value IS NOT ?4 OR latest.status IS NOT ?6
+"""
+
+
+def _ratio(numerator, denominator):
+    """Element-wise ratio; NaN where the denominator is not positive"""
+    numerator = np.asarray(numerator, dtype=float)
+    denominator = np.asarray(denominator, dtype=float)
+    out = np.full(numerator.shape, np.nan)
+    np.divide(numerator, denominator, out=out, where=denominator > 0)
+    return out
+
+
+def compute_metrics(financials):
+    """Every covenant metric for every row of financials (one column per metric)"""
+    metrics = pd.DataFrame(index=financials.index)
+    metrics['loan_id'] = financials['loan_id']
+    metrics['leverage'] = _ratio(financials['total_debt'], financials['ebitda'])
+    metrics['interest_coverage'] = _ratio(financials['ebitda'], financials['interest_expense'])
+    metrics['current_ratio'] = _ratio(financials['current_assets'], financials['current_liabilities'])
+    metrics['ebitda'] = financials['ebitda'].astype(float)
+    metrics['net_worth'] = financials['net_worth'].astype(float)
+    return metrics
+
+
+def classify_metrics(covenant_names):
+    """Metric name for each covenant name (None when it isn't a tested metric)"""
+    # A book has few distinct covenant names - match each once, then map
+    names = pd.Series(covenant_names.dropna().unique())
+    lowered = names.str.lower()
+    conditions = [lowered.str.contains(pattern, regex=True) for _, pattern in METRIC_PATTERNS]
+    metrics = np.select(conditions, [metric for metric, _ in METRIC_PATTERNS], default=None)
+    return covenant_names.map(dict(zip(names, metrics)))
+
+
+def verdicts(operators, thresholds, actuals):
+    """(headroom, status) arrays using the same rule as the numeric_status column"""
+    operators = np.asarray(operators, dtype=object)
+    thresholds = np.asarray(thresholds, dtype=float)
+    actuals = np.asarray(actuals, dtype=float)
+
+    upper = np.isin(operators, ['<=', '<'])
+    lower = np.isin(operators, ['>=', '>'])
+    strict = np.isin(operators, ['<', '>'])
+    scale = np.abs(thresholds)
+    valid = (upper | lower) & (scale > 0) & ~np.isnan(actuals)
+
+    headroom = np.full(actuals.shape, np.nan)
+    np.divide(np.where(upper, thresholds - actuals, actuals - thresholds), scale, out=headroom, where=valid)
+
+    status = np.select(
+        [~valid, (headroom < 0) | ((headroom == 0) & strict), headroom < covenant_parser.AT_RISK_HEADROOM],
+        [None, 'BREACH', 'AT_RISK'],
+        default='COMPLIANT',
+    )
+    return headroom, status
+
+
+def evaluate(covenants, financials):
+    """Test covenants against financials; returns the covenants with metric, actual_value, headroom and status"""
+    results = covenants.copy()
+    results['metric'] = classify_metrics(results['covenant_name'])
+
+    # Long format (loan_id, metric, value) so each covenant joins to exactly its own metric
+    values = compute_metrics(financials).melt(id_vars='loan_id', var_name='metric', value_name='tested_value')
+    results = results.merge(values, on=['loan_id', 'metric'], how='left')
+
+    headroom, status = verdicts(results['threshold_operator'], results['threshold_value'], results['tested_value'])
+    results['headroom'] = headroom
+    results['tested_status'] = status
+    return results
+
+
+def format_value(value, unit):
+    """Display text for a tested value, in the covenant's unit ('N/A' when it couldn't be computed)"""
+    if value is None or not np.isfinite(value):
+        return 'N/A'
+    if unit == '$':
+        return f"${value:,.0f}"
+    if unit == '%':
+        return f"{value:.1f}%"
+    return f"{value:.2f}x"
+
+
+def latest_period(conn):
+    """Most recent reporting period in the book"""
+    return conn.execute("SELECT MAX(reporting_period) FROM financial_data").fetchone()[0]
+
+
+def load_inputs(conn, period=None):
+    """Active covenants and the financials for a period (default: the latest) to test them against"""
+    if period is None:
+        period = latest_period(conn)
+    covenants = pd.read_sql_query(ACTIVE_COVENANTS_QUERY, conn)
+    financials = pd.read_sql_query(FINANCIALS_QUERY, conn, params=(period,))
+    return covenants, financials
+
+
+def changed_results(results):
+    """Tested covenants whose value or status differs from what is stored"""
+    tested = results[results['tested_status'].notna()]
+    value_changed = ~np.isclose(tested['tested_value'], tested['actual_value'].astype(float), equal_nan=False)
+    return tested[value_changed | (tested['tested_status'] != tested['compliance_status'])]
+
+
+def write_results(conn, results):
+    """Bulk-write changed verdicts back to covenants; returns rows updated"""
+    changed = changed_results(results)
+    if changed.empty:
+        return 0
+    now = datetime.now().isoformat()
+    rows = [
+        (value, format_value(value, unit), status, now, int(covenant_id))
+        for covenant_id, value, unit, status in zip(
+            changed['covenant_id'], changed['tested_value'], changed['threshold_unit'], changed['tested_status'],
+        )
+    ]
+    conn.executemany("""
+        UPDATE covenants
+        SET actual_value = ?, current_value = ?, compliance_status = ?, updated_at = ?
+        WHERE covenant_id = ?
+    """, rows)
+    return len(rows)
+
+
+def tested_periods(results, financials):
+    """Tested covenants with the reporting period each was tested for"""
+    tested = results[results['tested_status'].notna()]
+    periods = financials.drop_duplicates('loan_id').set_index('loan_id')['reporting_period']
+    return tested.assign(reporting_period=tested['loan_id'].map(periods))
+
+
+def write_history(conn, tested):
+    """Append tested verdicts (see tested_periods) to covenant_test_results; returns rows written"""
+    if tested.empty:
+        return 0
+    periods = tested['reporting_period']
+    headroom = tested['headroom'].astype(object).where(tested['headroom'].notna(), None)
+    now = int(time.time())
+    rows = [
+        (period, int(covenant_id), int(loan_id), float(value), room, status, now)
+        for period, covenant_id, loan_id, value, room, status in zip(
+            periods, tested['covenant_id'], tested['loan_id'], tested['tested_value'], headroom,
+            tested['tested_status'],
+        )
+    ]
+    changes_before = conn.total_changes
+    conn.executemany(HISTORY_INSERT_SQL, rows)
+    written = conn.total_changes - changes_before  # unchanged re-tests insert nothing
+    if written:
+        # One generation bump per write instead of a per-row trigger on a table this size
+        conn.execute("UPDATE data_generation SET generation = generation + 1 WHERE generation_id = 1")
+    return written
+
+
+def format_threshold(operator, value, unit):
+    """Display text for a parsed threshold, e.g. '≤ 4.50x'"""
+    symbol = {'<=': '≤', '>=': '≥'}.get(operator, operator)
+    return f"{symbol} {format_value(value, unit)}"
+
+
+def transition_alerts(results):
+    """(loan_id, alert_type, message) for every covenant whose status changed"""
+    tested = results[results['tested_status'].notna()]
+    moved = tested[tested['tested_status'] != tested['compliance_status']]
+    # Returning to compliance is only news after a breach or warning
+    moved = moved[(moved['tested_status'] != 'COMPLIANT') | moved['compliance_status'].isin(['BREACH', 'AT_RISK'])]
+
+    alerts = []
+    for row in moved.itertuples(index=False):
+        alert_type, template = TRANSITION_ALERTS[row.tested_status]
+        alerts.append((int(row.loan_id), alert_type, template.format(
+            name=row.covenant_name,
+            actual=format_value(row.tested_value, row.threshold_unit),
+            threshold=format_threshold(row.threshold_operator, row.threshold_value, row.threshold_unit),
+        )))
+    return alerts
+
+
+def insert_alerts(conn, alerts):
+    """Insert Active alerts for status transitions; returns alerts inserted"""
+    now = datetime.now().isoformat()
+    conn.executemany("""
+        INSERT INTO alerts (loan_id, alert_type, message, status, created_at)
+        VALUES (?, ?, ?, 'Active', ?)
+    """, [(loan_id, alert_type, message, now) for loan_id, alert_type, message in alerts])
+    return len(alerts)
+
+
+def run_portfolio_test(db_path, period=None):
+    """Test the whole book in one transaction; returns a summary of the run"""
+    start = time.perf_counter()
+    with database.transaction(db_path) as conn:
+        covenants, financials = load_inputs(conn, period)
+        results = evaluate(covenants, financials)
+        alerts = insert_alerts(conn, transition_alerts(results))
+        updated = write_results(conn, results)
+        tested = tested_periods(results, financials)
+        write_history(conn, tested)
+        rescheduled = covenant_calendar.roll_forward(conn, tested)
+
+    return {
+        'covenants': len(results),
+        'tested': len(tested),
+        'updated': updated,
+        'rescheduled': rescheduled,
+        'alerts': alerts,
+        'breaches': int((results['tested_status'] == 'BREACH').sum()),
+        'at_risk': int((results['tested_status'] == 'AT_RISK').sum()),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def retest_loans(db_path, loan_ids, batch_size=5000):
+    """Re-test the given loans against each one's latest period, one transaction per batch of loans"""
+    loan_ids = sorted({int(loan_id) for loan_id in loan_ids})
+    summary = {'loans': len(loan_ids), 'tested': 0, 'updated': 0, 'alerts': 0}
+    for start in range(0, len(loan_ids), batch_size):
+        batch = json.dumps(loan_ids[start:start + batch_size])
+        with database.transaction(db_path) as conn:
+            covenants = pd.read_sql_query(LOANS_COVENANTS_QUERY, conn, params=(batch,))
+            financials = pd.read_sql_query(LOANS_LATEST_FINANCIALS_QUERY, conn, params=(batch,))
+            results = evaluate(covenants, financials)
+            summary['alerts'] += insert_alerts(conn, transition_alerts(results))
+            summary['updated'] += write_results(conn, results)
+            tested = tested_periods(results, financials)
+            write_history(conn, tested)
+            covenant_calendar.roll_forward(conn, tested)
+        summary['tested'] += int(results['tested_status'].notna().sum())
+    return summary
+
+
+def _loan_financials_frame(loan_id, financials):
+    """One-row financials frame from a dict of entered values"""
+    return pd.DataFrame([{'loan_id': int(loan_id), **{c: financials[c] for c in FINANCIAL_COLUMNS}}])
+
+
+def _tested_or_defaults(results, loan_id, financials):
+    """Covenants the engine can test, or the default covenants when the loan has none"""
+    tested = results[results['metric'].notna()]
+    if tested.empty:
+        tested = evaluate(DEFAULT_COVENANTS.assign(loan_id=int(loan_id)), financials)
+    # A ratio over a zero or negative denominator has no value - shown as not tested, never as NaN
+    return tested.assign(tested_status=tested['tested_status'].fillna('NOT_TESTED'))
+
+
+def evaluate_loan_financials(db_path, loan_id, financials):
+    """Test one loan's active covenants (or the defaults) against entered financials, without saving"""
+    with database.connection(db_path) as conn:
+        covenants = pd.read_sql_query(LOAN_COVENANTS_QUERY, conn, params=(int(loan_id),))
+
+    financials = _loan_financials_frame(loan_id, financials)
+    return _tested_or_defaults(evaluate(covenants, financials), loan_id, financials)
+
+
+def record_financials(db_path, loan_id, period, financials):
+    """Save one loan's financials for a period and re-test only that loan's covenants, in one transaction"""
+    loan_id = int(loan_id)
+    frame = _loan_financials_frame(loan_id, financials)
+    with database.transaction(db_path) as conn:
+        conn.execute(f"""
+            INSERT INTO financial_data
+            (loan_id, reporting_period, {', '.join(FINANCIAL_COLUMNS)}, upload_date)
+            VALUES (?, ?, {', '.join('?' for _ in FINANCIAL_COLUMNS)}, ?)
+            ON CONFLICT(loan_id, reporting_period) DO UPDATE SET
+            {', '.join(f"{c} = excluded.{c}" for c in FINANCIAL_COLUMNS)}, upload_date = excluded.upload_date
+        """, [loan_id, period] + [float(financials[c]) for c in FINANCIAL_COLUMNS] + [datetime.now().isoformat()])
+
+        latest = conn.execute(
+            "SELECT MAX(reporting_period) FROM financial_data WHERE loan_id = ?", (loan_id,)
+        ).fetchone()[0]
+        covenants = pd.read_sql_query(LOAN_COVENANTS_QUERY, conn, params=(loan_id,))
+        results = evaluate(covenants, frame)
+        # Restated quarters go into the history too - that's what the audit trail is for
+        tested = tested_periods(results, frame.assign(reporting_period=period))
+        write_history(conn, tested)
+        covenant_calendar.roll_forward(conn, tested)
+
+        # A restated older quarter is stored without overwriting current statuses
+        alerts, updated = [], 0
+        is_latest = period == latest
+        if is_latest:
+            alerts = transition_alerts(results)
+            insert_alerts(conn, alerts)
+            updated = write_results(conn, results)
+
+    return {
+        'results': _tested_or_defaults(results, loan_id, frame),
+        'updated': updated,
+        'alerts': alerts,
+        'is_latest': is_latest,
+    }
+
+
+def backfill_history(db_path, periods=None):
+    """Record test results for stored periods (default: all) without touching current statuses"""
+    with database.connection(db_path) as conn:
+        if periods is None:
+            periods = [row[0] for row in conn.execute(
+                "SELECT DISTINCT reporting_period FROM financial_data ORDER BY reporting_period"
+            )]
+        covenants = pd.read_sql_query(ACTIVE_COVENANTS_QUERY, conn)
+
+    written = {}
+    for period in periods:
+        # One transaction per period
+        with database.transaction(db_path) as conn:
+            financials = pd.read_sql_query(FINANCIALS_QUERY, conn, params=(period,))
+            written[period] = write_history(conn, tested_periods(evaluate(covenants, financials), financials))
+    return written
+
+
+def history_periods(conn, limit=None):
+    """Recorded periods, newest first (one index seek per period rather than a scan)"""
+    periods = []
+    period = conn.execute("SELECT MAX(reporting_period) FROM covenant_test_results").fetchone()[0]
+    while period is not None and (limit is None or len(periods) < limit):
+        periods.append(period)
+        period = conn.execute(
+            "SELECT MAX(reporting_period) FROM covenant_test_results WHERE reporting_period < ?", (period,)
+        ).fetchone()[0]
+    return periods
+
+
+def prune_history(db_path, keep_periods):
+    """Delete test results older than the newest keep_periods periods; returns rows deleted"""
+    if keep_periods < 1:
+        raise ValueError("keep_periods must be at least 1")
+    with database.transaction(db_path) as conn:
+        kept = history_periods(conn, keep_periods)
+        if len(kept) < keep_periods:
+            return 0
+        # Periods lead the primary key, so this is a range delete off the front of the table
+        deleted = conn.execute(
+            "DELETE FROM covenant_test_results WHERE reporting_period < ?", (kept[-1],)
+        ).rowcount
+        if deleted:
+            conn.execute("UPDATE data_generation SET generation = generation + 1 WHERE generation_id = 1")
+    return deleted
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test every active covenant against reported financials")
+    parser.add_argument("db_path")
+    parser.add_argument("--period", default=None, help="reporting period to test (default: the latest)")
+    parser.add_argument("--backfill-history", action="store_true",
+                        help="record test results for every stored period instead of running a test")
+    parser.add_argument("--prune-history", type=int, metavar="PERIODS", default=None,
+                        help="keep only the newest PERIODS periods of test results")
+    args = parser.parse_args()
+
+    migrations.migrate(args.db_path)
+    if args.backfill_history:
+        written = backfill_history(args.db_path)
+        print(f"Recorded {sum(written.values()):,} results across {len(written)} periods")
+    elif args.prune_history is not None:
+        print(f"Pruned {prune_history(args.db_path, args.prune_history):,} test results")
+    else:
+        summary = run_portfolio_test(args.db_path, args.period)
+        print(f"Tested {summary['tested']:,} of {summary['covenants']:,} covenants in {summary['seconds']}s: "
+              f"{summary['updated']:,} updated, {summary['alerts']:,} alerts, "
+              f"{summary['breaches']:,} breaches, {summary['at_risk']:,} at risk")
@@ -0,0 +1,164 @@
+"""
+🗺️ COVENANT COMMAND CENTER - COVENANT NAME MAPPING
+Normalizes the many ways agreements name a covenant to one standard name
+
+covenant_mapping.csv maps every known variant ("Total Net Leverage",
+"FCCR", "Net Debt to EBITDA") to a standard covenant name. The terms are
+compiled once per process into a word trie expressed as a single regular
+expression - terms that share leading words share one branch - so a page
+is normalized in one left-to-right pass of the regex engine, however many
+terms the table has. Matches are leftmost-longest on word boundaries;
+spaces, line breaks and hyphens between words are interchangeable.
+
+Usage:
+    python covenant_mapping.py covenant_demo.db   # backfill canonical_name
+"""
+
+import argparse
+import csv
+import functools
+import hashlib
+import os
+import re
+import threading
+
+import database
+
+MAPPING_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "covenant_mapping.csv")
+
+_TOKEN = re.compile(r'[a-z0-9]+|/')
+_END = ''  # trie key marking the end of a term
+
+
+def _tokens(text):
+    """Words of a term or matched text, as the trie sees them"""
+    return tuple(_TOKEN.findall(text.lower()))
+
+
+def _separator(previous, token):
+    # Words need a gap between them; '/' may touch its neighbours ('Debt/EBITDA')
+    return r'[\s\-]+' if previous != '/' and token != '/' else r'[\s\-]*'
+
+
+def _trie_pattern(node, previous=None):
+    """Regex for the terms below a trie node - longer continuations first, so matches are longest"""
+    branches = []
+    for token in sorted((key for key in node if key != _END), key=lambda key: (-len(key), key)):
+        child = node[token]
+        branch = (_separator(previous, token) if previous else '') + re.escape(token)
+        if any(key != _END for key in child):
+            rest = f'(?:{_trie_pattern(child, token)})'
+            branch += rest + '?' if _END in child else rest
+        branches.append(branch)
+    return '|'.join(branches)
+
+
+def load_mapping(path=MAPPING_PATH):
+    """{term: standard name} from the mapping table"""
+    mapping = {}
+    seen = {}
+    with open(path, newline='', encoding='utf-8') as f:
+        for row in csv.DictReader(f):
+            term, canonical = row['term'].strip(), row['canonical_name'].strip()
+            key = _tokens(term)
+            if not key or not canonical:
+                continue
+            if seen.get(key, canonical) != canonical:
+                raise ValueError(f"Mapping term '{term}' maps to both '{seen[key]}' and '{canonical}'")
+            seen[key] = canonical
+            mapping[term] = canonical
+    return mapping
+
+
+class CovenantMatcher:
+    """All mapping terms compiled into one matcher"""
+
+    def __init__(self, mapping, version=None):
+        self.canonical = {_tokens(term): canonical for term, canonical in mapping.items()}
+        self.names = sorted(set(self.canonical.values()))
+        self.version = version
+
+        trie = {}
+        for key in self.canonical:
+            node = trie
+            for token in key:
+                node = node.setdefault(token, {})
+            node[_END] = True
+        # Whole words only: not preceded or followed by a letter or digit
+        self.pattern = re.compile(rf'(?<![a-z0-9])(?:{_trie_pattern(trie)})(?![a-z0-9])', re.IGNORECASE)
+
+    def find_all(self, text, start=0):
+        """(start, end, standard name) of every covenant name in text, left to right"""
+        return [
+            (match.start(), match.end(), self.canonical[_tokens(match.group(0))])
+            for match in self.pattern.finditer(text, start)
+        ]
+
+    def search(self, text, start=0):
+        """First (start, end, standard name) in text at or after start, or None"""
+        match = self.pattern.search(text, start)
+        if match is None:
+            return None
+        return match.start(), match.end(), self.canonical[_tokens(match.group(0))]
+
+    def canonical_name(self, name):
+        """Standard name for a covenant name (its longest known term), or None if nothing matches"""
+        matches = self.find_all(name or '')
+        if not matches:
+            return None
+        return max(matches, key=lambda match: match[1] - match[0])[2]
+
+
+# One compiled matcher per process (extraction workers compile their own once)
+_matcher = None
+_matcher_lock = threading.Lock()
+
+
+def get_matcher():
+    """Process-wide matcher for the shipped mapping table"""
+    global _matcher
+    if _matcher is None:
+        with _matcher_lock:
+            if _matcher is None:
+                with open(MAPPING_PATH, 'rb') as f:
+                    version = hashlib.sha256(f.read()).hexdigest()[:16]
+                _matcher = CovenantMatcher(load_mapping(), version)
+    return _matcher
+
+
+@functools.lru_cache(maxsize=4096)
+def canonical_name(name):
+    """Standard name for a covenant name; the name as written when the table has no match"""
+    return get_matcher().canonical_name(name) or (re.sub(r'\s+', ' ', name).strip() if name else name)
+
+
+def backfill_canonical_names(conn, batch_size=5000, renormalize=False):
+    """Fill canonical_name for covenants not normalized yet (or all of them, after a mapping change)"""
+    rows = conn.execute(f"""
+        SELECT covenant_id, covenant_name FROM covenants
+        WHERE covenant_name IS NOT NULL {'' if renormalize else 'AND canonical_name IS NULL'}
+    """).fetchall()
+
+    # A book has few distinct names - match each once
+    names = {name: canonical_name(name) for name in {name for _, name in rows}}
+    updated = 0
+    for start in range(0, len(rows), batch_size):
+        batch = [(names[name], covenant_id, names[name]) for covenant_id, name in rows[start:start + batch_size]]
+        # Unchanged rows aren't rewritten (no trigger work, no cache invalidation)
+        updated += conn.executemany("""
+            UPDATE covenants SET canonical_name = ?
+            WHERE covenant_id = ? AND canonical_name IS NOT ?
+        """, batch).rowcount
+    return updated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fill covenants.canonical_name from the mapping table")
+    parser.add_argument("db_path")
+    parser.add_argument("--all", action="store_true", help="Re-normalize every covenant, not just new ones")
+    args = parser.parse_args()
+
+    with database.transaction(args.db_path) as conn:
+        updated = backfill_canonical_names(conn, renormalize=args.all)
+    print(f"Normalized {updated:,} covenant names "
+          f"({len(get_matcher().canonical)} terms -> {len(get_matcher().names)} standard names)")
@@ -0,0 +1,133 @@
+"""
+🔢 COVENANT COMMAND CENTER - THRESHOLD PARSER
+Turns free-text covenant thresholds and values into typed numeric columns
+
+'≤ 4.50x'       -> ('<=', 4.5, 'x')
+'≥ $5,000,000'  -> ('>=', 5000000.0, '$')
+'$6,200,000'    -> (6200000.0, '$')
+"""
+
+import re
+
+# Headroom (fraction of the threshold) below which a passing covenant is AT_RISK
+AT_RISK_HEADROOM = 0.10
+
+_OPERATORS = [
+    # Longest spellings first so '<=' wins over '<'
+    ('≤', '<='), ('<=', '<='), ('=<', '<='),
+    ('≥', '>='), ('>=', '>='), ('=>', '>='),
+    ('<', '<'), ('>', '>'),
+    ('not to exceed', '<='), ('not exceed', '<='), ('maximum', '<='), ('max', '<='), ('at most', '<='),
+    ('not less than', '>='), ('at least', '>='), ('minimum', '>='), ('min', '>='),
+]
+
+_NUMBER = re.compile(
+    r'(?P<currency>\$)?\s*(?P<number>-?\d[\d,]*(?:\.\d+)?|-?\.\d+)\s*'
+    r'(?:(?P<scale>million|billion|thousand|mm|bn|[kmb])(?![a-z]))?\s*(?P<unit>x|%|to\s*1(?:\.0+)?)?',
+    re.IGNORECASE,
+)
+
+_SCALES = {
+    'k': 1e3, 'thousand': 1e3,
+    'm': 1e6, 'mm': 1e6, 'million': 1e6,
+    'b': 1e9, 'bn': 1e9, 'billion': 1e9,
+}
+
+_MISSING_VALUES = {'', 'N/A', 'NA', 'NONE', '-', '—'}
+
+
+def parse_value(text):
+    """Parse a reported value like '5.20x' or '$6,200,000' into (value, unit)"""
+    if text is None:
+        return None, None
+    text = str(text).strip()
+    if text.upper() in _MISSING_VALUES:
+        return None, None
+
+    match = _NUMBER.search(text)
+    if not match:
+        return None, None
+
+    value = float(match.group('number').replace(',', ''))
+    scale = (match.group('scale') or '').lower()
+    value *= _SCALES.get(scale, 1)
+
+    unit_text = (match.group('unit') or '').lower()
+    if match.group('currency'):
+        unit = '$'
+    elif unit_text == '%':
+        unit = '%'
+    elif unit_text:  # 'x' or '4.50 to 1.00'
+        unit = 'x'
+    else:
+        unit = None
+    return value, unit
+
+
+def parse_threshold(text):
+    """Parse a threshold like '≤ 4.50x' into (operator, value, unit)"""
+    if text is None:
+        return None, None, None
+    stripped = str(text).strip()
+    lowered = stripped.lower()
+
+    operator = None
+    for token, normalized in _OPERATORS:
+        if lowered.startswith(token):
+            operator = normalized
+            stripped = stripped[len(token):]
+            break
+
+    value, unit = parse_value(stripped)
+    if value is None:
+        return None, None, None
+    return operator, value, unit
+
+
+def parsed_columns(threshold_text, current_value):
+    """Typed covenant columns for a threshold/value pair, ready for an UPDATE or INSERT"""
+    operator, threshold, unit = parse_threshold(threshold_text)
+    actual, actual_unit = parse_value(current_value)
+    return {
+        'threshold_operator': operator,
+        'threshold_value': threshold,
+        'threshold_unit': unit or actual_unit,
+        'actual_value': actual,
+    }
+
+
+def backfill_parsed_columns(conn, batch_size=5000):
+    """Fill the typed columns for covenants that have not been parsed yet"""
+    rows = conn.execute("""
+        SELECT covenant_id, threshold_text, current_value
+        FROM covenants
+        WHERE threshold_operator IS NULL AND threshold_text IS NOT NULL
+    """).fetchall()
+
+    updated = 0
+    for start in range(0, len(rows), batch_size):
+        batch = []
+        for covenant_id, threshold_text, current_value in rows[start:start + batch_size]:
+            cols = parsed_columns(threshold_text, current_value)
+            batch.append((
+                cols['threshold_operator'], cols['threshold_value'], cols['threshold_unit'],
+                cols['actual_value'], covenant_id,
+            ))
+        conn.executemany("""
+            UPDATE covenants
+            SET threshold_operator = ?, threshold_value = ?, threshold_unit = ?, actual_value = ?
+            WHERE covenant_id = ?
+        """, batch)
+        updated += len(batch)
+    return updated
+
+
+def refresh_compliance_status(conn):
+    """Re-derive compliance_status from the numeric columns for the whole portfolio in one statement"""
+    return conn.execute("""
+        UPDATE covenants
+        SET compliance_status = numeric_status
+        WHERE is_active = 1
+        AND numeric_status IS NOT NULL
+        AND compliance_status IS NOT numeric_status
+    """).rowcount
@@ -0,0 +1,156 @@
+"""
+🗄️ COVENANT COMMAND CENTER - DATABASE CONNECTIONS
+Process-wide SQLite connection pool shared by every page and every session
+
+Connections are opened once, tuned once (WAL, cache, mmap) and handed out
+to one script thread at a time, so a rerun never pays for connection setup.
+"""
+
+import atexit
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Pool sizing - one connection per concurrently running script thread
+POOL_SIZE = 8
+CHECKOUT_TIMEOUT = 10  # seconds to wait for a free connection before failing
+
+# Prepared statements kept per connection (sqlite3 LRU statement cache)
+STATEMENT_CACHE_SIZE = 256
+
+# Per-connection tuning applied once when the connection is opened
+CONNECTION_PRAGMAS = [
+    "PRAGMA journal_mode = WAL",        # readers never block the writer
+    "PRAGMA synchronous = NORMAL",      # safe with WAL, far fewer fsyncs
+    "PRAGMA cache_size = -32000",       # ~32MB page cache per connection
+    "PRAGMA mmap_size = 268435456",     # 256MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA busy_timeout = 5000",
+    "PRAGMA foreign_keys = ON",
+]
+
+
+class ConnectionPool:
+    """Thread-safe pool of long-lived, pre-tuned SQLite connections"""
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue(maxsize=size)
+        self._opened = 0
+        self._lock = threading.Lock()
+        self._all = []
+
+    def _open(self):
+        """Open and tune a new connection"""
+        conn = sqlite3.connect(
+            self.db_path,
+            check_same_thread=False,   # handed between script threads, never shared
+            isolation_level=None,      # autocommit; writes use transaction()
+            cached_statements=STATEMENT_CACHE_SIZE,
+        )
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def acquire(self):
+        """Check a connection out of the pool, opening one if under capacity"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    conn = self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+                self._all.append(conn)
+                return conn
+
+        try:
+            return self._idle.get(timeout=CHECKOUT_TIMEOUT)
+        except queue.Empty:
+            raise TimeoutError(f"No free database connection after {CHECKOUT_TIMEOUT}s")
+
+    def release(self, conn):
+        """Return a connection to the pool"""
+        if conn.in_transaction:
+            # Never hand a half-finished transaction to the next caller
+            conn.rollback()
+        self._idle.put_nowait(conn)
+
+    @contextmanager
+    def connection(self):
+        """Borrow a connection for the duration of a with-block"""
+        conn = self.acquire()
+        try:
+            yield conn
+        finally:
+            self.release(conn)
+
+    @contextmanager
+    def transaction(self):
+        """Borrow a connection and run the with-block as one write transaction"""
+        with self.connection() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def close(self):
+        """Close every connection the pool has opened"""
+        with self._lock:
+            for conn in self._all:
+                try:
+                    conn.close()
+                except sqlite3.Error:
+                    pass
+            self._all = []
+            self._opened = 0
+            self._idle = queue.LifoQueue(maxsize=self.size)
+
+
+# One pool per database file for the whole process (shared by all sessions)
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(db_path):
+    """Get the process-wide connection pool for a database file"""
+    pool = _pools.get(db_path)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(db_path)
+            if pool is None:
+                pool = ConnectionPool(db_path)
+                _pools[db_path] = pool
+    return pool
+
+
+def connection(db_path):
+    """Borrow a pooled connection: `with connection(db_path) as conn:`"""
+    return get_pool(db_path).connection()
+
+
+def transaction(db_path):
+    """Borrow a pooled connection inside a single write transaction"""
+    return get_pool(db_path).transaction()
+
+
+def close_all():
+    """Close all pooled connections (used at interpreter exit)"""
+    with _pools_lock:
+        for pool in _pools.values():
+            pool.close()
+        _pools.clear()
+
+
+atexit.register(close_all)
@@ -0,0 +1,497 @@
+"""
+📑 COVENANT COMMAND CENTER - DOCUMENT EXTRACTION
+Finds financial covenants in uploaded PDF and DOCX loan agreements
+
+Documents are split into pages. Each page's text, table rows and footnotes
+are extracted and scanned for covenants in a process pool with one worker
+per core, so every core reads a long agreement at once. Small documents
+are handled in-process, where starting workers would cost more than it saves.
+
+PDF text comes from pypdf (optional dependency). DOCX files are read with
+the standard library (zipfile + XML) and paginated on explicit and
+last-rendered page breaks. A covenant is a covenant name followed, in the
+same sentence or table row, by a threshold (operator and number). Names
+are found, and normalized to standard names, by the compiled mapping-table
+matcher (covenant_mapping) in one pass over each page.
+
+Each page's results are cached under a hash of its content
+(extraction_cache), so re-uploads and amended versions only extract the
+pages that changed.
+
+Usage:
+    python document_extraction.py agreement.pdf
+"""
+
+import argparse
+import atexit
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager
+from xml.etree import ElementTree
+
+import covenant_calendar
+import covenant_dedup
+import covenant_engine
+import covenant_mapping
+import covenant_parser
+import database
+import extraction_cache
+
+MAX_WORKERS = os.cpu_count() or 1
+PAGES_PER_TASK = 8  # pages a worker extracts per task (small enough for even progress)
+PARALLEL_MIN_PAGES = 16  # below this, extract in-process
+EVIDENCE_CHARS = 240
+EXTRACTOR_VERSION = 2  # bump when extraction or detection rules change - cached pages stop matching
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx')
+
+# Comparison phrases in agreement prose -> the operator of the limit they set
+_COMPARATORS = [
+    (r'not\s+(?:be\s+)?less\s+than|no\s+less\s+than|at\s+least|not\s+below|minimum\s+of', '>='),
+    (r'not\s+(?:be\s+)?(?:more|greater)\s+than|no\s+(?:more|greater)\s+than|at\s+most|not\s+to\s+exceed'
+     r'|maximum\s+of', '<='),
+    # "shall not permit X to exceed / to be less than" - the idiom names the failing side
+    (r'exceed|(?:more|greater)\s+than|in\s+excess\s+of|above', '<='),
+    (r'less\s+than|lower\s+than|below', '>='),
+]
+_COMPARATOR = re.compile('|'.join(f'(?P<c{i}>{pattern})' for i, (pattern, _) in enumerate(_COMPARATORS)), re.I)
+
+# A threshold number: ratio ('4.50 to 1.00', '4.50:1.00', '4.50x'), amount ('$5,000,000', '$5.0 million') or %
+_THRESHOLD = re.compile(
+    r'\$?\s*\d[\d,]*(?:\.\d+)?\s*(?:million|billion|thousand|mm|bn)?\s*(?:x|%|to\s*1(?:\.0+)?|:\s*1(?:\.0+)?)?',
+    re.IGNORECASE,
+)
+
+# Metrics stated in dollars (a bare number is a ratio otherwise)
+_DOLLAR_METRICS = ('net worth', 'ebitda', 'capital expenditures', 'liquidity')
+
+_FOOTNOTE_LINE = re.compile(r'^\s*(?:\(\d{1,2}\)|\[\d{1,2}\]|\d{1,2}[.)]?\s|\*{1,3}|†|‡)\s*\S')
+_SENTENCE_END = re.compile(r'[.;](?:\s|$)|\n\s*\n')  # a decimal point is followed by a digit
+_CELL_GAP = re.compile(r'\t+|\s{3,}')
+
+
+def _clean(text):
+    return re.sub(r'\s+', ' ', text).strip()
+
+
+def _default_operator(name):
+    """Operator implied by a standard covenant name when the text doesn't state one"""
+    return '<=' if name.startswith('Maximum') else '>='
+
+
+def _threshold_value(text, name):
+    """(value, unit) of the first threshold number in text, or (None, None)"""
+    for match in _THRESHOLD.finditer(text):
+        raw = match.group(0).strip()
+        if not re.search(r'\d', raw):
+            continue
+        value, unit = covenant_parser.parse_value(raw.replace(':', ' to '))
+        if value is None:
+            continue
+        if unit is None:
+            # Bare numbers: dollars for amount covenants, a ratio otherwise
+            unit = '$' if any(metric in name.lower() for metric in _DOLLAR_METRICS) else 'x'
+        if unit == 'x' and value > 100:
+            continue  # a year or a section number, not a ratio
+        return value, unit
+    return None, None
+
+
+def _detect_in_text(text, page, section):
+    """Covenants stated in running text (name, then comparison and number in the same sentence)"""
+    matcher = covenant_mapping.get_matcher()
+    found = []
+    position = 0
+    while True:
+        name = matcher.search(text, position)
+        if name is None:
+            return found
+        start, end, canonical = name
+        stop = _SENTENCE_END.search(text, end)
+        sentence = text[end:stop.start() if stop else len(text)]
+        comparator = _COMPARATOR.search(sentence)
+        value, unit = (None, None)
+        if comparator:
+            value, unit = _threshold_value(sentence[comparator.end():], canonical)
+        if value is None:
+            position = end
+            continue
+
+        operator = next(op for i, (_, op) in enumerate(_COMPARATORS) if comparator.group(f'c{i}'))
+        found.append({
+            'covenant_name': canonical,
+            'term': _clean(text[start:end]),
+            'operator': operator,
+            'value': value,
+            'unit': unit,
+            'page': page,
+            'section': section,
+            'evidence': _clean(text[start:end + len(sentence)])[:EVIDENCE_CHARS],
+        })
+        position = end + len(sentence)
+
+
+def _detect_in_table(rows, page):
+    """Covenants in table rows (a name cell, then a threshold cell)"""
+    matcher = covenant_mapping.get_matcher()
+    found = []
+    for cells in rows:
+        for i, cell in enumerate(cells):
+            name = matcher.search(cell)
+            if name is None:
+                continue
+            start, end, canonical = name
+            for other in cells[i + 1:]:
+                operator, value, unit = covenant_parser.parse_threshold(other.replace(':', ' to '))
+                if value is None:
+                    continue
+                if unit is None:
+                    unit = '$' if any(m in canonical.lower() for m in _DOLLAR_METRICS) else 'x'
+                found.append({
+                    'covenant_name': canonical,
+                    'term': _clean(cell[start:end]),
+                    'operator': operator or _default_operator(canonical),
+                    'value': value,
+                    'unit': unit,
+                    'page': page,
+                    'section': 'table',
+                    'evidence': _clean(' | '.join(cells))[:EVIDENCE_CHARS],
+                })
+                break
+            break
+    return found
+
+
+def detect_covenants(page):
+    """Every covenant found on one extracted page"""
+    found = _detect_in_table(page['tables'], page['page'])
+    found += _detect_in_text(page['text'], page['page'], 'text')
+    for footnote in page['footnotes']:
+        found += _detect_in_text(footnote, page['page'], 'footnote')
+    return found
+
+
+def _split_layout_text(number, text):
+    """Page dict from layout-preserving text: gap-separated lines are table rows, marked lines footnotes"""
+    body, tables, footnotes = [], [], []
+    for line in text.splitlines():
+        cells = [cell.strip() for cell in _CELL_GAP.split(line.strip()) if cell.strip()]
+        if len(cells) >= 2 and any(re.search(r'\d', cell) for cell in cells[1:]):
+            tables.append(cells)
+        elif _FOOTNOTE_LINE.match(line):
+            footnotes.append(line.strip())
+        else:
+            body.append(line)
+    return {'page': number, 'text': '\n'.join(body), 'tables': tables, 'footnotes': footnotes}
+
+
+@contextmanager
+def _open_pdf(path):
+    """PdfReader over an open file, closed (with everything pypdf resolved) when the with-block ends"""
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise ImportError("Reading PDF files requires pypdf (pip install pypdf)")
+    # Given a path pypdf reads the whole file into memory; given a file it reads objects on demand
+    with open(path, 'rb') as f:
+        try:
+            reader = PdfReader(f)
+        except Exception as error:  # pypdf raises its own errors for damaged files
+            raise ValueError(f"Not a readable PDF file ({error})") from error
+        # Nothing outlives the extraction - no fd on a deleted upload, no cache of the whole document
+        yield reader
+
+
+def _page_key(kind, content):
+    """Cache key of a page: hash of its content, the extractor version and the mapping table"""
+    version = f'{EXTRACTOR_VERSION}:{covenant_mapping.get_matcher().version}:{kind}:'
+    return hashlib.sha256(version.encode() + content).digest()
+
+
+def _resource_fingerprint(page):
+    """Bytes identifying what a PDF page's content stream draws with (fonts and form XObjects)"""
+    resources = page.get('/Resources')
+    if resources is None:
+        return b''
+    resources = resources.get_object()
+    parts = []
+    fonts = resources.get('/Font')
+    for name, font in sorted((fonts.get_object() if fonts is not None else {}).items()):
+        font = font.get_object()
+        parts.append(f'{name}={font.get("/BaseFont")}'.encode())
+        to_unicode = font.get('/ToUnicode')
+        if to_unicode is not None:
+            parts.append(to_unicode.get_object().get_data())  # same glyphs can map to different text
+    xobjects = resources.get('/XObject')
+    for name, xobject in sorted((xobjects.get_object() if xobjects is not None else {}).items()):
+        xobject = xobject.get_object()
+        if xobject.get('/Subtype') == '/Form':
+            parts.append(name.encode() + xobject.get_data())
+    return b'\0'.join(parts)
+
+
+def pdf_page_keys(path):
+    """Cache key of every page in a PDF (None for a page that can't be fingerprinted)"""
+    keys = []
+    with _open_pdf(path) as reader:
+        for page in reader.pages:
+            try:
+                contents = page.get_contents()
+                data = contents.get_data() if contents is not None else b''
+                keys.append(_page_key('pdf', data + b'\0' + _resource_fingerprint(page)))
+            except Exception:  # unusual structure - just extract it every time
+                keys.append(None)
+    return keys
+
+
+def _pdf_pages(path, indexes):
+    """Extract and scan the given pages of a PDF (runs in a worker process)"""
+    results = []
+    # Opened per task: a task is PAGES_PER_TASK pages, and the reader never outlives it
+    with _open_pdf(path) as reader:
+        for index in indexes:
+            page = reader.pages[index]
+            try:
+                text = page.extract_text(extraction_mode="layout")
+            except TypeError:  # pypdf before layout mode
+                text = page.extract_text()
+            page = _split_layout_text(index + 1, text or '')
+            results.append((page, detect_covenants(page)))
+    return results
+
+
+# WordprocessingML
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+def _docx_footnotes(archive):
+    """{footnote id: text} from word/footnotes.xml"""
+    try:
+        root = ElementTree.fromstring(archive.read('word/footnotes.xml'))
+    except KeyError:
+        return {}
+    return {
+        note.get(f'{_W}id'): _clean(''.join(t.text or '' for t in note.iter(f'{_W}t')))
+        for note in root.iter(f'{_W}footnote')
+    }
+
+
+def _new_page():
+    return {'lines': [], 'tables': [], 'notes': []}
+
+
+def _has_content(page):
+    return any(page['lines']) or page['tables']
+
+
+def _docx_paragraph(block, pages):
+    """Add one w:p to the last page, starting new pages at its page breaks"""
+    if block.find(f'{_W}pPr/{_W}pageBreakBefore') is not None and _has_content(pages[-1]):
+        pages.append(_new_page())
+    text = []
+    for node in block.iter():
+        if node.tag == f'{_W}t':
+            text.append(node.text or '')
+        elif node.tag == f'{_W}tab':
+            text.append('\t')
+        elif node.tag == f'{_W}footnoteReference':
+            pages[-1]['notes'].append(node.get(f'{_W}id'))
+        elif (node.tag == f'{_W}br' and node.get(f'{_W}type') == 'page') or node.tag == f'{_W}lastRenderedPageBreak':
+            # Word also marks the rendered break right after an explicit one - don't count it twice
+            if _has_content(pages[-1]) or text:
+                pages[-1]['lines'].append(''.join(text))
+                text = []
+                pages.append(_new_page())
+    pages[-1]['lines'].append(''.join(text))
+
+
+def _docx_table(block, pages):
+    """Add one w:tbl's rows (lists of cell texts) to the last page"""
+    for row in block.iter(f'{_W}tr'):
+        cells = [_clean(''.join(t.text or '' for t in cell.iter(f'{_W}t'))) for cell in row.iter(f'{_W}tc')]
+        if any(cells):
+            pages[-1]['tables'].append(cells)
+
+
+def docx_pages(path):
+    """Page dicts of a DOCX, split on explicit and last-rendered page breaks"""
+    pages = [_new_page()]
+    try:
+        with zipfile.ZipFile(path) as archive:
+            footnotes = _docx_footnotes(archive)
+            # Stream the body one top-level block at a time and drop each once read,
+            # so the XML tree never holds more than one paragraph or table
+            depth = 0
+            body = None
+            with archive.open('word/document.xml') as document:
+                for event, element in ElementTree.iterparse(document, events=('start', 'end')):
+                    if event == 'start':
+                        depth += 1
+                        if depth == 2 and element.tag == f'{_W}body':
+                            body = element
+                        continue
+                    depth -= 1
+                    if depth != 2 or body is None:
+                        continue
+                    if element.tag == f'{_W}tbl':
+                        _docx_table(element, pages)
+                    elif element.tag == f'{_W}p':
+                        _docx_paragraph(element, pages)
+                    body.clear()
+    except (zipfile.BadZipFile, KeyError, ElementTree.ParseError) as error:
+        raise ValueError(f"Not a readable DOCX file ({error})") from error
+
+    if len(pages) > 1 and not (_has_content(pages[-1]) or pages[-1]['notes']):
+        pages.pop()  # a final page break leaves nothing after it
+
+    return [
+        {
+            'page': number,
+            'text': '\n'.join(page['lines']),
+            'tables': page['tables'],
+            'footnotes': [footnotes[note] for note in page['notes'] if footnotes.get(note)],
+        }
+        for number, page in enumerate(pages, start=1)
+    ]
+
+
+def docx_page_key(page):
+    """Cache key of an extracted DOCX page"""
+    content = json.dumps([page['text'], page['tables'], page['footnotes']])
+    return _page_key('docx', content.encode('utf-8'))
+
+
+def _scan_pages(pages):
+    """Scan already-extracted pages (runs in a worker process)"""
+    return [(page, detect_covenants(page)) for page in pages]
+
+
+# One process pool for the whole server, started on first use
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """Process-wide extraction pool"""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # The server process runs threads; fork a clean server process rather than it
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                _executor = ProcessPoolExecutor(max_workers=MAX_WORKERS, mp_context=context)
+    return _executor
+
+
+def shutdown_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+atexit.register(shutdown_executor)
+
+
+def _run_tasks(tasks, total_pages, progress=None, done=0):
+    """Run (function, args, pages) tasks in the pool (or in-process for small jobs); page results in order"""
+    results = []
+    if total_pages - done < PARALLEL_MIN_PAGES or MAX_WORKERS < 2:
+        for function, args, pages in tasks:
+            results.extend(function(*args))
+            done += pages
+            if progress:
+                progress(done, total_pages)
+    else:
+        executor = get_executor()
+        futures = {executor.submit(function, *args): pages for function, args, pages in tasks}
+        for future in as_completed(futures):
+            results.extend(future.result())
+            done += futures[future]
+            if progress:
+                progress(done, total_pages)
+    results.sort(key=lambda result: result[0]['page'])
+    return results
+
+
+def extract_document(path, filename=None, progress=None, cache_path=extraction_cache.CACHE_PATH):
+    """Extract pages and detect covenants in a PDF or DOCX; returns a summary with the covenants found"""
+    start = time.perf_counter()
+    extension = os.path.splitext(filename or path)[1].lower()
+    if extension == '.pdf':
+        keys = pdf_page_keys(path)
+
+        def task(indexes):
+            return _pdf_pages, (path, indexes), len(indexes)
+    elif extension == '.docx':
+        pages = docx_pages(path)
+        keys = [docx_page_key(page) for page in pages]
+
+        def task(indexes):
+            return _scan_pages, ([pages[index] for index in indexes],), len(indexes)
+    else:
+        raise ValueError(f"Unsupported document type '{extension}' - upload a PDF or DOCX file")
+
+    total = len(keys)
+    # Pages seen before (in this or any other document) come straight from the cache
+    cached = extraction_cache.get_many(keys, cache_path) if cache_path else {}
+    missing = [index for index in range(total) if index not in cached]
+    tasks = [task(missing[first:first + PAGES_PER_TASK]) for first in range(0, len(missing), PAGES_PER_TASK)]
+    if progress and cached:
+        progress(len(cached), total)
+
+    extracted = _run_tasks(tasks, total, progress, done=len(cached))
+    if cache_path:
+        extraction_cache.put_many({keys[page['page'] - 1]: (page, found) for page, found in extracted}, cache_path)
+
+    results = sorted(list(cached.values()) + extracted, key=lambda result: result[0]['page'])
+    covenants = [covenant for _, found in results for covenant in found]
+    return {
+        'pages': total,
+        'cached_pages': len(cached),
+        'tables': sum(len(page['tables']) for page, _ in results),
+        'footnotes': sum(len(page['footnotes']) for page, _ in results),
+        'detections': len(covenants),
+        'candidates': covenants,
+        'covenants': covenant_dedup.dedupe(covenants),
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def save_covenants(db_path, loan_id, source_document, candidates, source_date=None):
+    """Dedupe a document's covenant statements against the loan and save the kept ones; returns counts"""
+    with database.transaction(db_path) as conn:
+        summary = covenant_dedup.apply(conn, loan_id, source_document, candidates, source_date)
+        covenant_calendar.schedule_unscheduled(conn)
+    return summary
+
+
+def extract_and_save(db_path, loan_id, path, source_document, progress=None, source_date=None):
+    """Extract a document, save its covenants to the loan and test them against its latest financials"""
+    summary = extract_document(path, source_document, progress)
+    summary.update(save_covenants(db_path, loan_id, source_document, summary['candidates'], source_date))
+    summary['retest'] = covenant_engine.retest_loans(db_path, [loan_id]) if summary['covenants'] else None
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find financial covenants in a PDF or DOCX loan agreement")
+    parser.add_argument("path")
+    parser.add_argument("--no-cache", action="store_true", help="Extract every page, ignoring the page cache")
+    args = parser.parse_args()
+
+    summary = extract_document(args.path, cache_path=None if args.no_cache else extraction_cache.CACHE_PATH)
+    print(f"{summary['pages']:,} pages ({summary['cached_pages']:,} cached), "
+          f"{summary['detections']:,} covenant statements in {summary['seconds']}s")
+    for covenant in summary['covenants']:
+        threshold = covenant_engine.format_threshold(covenant['operator'], covenant['value'], covenant['unit'])
+        print(f"  p.{covenant['page']:<4} {covenant['section']:<8} {covenant['covenant_name']}: {threshold}")
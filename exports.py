@@ -0,0 +1,238 @@
+"""
+📥 COVENANT COMMAND CENTER - EXPORTS
+Builds CSV, Parquet, Arrow IPC, Excel and PDF exports on request
+
+Query exports stream rows from the database a chunk at a time straight into
+a temporary file, so an export never holds the full result as a DataFrame
+and as encoded bytes at the same time. Nothing is built until the user asks
+for it; pages only pay for the rerun of their own query.
+"""
+
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime
+
+import pandas as pd
+
+import database
+
+EXPORT_CHUNK_ROWS = 20000
+EXPORT_DIR = os.path.join(tempfile.gettempdir(), "covenant_exports")
+EXPORT_MAX_AGE = 3600  # seconds before an export left behind (crashed run) is pruned
+MAX_EXCEL_ROWS = 1_048_575  # per sheet, below the header row
+
+# format -> (label, file extension, mime type)
+FORMATS = {
+    'csv': ("CSV", ".csv", "text/csv"),
+    'parquet': ("Parquet", ".parquet", "application/vnd.apache.parquet"),
+    'arrow': ("Arrow IPC", ".arrow", "application/vnd.apache.arrow.file"),
+    'xlsx': ("Excel", ".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    'pdf': ("PDF", ".pdf", "application/pdf"),
+}
+
+
+def _export_path(extension):
+    """Fresh file path in the export directory (old exports are pruned first)"""
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    prune_exports()
+    return os.path.join(EXPORT_DIR, f"{uuid.uuid4().hex}{extension}")
+
+
+def prune_exports(max_age=EXPORT_MAX_AGE):
+    """Delete export files older than max_age seconds"""
+    if not os.path.isdir(EXPORT_DIR):
+        return
+    cutoff = time.time() - max_age
+    for name in os.listdir(EXPORT_DIR):
+        path = os.path.join(EXPORT_DIR, name)
+        try:
+            if os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass  # Already gone or still being written by another session
+
+
+def iter_query_chunks(db_path, query, params=None, chunksize=EXPORT_CHUNK_ROWS):
+    """Yield a query's result as DataFrames of at most chunksize rows"""
+    with database.connection(db_path) as conn:
+        # Chunks come from one read transaction, so the export is a consistent snapshot
+        conn.execute("BEGIN")
+        try:
+            yield from pd.read_sql_query(query, conn, params=params, chunksize=chunksize)
+        finally:
+            conn.execute("COMMIT")
+
+
+def _arrow_schema(chunk):
+    """Arrow schema for a chunk; all-NULL columns are typed as strings"""
+    import pyarrow as pa
+
+    schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+    return pa.schema([
+        pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+        for field in schema
+    ])
+
+
+def _write_csv(chunks, path):
+    rows = 0
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        for chunk in chunks:
+            chunk.to_csv(f, index=False, header=rows == 0)
+            rows += len(chunk)
+    return rows
+
+
+def _write_arrow(chunks, path, fmt):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    rows = 0
+    writer = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                schema = _arrow_schema(chunk)
+                writer = pq.ParquetWriter(path, schema) if fmt == 'parquet' else pa.ipc.new_file(path, schema)
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+            rows += len(chunk)
+    finally:
+        if writer is not None:
+            writer.close()
+    return rows
+
+
+def _write_excel(chunks, path, sheet_name="Export"):
+    try:
+        from openpyxl import Workbook
+    except ImportError:
+        raise ImportError("Excel exports require openpyxl (pip install openpyxl)")
+
+    # Write-only mode streams rows to disk instead of building the workbook in memory
+    workbook = Workbook(write_only=True)
+    sheet, sheet_rows, rows, header = None, 0, 0, None
+    for chunk in chunks:
+        header = list(chunk.columns)
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            if sheet is None or sheet_rows >= MAX_EXCEL_ROWS:
+                sheet = workbook.create_sheet(sheet_name if sheet is None else f"{sheet_name} ({rows // MAX_EXCEL_ROWS + 1})")
+                sheet.append(header)
+                sheet_rows = 0
+            sheet.append(row)
+            sheet_rows += 1
+            rows += 1
+    if sheet is None:
+        workbook.create_sheet(sheet_name).append(header or [])
+    workbook.save(path)
+    return rows
+
+
+def export_query(db_path, query, params=None, fmt='csv', chunksize=EXPORT_CHUNK_ROWS):
+    """Stream a query into an export file; returns (path, rows written)"""
+    extension = FORMATS[fmt][1]
+    path = _export_path(extension)
+    chunks = iter_query_chunks(db_path, query, params, chunksize)
+    try:
+        if fmt == 'csv':
+            rows = _write_csv(chunks, path)
+        elif fmt in ('parquet', 'arrow'):
+            rows = _write_arrow(chunks, path, fmt)
+        elif fmt == 'xlsx':
+            rows = _write_excel(chunks, path)
+        else:
+            raise ValueError(f"Query exports don't support '{fmt}'")
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+    return path, rows
+
+
+def export_frames(frames, fmt='xlsx', title="Covenant Command Center Report"):
+    """Write already-computed tables ({name: DataFrame}) as an Excel workbook or PDF report; returns the path"""
+    path = _export_path(FORMATS[fmt][1])
+    if fmt == 'xlsx':
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            for name, frame in frames.items():
+                frame.to_excel(writer, sheet_name=name[:31], index=False)
+    elif fmt == 'pdf':
+        write_pdf_report(path, title, frames)
+    else:
+        raise ValueError(f"Report exports don't support '{fmt}'")
+    return path
+
+
+# Minimal PDF writer: Courier text pages, no dependencies
+_PDF_PAGE_LINES = 60
+_PDF_LINE_CHARS = 95  # Courier 9pt across an A4 page; longer lines wrap
+
+
+def _pdf_text(text):
+    """Escape text for a PDF string literal (Latin-1 only - emoji and the like are dropped)"""
+    text = str(text).encode("latin-1", "ignore").decode("latin-1")
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap_line(line):
+    """A line as page-width pieces; continuation pieces are indented"""
+    line = line.rstrip()
+    pieces = [line[:_PDF_LINE_CHARS]]
+    rest = line[_PDF_LINE_CHARS:]
+    while rest:
+        pieces.append("    " + rest[:_PDF_LINE_CHARS - 4])
+        rest = rest[_PDF_LINE_CHARS - 4:]
+    return pieces
+
+
+def _report_lines(title, frames):
+    """Plain-text lines of a report: title, then each table under its heading (nothing is cut off)"""
+    lines = [title, f"Generated {datetime.now():%Y-%m-%d %H:%M}", ""]
+    for name, frame in frames.items():
+        lines += [name, "-" * len(name)]
+        # Wide tables continue their columns in blocks below; a cell wider than the page wraps
+        if len(frame):
+            lines += frame.to_string(index=False, line_width=_PDF_LINE_CHARS).splitlines()
+        else:
+            lines.append("(no rows)")
+        lines.append("")
+    return [piece for line in lines for piece in _wrap_line(line)]
+
+
+def write_pdf_report(path, title, frames):
+    """Write a paginated plain-text PDF of the given tables"""
+    lines = _report_lines(title, frames)
+    pages = [lines[i:i + _PDF_PAGE_LINES] for i in range(0, len(lines), _PDF_PAGE_LINES)] or [[]]
+
+    # Object numbers: 1 catalog, 2 page tree, 3 font, then (page, content) pairs
+    objects = {
+        1: b"<< /Type /Catalog /Pages 2 0 R >>",
+        3: b"<< /Type /Font /Subtype /Type1 /BaseFont /Courier /Encoding /WinAnsiEncoding >>",
+    }
+    page_refs = []
+    for i, page in enumerate(pages):
+        page_id, content_id = 4 + 2 * i, 5 + 2 * i
+        text = "".join(f"({_pdf_text(line)}) Tj T*\n" for line in page)
+        stream = f"BT /F1 9 Tf 11 TL 40 800 Td\n{text}ET".encode("latin-1")
+        objects[content_id] = b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream)
+        objects[page_id] = (
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 595 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_id
+        )
+        page_refs.append(f"{page_id} 0 R")
+    objects[2] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(pages)} >>".encode()
+
+    with open(path, "wb") as f:
+        f.write(b"%PDF-1.4\n")
+        offsets = {}
+        for number in sorted(objects):
+            offsets[number] = f.tell()
+            f.write(b"%d 0 obj\n%s\nendobj\n" % (number, objects[number]))
+        xref = f.tell()
+        f.write(b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1))
+        for number in sorted(objects):
+            f.write(b"%010d 00000 n \n" % offsets[number])
+        f.write(b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref))
+    return path
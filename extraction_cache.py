@@ -0,0 +1,184 @@
+"""
+🧮 COVENANT COMMAND CENTER - EXTRACTION PAGE CACHE
+Persistent per-page extraction results, keyed by a hash of each page's content
+
+Agreements come back again and again - amended-and-restated versions,
+re-uploads, the same exhibit attached to several deals. Each page's
+extracted text, tables, footnotes and covenants are stored under a hash
+of the page's content, so only pages that actually changed are extracted
+again. Entries carry no page number: a page that moved in an amendment
+is still a hit.
+
+The cache is its own SQLite file (not the portfolio database) and is
+size-bounded: once it grows past MAX_BYTES the least recently used pages
+are evicted until it is back under 90% of that. A running byte total is kept by
+triggers so the size check never scans the table. The cache is an
+optimization only - if it can't be read or written, extraction carries on
+without it.
+"""
+
+import json
+import sqlite3
+import threading
+import time
+import zlib
+
+import database
+
+CACHE_PATH = "extraction_cache.db"
+MAX_BYTES = 256 * 1024 * 1024  # compressed results kept on disk
+EVICT_TO_FRACTION = 0.9  # evict a batch at a time, not one page per upload
+COMPRESSION_LEVEL = 1  # page text compresses ~3x even at the fastest level
+
+SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS page_results (
+        page_hash BLOB PRIMARY KEY,
+        result BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        last_used INTEGER NOT NULL
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_page_results_last_used ON page_results(last_used)",
+    """
+    CREATE TABLE IF NOT EXISTS cache_size (
+        cache_size_id INTEGER PRIMARY KEY CHECK (cache_size_id = 1),
+        total_bytes INTEGER NOT NULL
+    )
+    """,
+    "INSERT OR IGNORE INTO cache_size (cache_size_id, total_bytes) VALUES (1, 0)",
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_page_results_insert AFTER INSERT ON page_results
+    BEGIN
+        UPDATE cache_size SET total_bytes = total_bytes + NEW.size WHERE cache_size_id = 1;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS trg_page_results_delete AFTER DELETE ON page_results
+    BEGIN
+        UPDATE cache_size SET total_bytes = total_bytes - OLD.size WHERE cache_size_id = 1;
+    END
+    """,
+]
+
+# Cache files whose schema exists (created once per process)
+_ready = set()
+_ready_lock = threading.Lock()
+
+
+def _ensure_schema(cache_path):
+    if cache_path in _ready:
+        return
+    with _ready_lock:
+        if cache_path not in _ready:
+            with database.transaction(cache_path) as conn:
+                for statement in SCHEMA:
+                    conn.execute(statement)
+            _ready.add(cache_path)
+
+
+def _encode(page, covenants):
+    """Compressed page result without its page number"""
+    page = {key: value for key, value in page.items() if key != 'page'}
+    covenants = [{key: value for key, value in covenant.items() if key != 'page'} for covenant in covenants]
+    return zlib.compress(json.dumps([page, covenants]).encode('utf-8'), COMPRESSION_LEVEL)
+
+
+def _decode(blob, number):
+    """(page, covenants) restored at the page number it has in this document"""
+    page, covenants = json.loads(zlib.decompress(blob))
+    page['page'] = number
+    for covenant in covenants:
+        covenant['page'] = number
+    return page, covenants
+
+
+def get_many(keys, cache_path=CACHE_PATH):
+    """{page index: (page, covenants)} for every page whose key is cached"""
+    wanted = {}
+    for index, key in enumerate(keys):
+        if key is not None:
+            wanted.setdefault(key, []).append(index)
+    if not wanted:
+        return {}
+
+    found = {}
+    try:
+        _ensure_schema(cache_path)
+        with database.connection(cache_path) as conn:
+            hashes = list(wanted)
+            for first in range(0, len(hashes), 500):  # stay under SQLite's bound-parameter limit
+                batch = hashes[first:first + 500]
+                rows = conn.execute(
+                    f"SELECT page_hash, result FROM page_results WHERE page_hash IN ({','.join('?' * len(batch))})",
+                    batch,
+                ).fetchall()
+                for page_hash, blob in rows:
+                    for index in wanted[page_hash]:
+                        found[index] = _decode(blob, index + 1)
+        if found:
+            # One write transaction marks every hit as recently used
+            now = int(time.time())
+            with database.transaction(cache_path) as conn:
+                conn.executemany(
+                    "UPDATE page_results SET last_used = ? WHERE page_hash = ?",
+                    [(now, page_hash) for page_hash in {keys[index] for index in found}],
+                )
+    except sqlite3.Error:
+        return {}
+    return found
+
+
+def put_many(entries, cache_path=CACHE_PATH):
+    """Store {key: (page, covenants)} results and evict old pages if over budget; returns pages stored"""
+    rows = [
+        (key, blob, len(blob), int(time.time()))
+        for key, blob in ((key, _encode(*result)) for key, result in entries.items() if key is not None)
+    ]
+    if not rows:
+        return 0
+    try:
+        _ensure_schema(cache_path)
+        with database.transaction(cache_path) as conn:
+            conn.executemany("""
+                INSERT INTO page_results (page_hash, result, size, last_used) VALUES (?, ?, ?, ?)
+                ON CONFLICT(page_hash) DO UPDATE SET last_used = excluded.last_used
+            """, rows)
+            _evict(conn)
+    except sqlite3.Error:
+        return 0
+    return len(rows)
+
+
+def _evict(conn):
+    """Delete least recently used pages once the cache is over budget; returns pages evicted"""
+    total = conn.execute("SELECT total_bytes FROM cache_size WHERE cache_size_id = 1").fetchone()[0]
+    if total <= MAX_BYTES:
+        return 0
+
+    excess = total - int(MAX_BYTES * EVICT_TO_FRACTION)
+    victims = []
+    # Oldest first off the last_used index, stopping as soon as enough bytes are freed
+    for page_hash, size in conn.execute("SELECT page_hash, size FROM page_results ORDER BY last_used"):
+        victims.append((page_hash,))
+        excess -= size
+        if excess <= 0:
+            break
+    conn.executemany("DELETE FROM page_results WHERE page_hash = ?", victims)
+    return len(victims)
+
+
+def cache_stats(cache_path=CACHE_PATH):
+    """Pages and compressed bytes currently cached"""
+    _ensure_schema(cache_path)
+    with database.connection(cache_path) as conn:
+        pages = conn.execute("SELECT COUNT(*) FROM page_results").fetchone()[0]
+        total = conn.execute("SELECT total_bytes FROM cache_size WHERE cache_size_id = 1").fetchone()[0]
+    return {'pages': pages, 'bytes': total, 'max_bytes': MAX_BYTES}
+
+
+def clear(cache_path=CACHE_PATH):
+    """Drop every cached page"""
+    _ensure_schema(cache_path)
+    with database.transaction(cache_path) as conn:
+        conn.execute("DELETE FROM page_results")
@@ -0,0 +1,225 @@
+"""
+📥 COVENANT COMMAND CENTER - BULK FINANCIALS INGESTION
+Streams portfolio-wide CSV/XLSX extracts into financial_data
+
+Files are read a chunk of rows at a time (pandas `chunksize` for CSV,
+openpyxl read-only mode for XLSX), so memory stays flat however many
+loan-periods a file holds. Each chunk is mapped onto the financial_data
+columns, upserted with one executemany in its own transaction, and the
+touched loans are re-tested once the whole file is in.
+"""
+
+import os
+import re
+import time
+from datetime import datetime
+
+import pandas as pd
+
+import covenant_engine
+import database
+
+CHUNK_ROWS = 5000
+MAX_REJECTED_SAMPLES = 20
+
+# Accepted header spellings (normalized: lowercase, non-alphanumerics as '_') per column
+COLUMN_ALIASES = {
+    'loan_id': ['loan_id', 'loan', 'loan_number', 'loan_no', 'facility_id'],
+    'deal_name': ['deal_name', 'deal', 'facility', 'facility_name', 'loan_name'],
+    'reporting_period': ['reporting_period', 'period', 'quarter', 'fiscal_quarter', 'period_end', 'as_of_date'],
+    'total_debt': ['total_debt', 'debt', 'funded_debt', 'total_funded_debt'],
+    'ebitda': ['ebitda', 'adjusted_ebitda', 'consolidated_ebitda'],
+    'interest_expense': ['interest_expense', 'interest', 'cash_interest_expense'],
+    'current_assets': ['current_assets', 'total_current_assets'],
+    'current_liabilities': ['current_liabilities', 'total_current_liabilities'],
+    'net_worth': ['net_worth', 'tangible_net_worth', 'equity', 'shareholders_equity', 'total_equity'],
+}
+
+_ALIAS_LOOKUP = {alias: column for column, aliases in COLUMN_ALIASES.items() for alias in aliases}
+
+UPSERT_FINANCIALS_SQL = f"""
+    INSERT INTO financial_data
+    (loan_id, reporting_period, {', '.join(covenant_engine.FINANCIAL_COLUMNS)}, upload_date)
+    VALUES (?, ?, {', '.join('?' for _ in covenant_engine.FINANCIAL_COLUMNS)}, ?)
+    ON CONFLICT(loan_id, reporting_period) DO UPDATE SET
+    {', '.join(f"{c} = COALESCE(excluded.{c}, {c})" for c in covenant_engine.FINANCIAL_COLUMNS)},
+    upload_date = excluded.upload_date
+"""
+
+
+def normalize_header(name):
+    """'Total Debt ($)' -> 'total_debt'"""
+    return re.sub(r'[^a-z0-9]+', '_', str(name).strip().lower()).strip('_')
+
+
+def map_columns(headers):
+    """{source header: financial_data column} for the headers we recognise"""
+    mapping = {}
+    for header in headers:
+        column = _ALIAS_LOOKUP.get(normalize_header(header))
+        if column and column not in mapping.values():
+            mapping[header] = column
+    return mapping
+
+
+def check_columns(mapping):
+    """Raise ValueError if a file can't identify the loan and period of each row"""
+    columns = set(mapping.values())
+    if not columns & {'loan_id', 'deal_name'}:
+        raise ValueError("File needs a loan column (loan_id or deal_name)")
+    if 'reporting_period' not in columns:
+        raise ValueError("File needs a reporting period column (e.g. '2025-Q4')")
+
+
+def normalize_periods(values):
+    """Reporting periods as 'YYYY-QN' ('2025Q4', 'Q4 2025' and dates accepted; NaN if unreadable)"""
+    text = values.astype(str).str.strip().str.upper()
+    year_first = text.str.extract(r'^(\d{4})\s*[-/ ]?\s*Q([1-4])$')
+    quarter_first = text.str.extract(r'^Q([1-4])\s*[-/ ]?\s*(\d{4})$')
+
+    periods = pd.Series(pd.NA, index=values.index, dtype=object)
+    hit = year_first[0].notna()
+    periods[hit] = year_first[0][hit] + '-Q' + year_first[1][hit]
+    hit = quarter_first[0].notna() & periods.isna()
+    periods[hit] = quarter_first[1][hit] + '-Q' + quarter_first[0][hit]
+
+    rest = periods.isna()
+    if rest.any():
+        dates = pd.to_datetime(values[rest], errors='coerce', format='mixed')
+        dates = dates[dates.notna()]
+        periods[dates.index] = dates.dt.year.astype(str) + '-Q' + dates.dt.quarter.astype(str)
+    return periods
+
+
+def to_numbers(values):
+    """Numeric column from text like '$1,250,000' or '(400)' (NaN if unreadable)"""
+    if pd.api.types.is_numeric_dtype(values):
+        return values.astype(float)
+    numbers = pd.to_numeric(values, errors='coerce')
+    # Only clean up the cells that aren't plain numbers already
+    messy = numbers.isna() & values.notna()
+    if messy.any():
+        text = values[messy].astype(str).str.strip()
+        text = text.str.replace(r'^\((.*)\)$', r'-\1', regex=True).str.replace(r'[$,\s]', '', regex=True)
+        numbers[messy] = pd.to_numeric(text, errors='coerce')
+    return numbers.astype(float)
+
+
+def read_chunks(file, filename, chunksize=CHUNK_ROWS):
+    """Yield DataFrames of at most chunksize rows from a CSV or XLSX file (path or file object)"""
+    extension = os.path.splitext(filename)[1].lower()
+    if extension == '.csv':
+        yield from pd.read_csv(file, chunksize=chunksize, dtype=str, skipinitialspace=True)
+    elif extension in ('.xlsx', '.xlsm'):
+        yield from _read_xlsx_chunks(file, chunksize)
+    else:
+        raise ValueError(f"Unsupported file type '{extension}' - upload CSV or XLSX (save .xls files as .xlsx)")
+
+
+def _read_xlsx_chunks(file, chunksize):
+    """Row-streaming XLSX reader (first sheet, first row is the header)"""
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportError("Reading XLSX files requires openpyxl (pip install openpyxl)")
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        header = [str(h) if h is not None else f"column_{i}" for i, h in enumerate(header)]
+
+        batch = []
+        for row in rows:
+            if any(value is not None for value in row):
+                batch.append(row)
+            if len(batch) >= chunksize:
+                yield pd.DataFrame(batch, columns=header)
+                batch = []
+        if batch:
+            yield pd.DataFrame(batch, columns=header)
+    finally:
+        workbook.close()
+
+
+def load_loan_lookup(conn):
+    """Known loan ids and a deal name -> loan id map"""
+    loans = conn.execute("SELECT loan_id, deal_name FROM loan_agreements").fetchall()
+    loan_ids = {loan_id for loan_id, _ in loans}
+    by_name = {str(name).strip().lower(): loan_id for loan_id, name in loans if name}
+    return loan_ids, by_name
+
+
+def normalize_chunk(chunk, mapping, loan_ids, by_name):
+    """(rows ready to upsert, rejected rows as (index, reason)) for one chunk"""
+    chunk = chunk.rename(columns=mapping)
+    out = pd.DataFrame(index=chunk.index)
+
+    loan = pd.Series(pd.NA, index=chunk.index, dtype='Int64')
+    if 'loan_id' in chunk:
+        loan = to_numbers(chunk['loan_id']).round().astype('Int64')
+    if 'deal_name' in chunk:
+        names = chunk['deal_name'].astype(str).str.strip().str.lower().map(by_name).astype('Int64')
+        loan = loan.fillna(names)
+    out['loan_id'] = loan
+    out['reporting_period'] = normalize_periods(chunk['reporting_period'])
+    for column in covenant_engine.FINANCIAL_COLUMNS:
+        out[column] = to_numbers(chunk[column]) if column in chunk else float('nan')
+
+    unknown_loan = ~out['loan_id'].isin(loan_ids)
+    bad_period = out['reporting_period'].isna()
+    rejected = [(index, 'unknown loan') for index in out.index[unknown_loan]]
+    rejected += [(index, 'unreadable period') for index in out.index[bad_period & ~unknown_loan]]
+    return out[~unknown_loan & ~bad_period], rejected
+
+
+def _upsert_rows(frame, upload_date):
+    """executemany parameters for a normalized chunk (NaN -> NULL)"""
+    values = frame.astype(object).where(frame.notna(), None)
+    return [
+        (int(row[0]), row[1], *row[2:], upload_date)
+        for row in values.itertuples(index=False, name=None)
+    ]
+
+
+def ingest_file(db_path, file, filename, chunksize=CHUNK_ROWS, retest=True, progress=None):
+    """Stream a financials file into financial_data and re-test the touched loans; returns a summary"""
+    start = time.perf_counter()
+    upload_date = datetime.now().isoformat()
+    with database.connection(db_path) as conn:
+        loan_ids, by_name = load_loan_lookup(conn)
+
+    summary = {'rows_read': 0, 'rows_written': 0, 'rows_rejected': 0, 'rejected_samples': []}
+    touched = set()
+    mapping = None
+    for chunk in read_chunks(file, filename, chunksize):
+        if mapping is None:
+            mapping = map_columns(chunk.columns)
+            check_columns(mapping)
+            summary['columns'] = mapping
+
+        rows, rejected = normalize_chunk(chunk, mapping, loan_ids, by_name)
+        # One bounded transaction per chunk
+        with database.transaction(db_path) as conn:
+            conn.executemany(UPSERT_FINANCIALS_SQL, _upsert_rows(rows, upload_date))
+
+        touched.update(int(loan_id) for loan_id in rows['loan_id'].unique())
+        samples = summary['rejected_samples']
+        for index, reason in rejected[:MAX_REJECTED_SAMPLES - len(samples)]:
+            # +2: 1-based rows after the header line
+            samples.append((summary['rows_read'] + chunk.index.get_loc(index) + 2, reason))
+        summary['rows_read'] += len(chunk)
+        summary['rows_written'] += len(rows)
+        summary['rows_rejected'] += len(rejected)
+        if progress:
+            progress(summary['rows_read'])
+
+    if mapping is None:
+        raise ValueError("File has no rows")
+
+    summary['loans_touched'] = len(touched)
+    summary['retest'] = covenant_engine.retest_loans(db_path, touched) if retest and touched else None
+    summary['seconds'] = round(time.perf_counter() - start, 3)
+    return summary
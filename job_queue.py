@@ -0,0 +1,325 @@
+"""
+🧵 COVENANT COMMAND CENTER - EXTRACTION JOB QUEUE
+Durable background queue for document extraction
+
+The scan page no longer extracts on its own script thread. An upload is
+copied to JOBS_DIR and recorded as a queued row in extraction_jobs; the
+session is free again at once. A JobRunner per database - a background
+thread in the server, or a separate worker process started from the
+command line - claims queued jobs with one atomic UPDATE ... RETURNING,
+so any number of runners can share a queue without taking a job twice.
+Each runner works MAX_CONCURRENT_JOBS documents at a time, and their
+pages all go to the one extraction process pool (document_extraction),
+which keeps every core busy.
+
+Runners write per-page progress and a heartbeat to the job row. The row,
+not the session, is the source of truth: a browser refresh or a rerun
+just reads it again. A job whose runner died (server restart, crash)
+stops heartbeating and is queued again after STALE_AFTER seconds, up to
+MAX_ATTEMPTS times. Finished jobs keep their summary as JSON.
+
+Usage:
+    python job_queue.py covenant_demo.db   # run a worker process until Ctrl-C
+"""
+
+import argparse
+import atexit
+import itertools
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import database
+import document_extraction
+import migrations
+import upload_spool
+
+JOBS_DIR = "extraction_jobs"  # queued uploads, kept until their job finishes
+MAX_CONCURRENT_JOBS = 4  # documents in flight per runner; their pages share the process pool
+POLL_INTERVAL = 1.0  # seconds between queue checks when idle
+PROGRESS_INTERVAL = 0.5  # seconds between progress writes for one job
+STALE_AFTER = 60  # seconds without a heartbeat before a running job is requeued
+MAX_ATTEMPTS = 3  # runs of a job before a worker that keeps dying fails it
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+# Oldest queued job, taken in the same statement that marks it running
+CLAIM_QUERY = """
+    UPDATE extraction_jobs
+    SET status = 'running', worker_id = ?, attempts = attempts + 1,
+        heartbeat_at = ?, started_at = ?, pages_done = 0
+    WHERE job_id = (
+        SELECT job_id FROM extraction_jobs WHERE status = 'queued' ORDER BY job_id LIMIT 1
+    )
+    RETURNING job_id, loan_id, source_document, source_date, file_path, attempts
+"""
+
+# Running jobs nobody has heartbeated for: run again, or fail after MAX_ATTEMPTS
+REQUEUE_STALE_QUERY = """
+    UPDATE extraction_jobs
+    SET status = CASE WHEN attempts >= :max_attempts THEN 'failed' ELSE 'queued' END,
+        error = CASE WHEN attempts >= :max_attempts
+                     THEN 'Extraction stopped responding ' || attempts || ' times' ELSE error END,
+        finished_at = CASE WHEN attempts >= :max_attempts THEN :now END,
+        worker_id = NULL
+    WHERE status = 'running' AND heartbeat_at < :stale_before
+    RETURNING status, file_path
+"""
+
+# Recent jobs, newest first (param: limit)
+RECENT_JOBS_QUERY = """
+    SELECT j.job_id, j.loan_id, l.deal_name, j.source_document, j.source_date, j.status,
+           j.pages_done, j.pages_total, j.attempts, j.created_at, j.started_at, j.finished_at, j.error
+    FROM extraction_jobs j
+    LEFT JOIN loan_agreements l ON l.loan_id = j.loan_id
+    ORDER BY j.job_id DESC
+    LIMIT ?
+"""
+
+
+def _rows(cursor):
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in cursor.fetchall()]
+
+
+def enqueue(db_path, loan_id, uploaded_file, source_date=None):
+    """Queue an uploaded document for extraction into a loan; returns the job_id"""
+    path = upload_spool.spool(uploaded_file, directory=JOBS_DIR)
+    try:
+        with database.transaction(db_path) as conn:
+            job_id = conn.execute("""
+                INSERT INTO extraction_jobs (loan_id, source_document, source_date, file_path, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, (int(loan_id), uploaded_file.name, source_date, os.path.abspath(path), time.time())).lastrowid
+    except BaseException:
+        os.unlink(path)
+        raise
+    runner = _runners.get(db_path)
+    if runner is not None:
+        runner.wake()
+    return job_id
+
+
+def claim(db_path, worker_id):
+    """Take the oldest queued job for a worker, or None if the queue is empty"""
+    now = time.time()
+    with database.transaction(db_path) as conn:
+        jobs = _rows(conn.execute(CLAIM_QUERY, (worker_id, now, now)))
+    return jobs[0] if jobs else None
+
+
+def requeue_stale(db_path, stale_after=STALE_AFTER):
+    """Queue again (or fail) running jobs whose runner stopped heartbeating; returns jobs requeued"""
+    now = time.time()
+    with database.transaction(db_path) as conn:
+        rows = conn.execute(REQUEUE_STALE_QUERY, {
+            'max_attempts': MAX_ATTEMPTS, 'now': now, 'stale_before': now - stale_after,
+        }).fetchall()
+    for status, path in rows:
+        if status == 'failed':
+            _remove_file(path)
+    return sum(1 for status, _ in rows if status == 'queued')
+
+
+def heartbeat(db_path, worker_id, job_ids):
+    """Mark the jobs a worker is actually running as alive (a job whose thread died goes stale and is requeued)"""
+    with database.connection(db_path) as conn:
+        conn.execute("""
+            UPDATE extraction_jobs SET heartbeat_at = ?
+            WHERE worker_id = ? AND status = 'running' AND job_id IN (SELECT value FROM json_each(?))
+        """, (time.time(), worker_id, json.dumps(sorted(job_ids))))
+
+
+def finish(db_path, job_id, worker_id, result=None, error=None):
+    """Record a job's outcome (ignored if the job was requeued from under the worker); returns True if recorded"""
+    with database.connection(db_path) as conn:
+        recorded = conn.execute("""
+            UPDATE extraction_jobs
+            SET status = ?, result = ?, error = ?, finished_at = ?, heartbeat_at = ?,
+                pages_done = COALESCE(?, pages_done), pages_total = COALESCE(?, pages_total)
+            WHERE job_id = ? AND worker_id = ? AND status = 'running'
+        """, (
+            'failed' if error else 'done',
+            json.dumps(result) if result is not None else None,
+            error, time.time(), time.time(),
+            result and result['pages'], result and result['pages'],
+            job_id, worker_id,
+        )).rowcount
+    return recorded > 0
+
+
+def _remove_file(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+class _Progress:
+    """Progress callback for one job - writes pages done at most every PROGRESS_INTERVAL"""
+
+    def __init__(self, db_path, job_id, worker_id):
+        self.db_path = db_path
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.written_at = 0.0
+
+    def __call__(self, done, total):
+        now = time.time()
+        if done < total and now - self.written_at < PROGRESS_INTERVAL:
+            return
+        self.written_at = now
+        with database.connection(self.db_path) as conn:
+            conn.execute("""
+                UPDATE extraction_jobs SET pages_done = ?, pages_total = ?, heartbeat_at = ?
+                WHERE job_id = ? AND worker_id = ? AND status = 'running'
+            """, (done, total, now, self.job_id, self.worker_id))
+
+
+def run_job(db_path, job, worker_id):
+    """Extract and save one claimed job, then record its outcome"""
+    try:
+        summary = document_extraction.extract_and_save(
+            db_path, job['loan_id'], job['file_path'], job['source_document'],
+            _Progress(db_path, job['job_id'], worker_id), job['source_date'],
+        )
+    except (ValueError, ImportError, OSError) as error:
+        recorded = finish(db_path, job['job_id'], worker_id, error=str(error))
+    except Exception as error:
+        recorded = finish(db_path, job['job_id'], worker_id, error=f"{type(error).__name__}: {error}")
+    else:
+        # Every statement found is in the dedup log and the covenants table - keep the summary small
+        summary.pop('candidates', None)
+        recorded = finish(db_path, job['job_id'], worker_id, result=summary)
+    if recorded:
+        _remove_file(job['file_path'])
+
+
+def list_jobs(db_path, limit=20):
+    """Most recent jobs as dicts, newest first (read fresh - progress doesn't bump data_generation)"""
+    with database.connection(db_path) as conn:
+        return _rows(conn.execute(RECENT_JOBS_QUERY, (limit,)))
+
+
+def get_result(db_path, job_id):
+    """Extraction summary of a finished job, or None"""
+    with database.connection(db_path) as conn:
+        row = conn.execute("SELECT result FROM extraction_jobs WHERE job_id = ?", (int(job_id),)).fetchone()
+    return json.loads(row[0]) if row and row[0] else None
+
+
+_runner_ids = itertools.count(1)
+
+
+class JobRunner:
+    """Background thread that claims queued jobs and works up to `concurrency` of them at once"""
+
+    def __init__(self, db_path, concurrency=MAX_CONCURRENT_JOBS, poll_interval=POLL_INTERVAL):
+        self.db_path = db_path
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.worker_id = f"{os.uname().nodename}:{os.getpid()}:{next(_runner_ids)}"
+        self.last_error = None
+        self._running = set()  # job_ids in flight
+        self._running_lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"extraction-job:{db_path}")
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"job-runner:{db_path}", daemon=True)
+
+    def start(self):
+        """Start claiming jobs (idempotent)"""
+        if not self._thread.is_alive() and not self._stop.is_set():
+            self._thread.start()
+        return self
+
+    def wake(self):
+        """Check the queue now instead of at the next poll"""
+        self._wake.set()
+
+    def stop(self, timeout=5):
+        """Stop claiming; jobs still running are left to be requeued once their heartbeat goes stale"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self):
+        heartbeat_at = 0.0
+        while not self._stop.is_set():
+            try:
+                if time.time() - heartbeat_at >= STALE_AFTER / 4:
+                    with self._running_lock:
+                        running = list(self._running)
+                    heartbeat(self.db_path, self.worker_id, running)
+                    requeue_stale(self.db_path)
+                    heartbeat_at = time.time()
+                while len(self._running) < self.concurrency and not self._stop.is_set():
+                    job = claim(self.db_path, self.worker_id)
+                    if job is None:
+                        break
+                    with self._running_lock:
+                        self._running.add(job['job_id'])
+                    self._pool.submit(self._work, job)
+                self.last_error = None
+            except Exception as error:
+                # Database busy or briefly unavailable - try again on the next poll
+                self.last_error = error
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def _work(self, job):
+        try:
+            run_job(self.db_path, job, self.worker_id)
+        except Exception as error:
+            self.last_error = error  # outcome not recorded; the job is requeued once stale
+        finally:
+            with self._running_lock:
+                self._running.discard(job['job_id'])
+            self._wake.set()
+
+
+# One runner per database file for the server process (shared by all sessions)
+_runners = {}
+_runners_lock = threading.Lock()
+
+
+def get_runner(db_path):
+    """Get the process-wide job runner for a database file, starting it on first use"""
+    runner = _runners.get(db_path)
+    if runner is None:
+        with _runners_lock:
+            runner = _runners.get(db_path)
+            if runner is None:
+                runner = _runners[db_path] = JobRunner(db_path).start()
+    return runner
+
+
+def stop_all():
+    """Stop every runner (registered at exit, before the connection pools close)"""
+    with _runners_lock:
+        for runner in _runners.values():
+            runner.stop()
+        _runners.clear()
+
+
+atexit.register(stop_all)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Work the document extraction queue of a portfolio database")
+    parser.add_argument("db_path")
+    parser.add_argument("--jobs", type=int, default=MAX_CONCURRENT_JOBS, help="Documents extracted at once")
+    args = parser.parse_args()
+
+    migrations.migrate(args.db_path)
+    runner = JobRunner(args.db_path, concurrency=args.jobs).start()
+    print(f"Worker {runner.worker_id} extracting up to {args.jobs} documents at a time (Ctrl-C to stop)")
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        runner.stop()
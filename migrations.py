@@ -0,0 +1,762 @@
+"""
+🧱 COVENANT COMMAND CENTER - SCHEMA MIGRATIONS
+Versioned, in-place upgrades for the covenant database
+
+Each migration runs once, inside its own transaction, and is recorded in
+`schema_migrations`. PRAGMA user_version mirrors the latest version so the
+"already up to date" check on startup is a single header read.
+"""
+
+import re
+from datetime import datetime
+
+import covenant_calendar
+import covenant_mapping
+import covenant_parser
+import database
+
+
+def _create_base_tables(conn):
+    """Core tables (new databases get foreign keys from the start)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS loan_agreements (
+            loan_id INTEGER PRIMARY KEY,
+            deal_name TEXT,
+            borrower_name TEXT,
+            principal_amount REAL,
+            interest_rate REAL,
+            status TEXT,
+            origination_date TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS covenants (
+            covenant_id INTEGER PRIMARY KEY,
+            loan_id INTEGER REFERENCES loan_agreements(loan_id) ON DELETE CASCADE,
+            covenant_name TEXT,
+            covenant_type TEXT,
+            threshold_text TEXT,
+            current_value TEXT,
+            compliance_status TEXT,
+            is_active INTEGER,
+            updated_at TEXT,
+            source_document TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS financial_data (
+            financial_id INTEGER PRIMARY KEY,
+            loan_id INTEGER REFERENCES loan_agreements(loan_id) ON DELETE CASCADE,
+            reporting_period TEXT,
+            total_debt REAL,
+            ebitda REAL,
+            interest_expense REAL,
+            current_assets REAL,
+            current_liabilities REAL,
+            net_worth REAL,
+            upload_date TEXT
+        )
+    ''')
+
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS alerts (
+            alert_id INTEGER PRIMARY KEY,
+            loan_id INTEGER REFERENCES loan_agreements(loan_id) ON DELETE CASCADE,
+            alert_type TEXT,
+            message TEXT,
+            status TEXT,
+            created_at TEXT
+        )
+    ''')
+
+
+def _add_foreign_keys(conn):
+    """Rebuild child tables created before foreign keys existed"""
+    for table in ('covenants', 'financial_data', 'alerts'):
+        if conn.execute(f"PRAGMA foreign_key_list({table})").fetchall():
+            continue
+
+        # Standard SQLite table rebuild: new table, copy rows, swap names
+        create_sql = conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()[0]
+        # The loan_id column definition wherever it sits (any spacing, last column or not)
+        create_sql, found = re.subn(
+            r'\bloan_id\s+INT(?:EGER)?\b',
+            r'\g<0> REFERENCES loan_agreements(loan_id) ON DELETE CASCADE',
+            create_sql, count=1, flags=re.IGNORECASE,
+        )
+        if not found:
+            raise RuntimeError(f"Can't add a foreign key to {table}: no loan_id INTEGER column in {create_sql!r}")
+        create_sql = re.sub(rf'^(\s*CREATE\s+TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?)"?{table}"?',
+                            rf'\g<1>{table}_new', create_sql, count=1, flags=re.IGNORECASE)
+        columns = ", ".join(row[1] for row in conn.execute(f"PRAGMA table_info({table})"))
+
+        conn.execute(create_sql)
+        conn.execute(f"INSERT INTO {table}_new ({columns}) SELECT {columns} FROM {table}")
+        conn.execute(f"DROP TABLE {table}")
+        conn.execute(f"ALTER TABLE {table}_new RENAME TO {table}")
+        if not conn.execute(f"PRAGMA foreign_key_list({table})").fetchall():
+            raise RuntimeError(f"Rebuilt {table} without its loan_agreements foreign key")
+
+    # Foreign keys are off during migrations, so rows of deleted loans were copied as they were
+    for table in ('covenants', 'financial_data', 'alerts'):
+        orphans = [row[1] for row in conn.execute(f"PRAGMA foreign_key_check({table})")]
+        if orphans:
+            raise RuntimeError(
+                f"{len(orphans)} {table} row(s) reference a loan that doesn't exist (rowids "
+                f"{', '.join(map(str, orphans[:10]))}{', ...' if len(orphans) > 10 else ''}) - "
+                f"delete or reassign them, then run the migration again"
+            )
+
+
+def _add_query_indexes(conn):
+    """Indexes for the access paths every page uses"""
+    # Sidebar stats + banner: active loan count / exposure (covering)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_loans_status_principal ON loan_agreements(status, principal_amount)")
+    # Covenant Status loan filter and loan dropdowns
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_loans_deal_name ON loan_agreements(deal_name)")
+
+    # Breach counts, status/type filters and the join back to the loan (covering)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_covenants_active_status
+        ON covenants(is_active, compliance_status, covenant_type, loan_id)
+    """)
+    # Missing-data banner: current_value IS NULL / '' / 'N/A'
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_covenants_active_value ON covenants(is_active, current_value)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_covenants_loan ON covenants(loan_id)")
+
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_financial_loan_period ON financial_data(loan_id, reporting_period)")
+
+    # Recent alerts (ORDER BY created_at DESC) and Alerts page status/type filters
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_created ON alerts(created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_status_type ON alerts(status, alert_type, created_at)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_alerts_loan ON alerts(loan_id)")
+
+    conn.execute("ANALYZE")
+
+
+def _add_numeric_covenant_columns(conn):
+    """Typed threshold/actual columns, derived headroom/status and a backfill"""
+    conn.execute("ALTER TABLE covenants ADD COLUMN threshold_operator TEXT")
+    conn.execute("ALTER TABLE covenants ADD COLUMN threshold_value REAL")
+    conn.execute("ALTER TABLE covenants ADD COLUMN threshold_unit TEXT")
+    conn.execute("ALTER TABLE covenants ADD COLUMN actual_value REAL")
+
+    # Headroom as a fraction of the limit: negative means the covenant is failing
+    conn.execute("""
+        ALTER TABLE covenants ADD COLUMN headroom REAL GENERATED ALWAYS AS (
+            CASE
+                WHEN actual_value IS NULL OR threshold_value IS NULL OR threshold_value = 0 THEN NULL
+                WHEN threshold_operator IN ('<=', '<') THEN (threshold_value - actual_value) / abs(threshold_value)
+                WHEN threshold_operator IN ('>=', '>') THEN (actual_value - threshold_value) / abs(threshold_value)
+            END
+        ) VIRTUAL
+    """)
+    conn.execute(f"""
+        ALTER TABLE covenants ADD COLUMN numeric_status TEXT GENERATED ALWAYS AS (
+            CASE
+                WHEN headroom IS NULL THEN NULL
+                WHEN headroom < 0 OR (headroom = 0 AND threshold_operator IN ('<', '>')) THEN 'BREACH'
+                WHEN headroom < {covenant_parser.AT_RISK_HEADROOM} THEN 'AT_RISK'
+                ELSE 'COMPLIANT'
+            END
+        ) VIRTUAL
+    """)
+
+    # "Closest to the limit" sorting and breach/headroom range filters
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_covenants_active_headroom ON covenants(is_active, headroom)")
+
+    covenant_parser.backfill_parsed_columns(conn)
+
+
+# Per-row contribution of a loan / covenant / alert to portfolio_summary.
+# `{r}` is NEW or OLD; IS comparisons keep NULLs counting as 0.
+_LOAN_TERMS = {
+    'active_loans': "({r}.status IS 'Active')",
+    'total_exposure': "(CASE WHEN {r}.status IS 'Active' THEN IFNULL({r}.principal_amount, 0) ELSE 0 END)",
+}
+_COVENANT_TERMS = {
+    'active_covenants': "({r}.is_active IS 1)",
+    'breach_count': "({r}.is_active IS 1 AND {r}.compliance_status IS 'BREACH')",
+    'at_risk_count': "({r}.is_active IS 1 AND {r}.compliance_status IS 'AT_RISK')",
+    'missing_data_count': "({r}.is_active IS 1 AND ({r}.current_value IS NULL OR {r}.current_value IN ('', 'N/A')))",
+}
+_ALERT_TERMS = {
+    'active_alerts': "({r}.status IS 'Active')",
+    'active_breach_alerts': "({r}.status IS 'Active' AND {r}.alert_type IS 'BREACH')",
+    'active_warning_alerts': "({r}.status IS 'Active' AND {r}.alert_type IS 'WARNING')",
+    'active_info_alerts': "({r}.status IS 'Active' AND {r}.alert_type IS 'INFO')",
+}
+
+
+def _summary_triggers(conn, table, terms, watched_columns):
+    """Insert/update/delete triggers applying a row's delta to portfolio_summary"""
+    def delta(sign_new, sign_old):
+        parts = []
+        for column, term in terms.items():
+            expr = column
+            if sign_new:
+                expr += " + " + term.format(r='NEW')
+            if sign_old:
+                expr += " - " + term.format(r='OLD')
+            parts.append(f"{column} = {expr}")
+        return ", ".join(parts)
+
+    for event, sql in (
+        ("INSERT", delta(True, False)),
+        ("DELETE", delta(False, True)),
+        (f"UPDATE OF {', '.join(watched_columns)}", delta(True, True)),
+    ):
+        name = f"trg_summary_{table}_{event.split()[0].lower()}"
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS {name}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE portfolio_summary SET {sql} WHERE summary_id = 1;
+            END
+        """)
+
+
+def rebuild_portfolio_summary(conn):
+    """Recompute portfolio_summary from scratch (triggers keep it current afterwards)"""
+    def aggregates(table, terms):
+        selects = ", ".join(f"IFNULL(SUM({term.format(r=table)}), 0)" for term in terms.values())
+        return conn.execute(f"SELECT {selects} FROM {table}").fetchone()
+
+    columns = list(_LOAN_TERMS) + list(_COVENANT_TERMS) + list(_ALERT_TERMS)
+    values = (
+        aggregates('loan_agreements', _LOAN_TERMS)
+        + aggregates('covenants', _COVENANT_TERMS)
+        + aggregates('alerts', _ALERT_TERMS)
+    )
+    placeholders = ", ".join("?" for _ in columns)
+    conn.execute(
+        f"INSERT OR REPLACE INTO portfolio_summary (summary_id, {', '.join(columns)}) VALUES (1, {placeholders})",
+        values,
+    )
+
+
+def _add_portfolio_summary(conn):
+    """Single-row materialized portfolio summary kept current by triggers"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS portfolio_summary (
+            summary_id INTEGER PRIMARY KEY CHECK (summary_id = 1),
+            active_loans INTEGER NOT NULL DEFAULT 0,
+            total_exposure REAL NOT NULL DEFAULT 0,
+            active_covenants INTEGER NOT NULL DEFAULT 0,
+            breach_count INTEGER NOT NULL DEFAULT 0,
+            at_risk_count INTEGER NOT NULL DEFAULT 0,
+            missing_data_count INTEGER NOT NULL DEFAULT 0,
+            active_alerts INTEGER NOT NULL DEFAULT 0,
+            active_breach_alerts INTEGER NOT NULL DEFAULT 0,
+            active_warning_alerts INTEGER NOT NULL DEFAULT 0,
+            active_info_alerts INTEGER NOT NULL DEFAULT 0,
+            compliance_rate REAL GENERATED ALWAYS AS (
+                CASE WHEN active_covenants > 0
+                    THEN (active_covenants - breach_count) * 100.0 / active_covenants
+                    ELSE 100.0
+                END
+            ) VIRTUAL
+        )
+    """)
+
+    _summary_triggers(conn, 'loan_agreements', _LOAN_TERMS, ['status', 'principal_amount'])
+    _summary_triggers(conn, 'covenants', _COVENANT_TERMS, ['is_active', 'compliance_status', 'current_value'])
+    _summary_triggers(conn, 'alerts', _ALERT_TERMS, ['status', 'alert_type'])
+
+    rebuild_portfolio_summary(conn)
+
+
+def _generation_triggers(conn, table):
+    """Bump data_generation on every write to a table (query cache invalidation)"""
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_generation_{table}_{event.lower()}
+            AFTER {event} ON {table}
+            BEGIN
+                UPDATE data_generation SET generation = generation + 1 WHERE generation_id = 1;
+            END
+        """)
+
+
+def _add_data_generation(conn):
+    """Write-generation counter that changes whenever cached data could be stale"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS data_generation (
+            generation_id INTEGER PRIMARY KEY CHECK (generation_id = 1),
+            generation INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("INSERT OR IGNORE INTO data_generation (generation_id, generation) VALUES (1, 0)")
+
+    for table in ('loan_agreements', 'covenants', 'financial_data', 'alerts'):
+        _generation_triggers(conn, table)
+
+
+def _add_sort_rank_columns(conn):
+    """Indexed sort keys replacing ORDER BY CASE expressions on the list pages"""
+    conn.execute("""
+        ALTER TABLE covenants ADD COLUMN status_rank INTEGER GENERATED ALWAYS AS (
+            CASE compliance_status
+                WHEN 'BREACH' THEN 1
+                WHEN 'AT_RISK' THEN 2
+                WHEN 'COMPLIANT' THEN 3
+                ELSE 4
+            END
+        ) VIRTUAL
+    """)
+    conn.execute("""
+        ALTER TABLE alerts ADD COLUMN type_rank INTEGER GENERATED ALWAYS AS (
+            CASE alert_type
+                WHEN 'BREACH' THEN 1
+                WHEN 'CRITICAL' THEN 2
+                WHEN 'WARNING' THEN 3
+                ELSE 4
+            END
+        ) VIRTUAL
+    """)
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_covenants_active_rank
+        ON covenants(is_active, status_rank, loan_id, covenant_id)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alerts_rank_created
+        ON alerts(type_rank, created_at DESC, alert_id DESC)
+    """)
+    # Same order within one status (Active / Resolved / Dismissed filter)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_alerts_status_rank_created
+        ON alerts(status, type_rank, created_at DESC, alert_id DESC)
+    """)
+
+
+def _unique_financial_periods(conn):
+    """One financial_data row per loan and reporting period (re-uploads replace the row)"""
+    # Keep the most recent upload of each period
+    conn.execute("""
+        DELETE FROM financial_data
+        WHERE financial_id NOT IN (
+            SELECT MAX(financial_id) FROM financial_data GROUP BY loan_id, reporting_period
+        )
+    """)
+    conn.execute("DROP INDEX IF EXISTS idx_financial_loan_period")
+    conn.execute("""
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_financial_loan_period
+        ON financial_data(loan_id, reporting_period)
+    """)
+
+
+# Month a rollup trigger books a change under - local time, like every other date the app shows
+_ROLLUP_MONTH = "strftime('%Y-%m', 'now', 'localtime')"
+_ROLLUP_TRIGGERS = ('trg_rollup_covenants_insert', 'trg_rollup_covenants_delete', 'trg_rollup_covenants_update')
+
+
+def _rollup_triggers(conn):
+    """Keep the monthly rollups current as covenants are inserted, re-tested or removed"""
+    # The first change in a month carries the previous month's closing counts forward
+    seed = f"""
+        INSERT INTO covenant_status_monthly (month, covenant_type, status, covenant_count)
+        SELECT {_ROLLUP_MONTH}, covenant_type, status, covenant_count
+        FROM covenant_status_monthly
+        WHERE month = (SELECT MAX(month) FROM covenant_status_monthly WHERE month < {_ROLLUP_MONTH})
+        AND NOT EXISTS (SELECT 1 FROM covenant_status_monthly WHERE month = {_ROLLUP_MONTH});
+    """
+
+    def count(r, sign):
+        return f"""
+        INSERT INTO covenant_status_monthly (month, covenant_type, status, covenant_count)
+        SELECT {_ROLLUP_MONTH}, IFNULL({r}.covenant_type, 'Other'), IFNULL({r}.compliance_status, 'NOT_TESTED'), {sign}1
+        WHERE {r}.is_active IS 1
+        ON CONFLICT(month, covenant_type, status) DO UPDATE SET covenant_count = covenant_count {sign} 1;
+    """
+
+    breach = f"""
+        INSERT INTO breach_events_monthly (month, loan_id, breach_count)
+        SELECT {_ROLLUP_MONTH}, NEW.loan_id, 1
+        WHERE NEW.is_active IS 1 AND NEW.compliance_status IS 'BREACH' AND NEW.loan_id IS NOT NULL
+        {{old_not_breach}}
+        ON CONFLICT(month, loan_id) DO UPDATE SET breach_count = breach_count + 1;
+    """
+
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_covenants_insert
+        AFTER INSERT ON covenants
+        BEGIN
+            {seed}
+            {count('NEW', '+')}
+            {breach.format(old_not_breach='')}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_covenants_delete
+        AFTER DELETE ON covenants
+        BEGIN
+            {seed}
+            {count('OLD', '-')}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_rollup_covenants_update
+        AFTER UPDATE OF compliance_status, is_active, covenant_type ON covenants
+        WHEN OLD.compliance_status IS NOT NEW.compliance_status
+          OR OLD.is_active IS NOT NEW.is_active
+          OR OLD.covenant_type IS NOT NEW.covenant_type
+        BEGIN
+            {seed}
+            {count('OLD', '-')}
+            {count('NEW', '+')}
+            {breach.format(old_not_breach="AND (OLD.compliance_status IS NOT 'BREACH' OR OLD.is_active IS NOT 1)")}
+        END
+    """)
+
+
+def _add_monthly_rollups(conn):
+    """Month-end covenant status counts and monthly breach counts per loan for Analytics"""
+    # Counts of active covenants by type and status as of the end of each month
+    # (a month without changes has no rows - readers carry the previous month forward)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS covenant_status_monthly (
+            month TEXT NOT NULL,
+            covenant_type TEXT NOT NULL,
+            status TEXT NOT NULL,
+            covenant_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, covenant_type, status)
+        ) WITHOUT ROWID
+    """)
+    # Covenants that moved into BREACH, per loan and month
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS breach_events_monthly (
+            month TEXT NOT NULL,
+            loan_id INTEGER NOT NULL,
+            breach_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (month, loan_id)
+        ) WITHOUT ROWID
+    """)
+
+    # Seed the current month from the current state; history starts here
+    conn.execute(f"""
+        INSERT OR REPLACE INTO covenant_status_monthly (month, covenant_type, status, covenant_count)
+        SELECT {_ROLLUP_MONTH}, IFNULL(covenant_type, 'Other'), IFNULL(compliance_status, 'NOT_TESTED'), COUNT(*)
+        FROM covenants
+        WHERE is_active = 1
+        GROUP BY 2, 3
+    """)
+    conn.execute(f"""
+        INSERT OR REPLACE INTO breach_events_monthly (month, loan_id, breach_count)
+        SELECT {_ROLLUP_MONTH}, loan_id, COUNT(*)
+        FROM covenants
+        WHERE is_active = 1 AND compliance_status = 'BREACH' AND loan_id IS NOT NULL
+        GROUP BY loan_id
+    """)
+
+    _rollup_triggers(conn)
+
+
+def _add_covenant_test_results(conn):
+    """Append-only record of what each covenant tested at in each reporting period"""
+    # Clustered on (period, covenant): a period's results sit together, so a test run
+    # appends one contiguous range and pruning old periods is a range delete
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS covenant_test_results (
+            reporting_period TEXT NOT NULL,
+            covenant_id INTEGER NOT NULL,
+            loan_id INTEGER NOT NULL,
+            tested_value REAL,
+            headroom REAL,
+            status TEXT NOT NULL,
+            tested_at INTEGER NOT NULL,  -- unix seconds; text timestamps would double the row
+            PRIMARY KEY (reporting_period, covenant_id)
+        ) WITHOUT ROWID
+    """)
+    # Latest result of a covenant: one seek, first entry
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_test_results_covenant_period
+        ON covenant_test_results(covenant_id, reporting_period DESC)
+    """)
+    # Test history of one loan, period by period
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_test_results_loan_period
+        ON covenant_test_results(loan_id, reporting_period)
+    """)
+
+
+def _tests_due_triggers(conn):
+    """Keep covenant_tests_due counting active covenants per next test date"""
+    def count(r, sign):
+        return f"""
+        INSERT INTO covenant_tests_due (test_date, covenant_count)
+        SELECT {r}.next_test_date, {sign}1
+        WHERE {r}.is_active IS 1 AND {r}.next_test_date IS NOT NULL
+        ON CONFLICT(test_date) DO UPDATE SET covenant_count = covenant_count {sign} 1;
+    """
+
+    empty = "DELETE FROM covenant_tests_due WHERE test_date = OLD.next_test_date AND covenant_count <= 0;"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tests_due_covenants_insert
+        AFTER INSERT ON covenants
+        BEGIN
+            {count('NEW', '+')}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tests_due_covenants_delete
+        AFTER DELETE ON covenants
+        BEGIN
+            {count('OLD', '-')}
+            {empty}
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_tests_due_covenants_update
+        AFTER UPDATE OF next_test_date, is_active ON covenants
+        WHEN OLD.next_test_date IS NOT NEW.next_test_date OR OLD.is_active IS NOT NEW.is_active
+        BEGIN
+            {count('OLD', '-')}
+            {empty}
+            {count('NEW', '+')}
+        END
+    """)
+
+
+def _add_test_calendar(conn):
+    """Test frequency, reporting lag and next test date per covenant, with per-day due counts"""
+    conn.execute(f"""
+        ALTER TABLE covenants ADD COLUMN test_frequency TEXT NOT NULL
+        DEFAULT '{covenant_calendar.DEFAULT_FREQUENCY}'
+    """)
+    conn.execute(f"""
+        ALTER TABLE covenants ADD COLUMN reporting_lag_days INTEGER NOT NULL
+        DEFAULT {covenant_calendar.DEFAULT_REPORTING_LAG_DAYS}
+    """)
+    conn.execute("ALTER TABLE covenants ADD COLUMN next_test_date TEXT")
+    # Only active covenants are ever scheduled or listed
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_covenants_next_test
+        ON covenants(next_test_date, covenant_id) WHERE is_active = 1
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS covenant_tests_due (
+            test_date TEXT PRIMARY KEY,
+            covenant_count INTEGER NOT NULL DEFAULT 0
+        ) WITHOUT ROWID
+    """)
+
+    # No test history to go on yet - every covenant starts at its next scheduled date
+    covenant_calendar.schedule_unscheduled(conn)
+    conn.execute("""
+        INSERT OR REPLACE INTO covenant_tests_due (test_date, covenant_count)
+        SELECT next_test_date, COUNT(*) FROM covenants
+        WHERE is_active = 1 AND next_test_date IS NOT NULL
+        GROUP BY next_test_date
+    """)
+    _tests_due_triggers(conn)
+
+
+def _add_extraction_provenance(conn):
+    """Where in its source document an extracted covenant was found"""
+    conn.execute("ALTER TABLE covenants ADD COLUMN source_page INTEGER")
+    # 'table', 'footnote' or 'text'
+    conn.execute("ALTER TABLE covenants ADD COLUMN source_section TEXT")
+    # Re-extracting a document updates the covenants it produced last time
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_covenants_loan_source
+        ON covenants(loan_id, source_document)
+    """)
+
+
+def _add_canonical_names(conn):
+    """Standard covenant name from the mapping table, alongside the name as written"""
+    conn.execute("ALTER TABLE covenants ADD COLUMN canonical_name TEXT")
+    # One loan's covenants by standard name (re-extraction, duplicate checks)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_covenants_loan_canonical
+        ON covenants(loan_id, canonical_name)
+    """)
+    covenant_mapping.backfill_canonical_names(conn)
+
+
+def _add_dedup_log(conn):
+    """Effective date of a covenant's source document, and the dedup audit log"""
+    # Amendments supersede earlier documents' statements by this date
+    conn.execute("ALTER TABLE covenants ADD COLUMN source_date TEXT")
+    # One row per statement the dedup stage dropped, with the statement kept instead
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS covenant_dedup_log (
+            log_id INTEGER PRIMARY KEY,
+            decided_at INTEGER NOT NULL,
+            loan_id INTEGER NOT NULL,
+            canonical_name TEXT NOT NULL,
+            source_document TEXT,
+            kept_covenant_id INTEGER,
+            kept_source TEXT,
+            kept_threshold TEXT,
+            dropped_covenant_id INTEGER,
+            dropped_source TEXT,
+            dropped_threshold TEXT,
+            reason TEXT NOT NULL
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_dedup_log_loan_decided
+        ON covenant_dedup_log(loan_id, decided_at)
+    """)
+
+
+def _add_extraction_jobs(conn):
+    """Durable queue of document extractions, worked by job_queue runners"""
+    # Progress and heartbeats are written here often - no data_generation trigger on purpose
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS extraction_jobs (
+            job_id INTEGER PRIMARY KEY,
+            loan_id INTEGER NOT NULL,
+            source_document TEXT NOT NULL,
+            source_date TEXT,
+            file_path TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            pages_done INTEGER NOT NULL DEFAULT 0,
+            pages_total INTEGER,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            worker_id TEXT,
+            heartbeat_at REAL,
+            created_at REAL NOT NULL,
+            started_at REAL,
+            finished_at REAL,
+            result TEXT,
+            error TEXT
+        )
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_extraction_jobs_status
+        ON extraction_jobs(status, job_id)
+    """)
+
+
+def _add_test_result_revisions(conn):
+    """Re-tests of a period add a revision to covenant_test_results instead of overwriting it"""
+    conn.execute("""
+        CREATE TABLE covenant_test_results_new (
+            reporting_period TEXT NOT NULL,
+            covenant_id INTEGER NOT NULL,
+            revision INTEGER NOT NULL,  -- 1 for a period's first test, +1 for each changed re-test
+            loan_id INTEGER NOT NULL,
+            tested_value REAL,
+            headroom REAL,
+            status TEXT NOT NULL,
+            tested_at INTEGER NOT NULL,
+            PRIMARY KEY (reporting_period, covenant_id, revision)
+        ) WITHOUT ROWID
+    """)
+    conn.execute("""
+        INSERT INTO covenant_test_results_new
+        (reporting_period, covenant_id, revision, loan_id, tested_value, headroom, status, tested_at)
+        SELECT reporting_period, covenant_id, 1, loan_id, tested_value, headroom, status, tested_at
+        FROM covenant_test_results
+    """)
+    conn.execute("DROP TABLE covenant_test_results")
+    conn.execute("ALTER TABLE covenant_test_results_new RENAME TO covenant_test_results")
+    # Latest result of a covenant: one seek, first entry
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_test_results_covenant_period
+        ON covenant_test_results(covenant_id, reporting_period DESC, revision DESC)
+    """)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS idx_test_results_loan_period
+        ON covenant_test_results(loan_id, reporting_period)
+    """)
+
+
+def _rollups_local_month(conn):
+    """Book rollup changes under the local month (the triggers used UTC, the Analytics page local time)"""
+    for name in _ROLLUP_TRIGGERS:
+        conn.execute(f"DROP TRIGGER IF EXISTS {name}")
+    _rollup_triggers(conn)
+
+    # UTC may already be a month ahead: fold that month into the local one
+    conn.execute(f"""
+        DELETE FROM covenant_status_monthly
+        WHERE month = {_ROLLUP_MONTH}
+        AND EXISTS (SELECT 1 FROM covenant_status_monthly WHERE month > {_ROLLUP_MONTH})
+    """)
+    conn.execute(f"UPDATE covenant_status_monthly SET month = {_ROLLUP_MONTH} WHERE month > {_ROLLUP_MONTH}")
+    conn.execute(f"""
+        INSERT INTO breach_events_monthly (month, loan_id, breach_count)
+        SELECT {_ROLLUP_MONTH}, loan_id, breach_count
+        FROM breach_events_monthly
+        WHERE month > {_ROLLUP_MONTH}
+        ON CONFLICT(month, loan_id) DO UPDATE SET breach_count = breach_count + excluded.breach_count
+    """)
+    conn.execute(f"DELETE FROM breach_events_monthly WHERE month > {_ROLLUP_MONTH}")
+
+
+# (version, description, step) - append only, never edit a released step
+MIGRATIONS = [
+    (1, "Create base tables", _create_base_tables),
+    (2, "Add foreign keys to covenants, financial_data and alerts", _add_foreign_keys),
+    (3, "Add indexes for dashboard, covenant status and alert queries", _add_query_indexes),
+    (4, "Add typed threshold/value columns with headroom", _add_numeric_covenant_columns),
+    (5, "Add trigger-maintained portfolio_summary", _add_portfolio_summary),
+    (6, "Add data_generation write counter", _add_data_generation),
+    (7, "Add indexed status/type sort ranks", _add_sort_rank_columns),
+    (8, "Make financial_data unique per loan and period", _unique_financial_periods),
+    (9, "Add trigger-maintained monthly analytics rollups", _add_monthly_rollups),
+    (10, "Add per-period covenant_test_results history", _add_covenant_test_results),
+    (11, "Add covenant test calendar", _add_test_calendar),
+    (12, "Add extraction provenance to covenants", _add_extraction_provenance),
+    (13, "Add mapping-table canonical covenant names", _add_canonical_names),
+    (14, "Add source document dates and the dedup audit log", _add_dedup_log),
+    (15, "Add the document extraction job queue", _add_extraction_jobs),
+    (16, "Keep every revision of a period's covenant test result", _add_test_result_revisions),
+    (17, "Book analytics rollups under the local month", _rollups_local_month),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def get_schema_version(conn):
+    """Current schema version recorded in the database header"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(db_path):
+    """Upgrade a database in place to the latest schema version"""
+    with database.connection(db_path) as conn:
+        if get_schema_version(conn) >= LATEST_VERSION:
+            return LATEST_VERSION
+
+        # Table rebuilds need foreign keys off; the pragma is ignored inside a transaction
+        conn.execute("PRAGMA foreign_keys = OFF")
+        try:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description TEXT,
+                    applied_at TEXT
+                )
+            """)
+
+            for version, description, step in MIGRATIONS:
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    # Re-check under the write lock in case another process got here first
+                    if get_schema_version(conn) >= version:
+                        conn.execute("ROLLBACK")
+                        continue
+
+                    step(conn)
+                    conn.execute(
+                        "INSERT INTO schema_migrations (version, description, applied_at) VALUES (?, ?, ?)",
+                        (version, description, datetime.now().isoformat()),
+                    )
+                    conn.execute(f"PRAGMA user_version = {version}")
+                except BaseException:
+                    conn.execute("ROLLBACK")
+                    raise
+                conn.execute("COMMIT")
+        finally:
+            conn.execute("PRAGMA foreign_keys = ON")
+
+        return get_schema_version(conn)
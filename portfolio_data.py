@@ -0,0 +1,363 @@
+"""
+📦 COVENANT COMMAND CENTER - PORTFOLIO DATA
+Data-loading layer behind every page: sample data, cached queries, sidebar
+stats and the dashboard banner. No Streamlit calls, so the benchmark suite
+(and anything else) can import and time exactly what the pages run.
+"""
+
+from datetime import date, datetime, timedelta
+
+import pandas as pd
+
+import covenant_calendar
+import covenant_mapping
+import covenant_parser
+import database
+import migrations
+import query_cache
+
+
+# Rows kept for each banner detail table (the banner title carries the full count)
+BANNER_DETAIL_ROWS = 100
+
+# Dashboard banner: breach details expander (param: row limit)
+BREACH_DETAILS_QUERY = """
+    SELECT 
+        l.deal_name as 'Loan',
+        c.covenant_name as 'Covenant',
+        c.current_value as 'Current',
+        c.threshold_text as 'Threshold'
+    FROM covenants c
+    JOIN loan_agreements l ON c.loan_id = l.loan_id
+    WHERE c.compliance_status = 'BREACH' AND c.is_active = 1
+    ORDER BY l.deal_name, c.covenant_name
+    LIMIT ?
+"""
+
+# Dashboard banner: covenants missing financial data (param: row limit)
+MISSING_DATA_QUERY = """
+    SELECT 
+        l.deal_name as 'Loan',
+        c.covenant_name as 'Covenant',
+        c.covenant_type as 'Type',
+        c.threshold_text as 'Threshold'
+    FROM covenants c
+    JOIN loan_agreements l ON c.loan_id = l.loan_id
+    WHERE c.is_active = 1 
+    AND (c.current_value IS NULL OR c.current_value = '' OR c.current_value = 'N/A')
+    ORDER BY l.deal_name, c.covenant_name
+    LIMIT ?
+"""
+
+# Dashboard: covenant status by loan
+DASHBOARD_COVENANTS_QUERY = """
+    SELECT 
+        l.deal_name as 'Loan',
+        l.borrower_name as 'Borrower',
+        c.covenant_name as 'Covenant',
+        c.covenant_type as 'Type',
+        c.compliance_status as 'Status',
+        c.current_value as 'Current Value',
+        c.threshold_text as 'Threshold'
+    FROM covenants c
+    LEFT JOIN loan_agreements l ON c.loan_id = l.loan_id
+    WHERE c.is_active = 1
+    ORDER BY c.status_rank
+"""
+
+# Dashboard: recent alerts
+RECENT_ALERTS_QUERY = """
+    SELECT 
+        a.created_at as 'Date',
+        l.deal_name as 'Loan',
+        a.alert_type as 'Type',
+        a.message as 'Message',
+        a.status as 'Status'
+    FROM alerts a
+    JOIN loan_agreements l ON a.loan_id = l.loan_id
+    ORDER BY a.created_at DESC
+    LIMIT 5
+"""
+
+# Alerts page: active alert counts (trigger-maintained)
+ALERT_SUMMARY_QUERY = """
+    SELECT 
+        active_breach_alerts,
+        active_warning_alerts,
+        active_info_alerts
+    FROM portfolio_summary
+    WHERE summary_id = 1
+"""
+
+# Covenant Status: loan filter options
+LOAN_NAMES_QUERY = "SELECT DISTINCT deal_name FROM loan_agreements ORDER BY deal_name"
+
+# Upload Data: loan selector
+ACTIVE_LOANS_QUERY = (
+    "SELECT loan_id, deal_name, borrower_name FROM loan_agreements WHERE status = 'Active' ORDER BY deal_name"
+)
+
+# Upload Data: one loan's covenant test results (latest revision of each), newest period first (param: loan_id)
+LOAN_TEST_HISTORY_QUERY = """
+    SELECT
+        h.reporting_period AS 'Period',
+        c.covenant_name AS 'Covenant',
+        h.tested_value,
+        c.threshold_unit,
+        ROUND(h.headroom * 100, 1) AS 'Headroom %',
+        h.status AS 'Status'
+    FROM covenant_test_results h
+    JOIN covenants c ON c.covenant_id = h.covenant_id
+    WHERE h.loan_id = ?
+    AND h.revision = (
+        SELECT MAX(revision) FROM covenant_test_results
+        WHERE reporting_period = h.reporting_period AND covenant_id = h.covenant_id
+    )
+    ORDER BY h.reporting_period DESC, c.covenant_name
+"""
+
+# Analytics: month-end status counts from the snapshot in effect at the start month onwards
+# (params: start month twice; a primary-key range scan of covenant_status_monthly)
+STATUS_TREND_QUERY = """
+    SELECT month, status, SUM(covenant_count) AS covenants
+    FROM covenant_status_monthly
+    WHERE month >= IFNULL((SELECT MAX(month) FROM covenant_status_monthly WHERE month <= ?), ?)
+    GROUP BY month, status
+    ORDER BY month
+"""
+
+# Analytics: active covenants by type in the latest month
+COVENANT_TYPE_QUERY = """
+    SELECT covenant_type AS 'Type', SUM(covenant_count) AS 'Count'
+    FROM covenant_status_monthly
+    WHERE month = (SELECT MAX(month) FROM covenant_status_monthly)
+    GROUP BY covenant_type
+    HAVING SUM(covenant_count) > 0
+    ORDER BY 2 DESC
+"""
+
+# Analytics: loans with the most new breaches since the start month
+BREACHES_BY_BORROWER_QUERY = """
+    SELECT
+        l.borrower_name AS 'Borrower',
+        l.deal_name AS 'Loan',
+        SUM(b.breach_count) AS 'Total Breaches',
+        (SELECT CASE MIN(c.status_rank)
+                    WHEN 1 THEN 'Breach' WHEN 2 THEN 'At Risk' WHEN 3 THEN 'Compliant' ELSE 'Not Tested'
+                END
+         FROM covenants c
+         WHERE c.loan_id = b.loan_id AND c.is_active = 1) AS 'Current Status'
+    FROM breach_events_monthly b
+    JOIN loan_agreements l ON l.loan_id = b.loan_id
+    WHERE b.month >= ?
+    GROUP BY b.loan_id
+    ORDER BY 3 DESC, l.borrower_name
+    LIMIT 10
+"""
+
+# Status columns of the compliance trend chart
+TREND_STATUSES = {'COMPLIANT': 'Compliant', 'AT_RISK': 'At Risk', 'BREACH': 'Breach'}
+
+
+def create_sample_database(db_path):
+    """Create sample database for demo"""
+    migrations.migrate(db_path)
+
+    with database.transaction(db_path) as conn:
+        _create_sample_data(conn.cursor())
+        covenant_parser.backfill_parsed_columns(conn)
+        covenant_mapping.backfill_canonical_names(conn)
+        covenant_calendar.schedule_unscheduled(conn)
+
+
+def _create_sample_data(cursor):
+    """Insert sample rows"""
+    sample_loans = [
+        (1, 'Aerospace Credit Facility 2022', 'Aerospace Industries Inc', 50000000, 5.5, 'Active', '2022-01-15'),
+        (2, 'Manufacturing Term Loan', 'Global Manufacturing Corp', 30000000, 4.8, 'Active', '2021-06-20'),
+        (3, 'Tech Startup Revolver', 'TechCo Innovations', 15000000, 6.2, 'Active', '2023-03-10'),
+        (4, 'Real Estate Bridge Loan', 'Property Holdings LLC', 25000000, 5.0, 'Active', '2022-09-01'),
+    ]
+
+    cursor.executemany('''
+        INSERT OR IGNORE INTO loan_agreements 
+        (loan_id, deal_name, borrower_name, principal_amount, interest_rate, status, origination_date)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', sample_loans)
+
+    sample_covenants = [
+        (1, 1, 'Maximum Leverage Ratio', 'Financial', '≤ 4.50x', '5.20x', 'BREACH', 1, datetime.now().isoformat(),
+         'Credit Agreement 2022.pdf'),
+        (2, 1, 'Minimum Interest Coverage Ratio', 'Financial', '≥ 3.00x', '2.85x', 'BREACH', 1,
+         datetime.now().isoformat(), 'Credit Agreement 2022.pdf'),
+        (3, 2, 'Maximum Leverage Ratio', 'Financial', '≤ 3.00x', '2.50x', 'COMPLIANT', 1, datetime.now().isoformat(),
+         'Term Loan Agreement.pdf'),
+        (4, 3, 'Minimum EBITDA', 'Financial', '≥ $5,000,000', '$6,200,000', 'COMPLIANT', 1, datetime.now().isoformat(),
+         'Revolver Agreement.pdf'),
+        (5, 4, 'Current Ratio', 'Financial', '≥ 1.20x', '1.15x', 'AT_RISK', 1, datetime.now().isoformat(),
+         'Bridge Loan Agreement.pdf'),
+    ]
+
+    cursor.executemany('''
+        INSERT OR IGNORE INTO covenants 
+        (covenant_id, loan_id, covenant_name, covenant_type, threshold_text, current_value,
+         compliance_status, is_active, updated_at, source_document)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    ''', sample_covenants)
+
+    sample_alerts = [
+        (1, 1, 'BREACH', 'Leverage Ratio breach detected: 5.20x (Limit: 4.50x)', 'Active', datetime.now().isoformat()),
+        (2, 1, 'BREACH', 'Interest Coverage breach detected: 2.85x (Required: 3.00x)', 'Active',
+         datetime.now().isoformat()),
+        (3, 4, 'WARNING', 'Current Ratio approaching threshold', 'Active', datetime.now().isoformat()),
+    ]
+
+    cursor.executemany('''
+        INSERT OR IGNORE INTO alerts 
+        (alert_id, loan_id, alert_type, message, status, created_at)
+        VALUES (?, ?, ?, ?, ?, ?)
+    ''', sample_alerts)
+
+
+def load_data(db_path, query, params=None):
+    """Load data from database (cached until the data changes; the result is the caller's own copy)"""
+    return query_cache.cached_query(db_path, query, params)
+
+
+def rollup_month(days_ago=0):
+    """Month (YYYY-MM) on the local clock, `days_ago` days back - the rollup triggers' basis"""
+    return (datetime.now() - timedelta(days=days_ago)).strftime('%Y-%m')
+
+
+def get_compliance_trend(db_path, start_month, end_month):
+    """Monthly % of active covenants by status from start_month (YYYY-MM) to end_month, gaps carried forward"""
+    counts = load_data(db_path, STATUS_TREND_QUERY, [start_month, start_month])
+    months = pd.period_range(start_month, end_month, freq='M').strftime('%Y-%m')
+    if counts.empty:
+        return pd.DataFrame(columns=list(TREND_STATUSES.values()), index=pd.Index([], name='Month'))
+
+    table = counts.pivot_table(index='month', columns='status', values='covenants', aggfunc='sum', fill_value=0)
+    # A month without changes closes where the previous one did (the opening snapshot may predate start_month)
+    table = table.reindex(table.index.union(months)).ffill().loc[months].dropna(how='all')
+    totals = table.sum(axis=1).replace(0, float('nan'))
+    trend = table.reindex(columns=list(TREND_STATUSES), fill_value=0).div(totals, axis=0) * 100
+    trend = trend.rename(columns=TREND_STATUSES).round(1)
+    trend.index.name = 'Month'
+    trend.columns.name = None
+    return trend
+
+
+def get_portfolio_stats(db_path):
+    """Get portfolio statistics"""
+    with database.connection(db_path) as conn:
+        return _get_portfolio_stats(conn.cursor())
+
+
+def _get_portfolio_stats(cursor):
+    """Read portfolio statistics from the trigger-maintained summary row"""
+    cursor.execute("""
+        SELECT active_loans, total_exposure, breach_count, compliance_rate, active_covenants
+        FROM portfolio_summary
+        WHERE summary_id = 1
+    """)
+    total_loans, total_exposure, active_breaches, compliance, active_covenants = (
+        cursor.fetchone() or (0, 0, 0, 100.0, 0)
+    )
+
+    return {
+        'total_loans': total_loans,
+        'total_exposure': total_exposure,
+        'active_breaches': active_breaches,
+        'compliance': compliance,
+        'active_covenants': active_covenants,
+    }
+
+
+def read_portfolio_state(conn):
+    """Sidebar stats, dashboard banner and banner details (first BANNER_DETAIL_ROWS) read on one connection"""
+    cursor = conn.cursor()
+    return {
+        'stats': _get_portfolio_stats(cursor),
+        'banner': _get_banner_status(cursor),
+        'breach_details': pd.read_sql_query(BREACH_DETAILS_QUERY, conn, params=[BANNER_DETAIL_ROWS]),
+        'missing_data_details': pd.read_sql_query(MISSING_DATA_QUERY, conn, params=[BANNER_DETAIL_ROWS]),
+    }
+
+
+def get_banner_status(db_path):
+    """
+    Returns banner with DUAL priorities:
+    1. BREACH alerts (RED - highest priority)
+    2. UPLOAD REMINDERS (YELLOW/ORANGE - missing data)
+    3. UPCOMING TESTS (BLUE - next 7 days)
+    4. ALL GOOD (GREEN - everything compliant)
+    """
+    with database.connection(db_path) as conn:
+        return _get_banner_status(conn.cursor())
+
+
+def _get_banner_status(cursor):
+    """Run the banner queries on a pooled cursor and pick the banner"""
+    # Priority 1 + 2: ACTIVE BREACHES and MISSING FINANCIAL DATA (one summary row read)
+    cursor.execute("""
+        SELECT breach_count, missing_data_count
+        FROM portfolio_summary
+        WHERE summary_id = 1
+    """)
+    breach_count, missing_data_count = cursor.fetchone() or (0, 0)
+    
+    # Priority 3: UPCOMING TESTS from the covenant test calendar (index range reads)
+    today = date.today()
+    upcoming_count, upcoming_tests = covenant_calendar.upcoming_tests(cursor, 7, today)
+    upcoming_30_count, upcoming_30_days = covenant_calendar.upcoming_tests(cursor, 30, today)
+    
+    # RETURN BANNER CONFIG
+    if breach_count > 0:
+        return {
+            'type': 'error',
+            'icon': '🚨',
+            'title': f'{breach_count} COVENANT BREACH(ES) REQUIRE IMMEDIATE ATTENTION',
+            'message': 'Review breaches immediately and contact your lender. Breach alerts are automatically generated when financial data is uploaded.',
+            'priority': 1,
+            'count': breach_count,
+            'upcoming_30': upcoming_30_days,
+            'upcoming_30_count': upcoming_30_count
+        }
+    
+    elif missing_data_count > 0:
+        return {
+            'type': 'warning',
+            'icon': '⚠️',
+            'title': f'{missing_data_count} COVENANT(S) MISSING FINANCIAL DATA - UPLOAD REQUIRED',
+            'message': 'Upload quarterly financial statements to enable automatic covenant testing and breach detection. System will calculate compliance immediately upon upload.',
+            'priority': 2,
+            'count': missing_data_count,
+            'upcoming_30': upcoming_30_days,
+            'upcoming_30_count': upcoming_30_count
+        }
+    
+    elif upcoming_count > 0:
+        return {
+            'type': 'info',
+            'icon': '📅',
+            'title': f'{upcoming_count:,} COVENANT TEST(S) DUE IN NEXT 7 DAYS',
+            'message': 'Prepare financial statements for upcoming covenant tests. Upload data early to ensure timely compliance monitoring.',
+            'priority': 3,
+            'count': upcoming_count,
+            'upcoming_tests': upcoming_tests,
+            'upcoming_30': upcoming_30_days,
+            'upcoming_30_count': upcoming_30_count
+        }
+    
+    else:
+        next_test = covenant_calendar.next_test_date(cursor, today)
+        next_upload = f'in {(next_test - today).days} days ({next_test:%b %d, %Y})' if next_test else 'not yet scheduled'
+        return {
+            'type': 'success',
+            'icon': '✅',
+            'title': 'ALL COVENANTS IN COMPLIANCE - NO IMMEDIATE ACTION REQUIRED',
+            'message': f'Next financial data upload due {next_upload}. System is actively monitoring all covenants.',
+            'priority': 4,
+            'upcoming_30': upcoming_30_days,
+            'upcoming_30_count': upcoming_30_count
+        }
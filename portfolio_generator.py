@@ -0,0 +1,235 @@
+"""
+🏭 COVENANT COMMAND CENTER - SYNTHETIC PORTFOLIO GENERATOR
+Deterministic large-portfolio data for load testing and benchmarks
+
+Same arguments + same seed = byte-identical data. Financials, covenant
+values and statuses are generated together, so re-testing the generated
+financials reproduces the generated statuses.
+
+Usage:
+    python portfolio_generator.py portfolio_10k.db --loans 10000
+"""
+
+import argparse
+import os
+import random
+from datetime import date, timedelta
+
+import covenant_calendar
+import covenant_mapping
+import database
+import migrations
+
+# Status skew of a generated covenant (missing data is decided per loan)
+STATUS_WEIGHTS = {'COMPLIANT': 0.82, 'AT_RISK': 0.12, 'BREACH': 0.06}
+MISSING_DATA_RATE = 0.03
+
+# Test schedule skew: most covenants test quarterly, 45 days after quarter end
+FREQUENCY_WEIGHTS = {'Quarterly': 0.75, 'Monthly': 0.1, 'Semi-Annual': 0.05, 'Annual': 0.1}
+REPORTING_LAGS = [30, 45, 45, 60, 90]
+
+# (name, operator, threshold range, unit, metric)
+COVENANT_TEMPLATES = [
+    ('Maximum Leverage Ratio', '<=', (3.0, 5.5), 'x', 'leverage'),
+    ('Minimum Interest Coverage Ratio', '>=', (2.0, 3.5), 'x', 'interest_coverage'),
+    ('Minimum Current Ratio', '>=', (1.0, 1.5), 'x', 'current_ratio'),
+    ('Minimum EBITDA', '>=', (2_000_000, 20_000_000), '$', 'ebitda'),
+    ('Minimum Net Worth', '>=', (10_000_000, 80_000_000), '$', 'net_worth'),
+]
+
+INDUSTRIES = [
+    'Aerospace', 'Manufacturing', 'Healthcare', 'Logistics', 'Retail', 'Energy',
+    'Software', 'Hospitality', 'Agriculture', 'Media', 'Chemicals', 'Real Estate',
+]
+FACILITIES = ['Term Loan', 'Revolver', 'Credit Facility', 'Bridge Loan', 'Delayed Draw Term Loan']
+SUFFIXES = ['Inc', 'Corp', 'LLC', 'Holdings', 'Group', 'Partners']
+DOCUMENTS = ['Credit Agreement', 'Term Loan Agreement', 'Revolver Agreement', 'First Amendment']
+
+
+def _quarter_periods(as_of, quarters):
+    """Reporting periods ('2025-Q4', ...) oldest first, ending with the last full quarter"""
+    year, quarter = as_of.year, (as_of.month - 1) // 3  # last completed quarter
+    if quarter == 0:
+        year, quarter = year - 1, 4
+    periods = []
+    for _ in range(quarters):
+        periods.append(f"{year}-Q{quarter}")
+        quarter -= 1
+        if quarter == 0:
+            year, quarter = year - 1, 4
+    return periods[::-1]
+
+
+def _format_value(value, unit):
+    """Display text for a covenant value, matching the sample data"""
+    return f"${value:,.0f}" if unit == '$' else f"{value:.2f}x"
+
+
+def _actual_for_status(rng, operator, threshold, status):
+    """A reported value that lands in the requested status band"""
+    if status == 'BREACH':
+        margin = -rng.uniform(0.02, 0.30)
+    elif status == 'AT_RISK':
+        margin = rng.uniform(0.005, 0.095)
+    else:
+        margin = rng.uniform(0.12, 0.60)
+    # Positive margin = headroom on the passing side of the limit
+    return threshold * (1 - margin) if operator == '<=' else threshold * (1 + margin)
+
+
+def _generate_loan(rng, loan_id, covenant_id, covenants_per_loan, periods, as_of, alerts_per_loan):
+    """All rows for one loan: (loan, covenants, financials, alerts)"""
+    industry = rng.choice(INDUSTRIES)
+    borrower = f"{industry} {rng.choice(['Global', 'National', 'United', 'Summit', 'Pioneer', 'Apex'])} {loan_id} {rng.choice(SUFFIXES)}"
+    origination = as_of - timedelta(days=rng.randint(180, 2500))
+    principal = round(rng.uniform(5, 250)) * 1_000_000
+    loan = (
+        loan_id, f"{industry} {rng.choice(FACILITIES)} {loan_id:06d}", borrower, principal,
+        round(rng.uniform(3.5, 9.5), 2), 'Active' if rng.random() < 0.95 else 'Closed',
+        origination.isoformat(),
+    )
+
+    missing = rng.random() < MISSING_DATA_RATE
+    templates = [COVENANT_TEMPLATES[(loan_id + i) % len(COVENANT_TEMPLATES)] for i in range(covenants_per_loan)]
+    statuses = list(STATUS_WEIGHTS)
+    weights = list(STATUS_WEIGHTS.values())
+
+    # Next test is the period after the last one the loan reported
+    last_reported = periods[-2] if missing else periods[-1]
+
+    # Latest-quarter metrics implied by each covenant's status
+    metrics = {}
+    covenants = []
+    document = f"{rng.choice(DOCUMENTS)} {origination.year}.pdf"
+    updated_at = f"{as_of.isoformat()}T09:00:00"
+    for i, (name, operator, (low, high), unit, metric) in enumerate(templates):
+        threshold = rng.uniform(low, high)
+        threshold = round(threshold, 2) if unit == 'x' else round(threshold, -5)
+        threshold_text = f"{'≤' if operator == '<=' else '≥'} {_format_value(threshold, unit)}"
+
+        if missing:
+            status, actual, current_value = 'NOT_TESTED', None, 'N/A'
+        else:
+            status = rng.choices(statuses, weights)[0]
+            actual = _actual_for_status(rng, operator, threshold, status)
+            actual = round(actual, 2) if unit == 'x' else round(actual, -3)
+            current_value = _format_value(actual, unit)
+            metrics.setdefault(metric, actual)
+
+        frequency = rng.choices(list(FREQUENCY_WEIGHTS), list(FREQUENCY_WEIGHTS.values()))[0]
+        lag_days = rng.choice(REPORTING_LAGS)
+        next_test = covenant_calendar.due_date_after(last_reported, frequency, lag_days).isoformat()
+
+        covenants.append((
+            covenant_id + i, loan_id, name, covenant_mapping.canonical_name(name), 'Financial', threshold_text,
+            current_value, status, 1, updated_at, document, operator, threshold, unit, actual,
+            frequency, lag_days, next_test,
+        ))
+
+    # Financials consistent with the covenant values in the latest quarter
+    ebitda = metrics.get('ebitda', rng.uniform(3_000_000, 40_000_000))
+    leverage = metrics.get('leverage', rng.uniform(1.5, 4.0))
+    coverage = metrics.get('interest_coverage', rng.uniform(3.0, 8.0))
+    current_ratio = metrics.get('current_ratio', rng.uniform(1.3, 2.5))
+    current_liabilities = rng.uniform(2_000_000, 60_000_000)
+    net_worth = metrics.get('net_worth', rng.uniform(20_000_000, 200_000_000))
+
+    financials = []
+    reported_periods = periods[:-1] if missing else periods
+    for q, period in enumerate(reversed(reported_periods)):
+        # Older quarters drift away from the latest values
+        drift = 1.0 if q == 0 else rng.uniform(0.85, 1.15)
+        q_ebitda = ebitda * drift
+        financials.append((
+            loan_id, period, round(leverage * q_ebitda), round(q_ebitda), round(q_ebitda / coverage),
+            round(current_ratio * current_liabilities * drift), round(current_liabilities * drift),
+            round(net_worth * drift), updated_at,
+        ))
+
+    alerts = []
+    for _ in range(rng.randint(0, alerts_per_loan * 2)):
+        alert_type = rng.choices(['BREACH', 'WARNING', 'INFO', 'CRITICAL'], [0.25, 0.35, 0.35, 0.05])[0]
+        created = as_of - timedelta(days=rng.randint(0, 720), minutes=rng.randint(0, 1439))
+        age_days = (as_of - created).days
+        status = 'Active' if age_days < 45 else rng.choices(['Resolved', 'Dismissed'], [0.85, 0.15])[0]
+        alerts.append((loan_id, alert_type, f"{alert_type.title()} alert for {borrower}", status,
+                       created.isoformat() + "T00:00:00"))
+
+    return loan, covenants, financials, alerts
+
+
+def generate_portfolio(db_path, loans=1000, covenants_per_loan=4, quarters=8, alerts_per_loan=3,
+                       seed=42, as_of=date(2026, 1, 1), batch_size=2000):
+    """Append a deterministic synthetic portfolio to a database; returns row counts"""
+    migrations.migrate(db_path)
+    rng = random.Random(seed)
+    periods = _quarter_periods(as_of, quarters)
+    counts = {'loans': 0, 'covenants': 0, 'financial_data': 0, 'alerts': 0}
+
+    with database.connection(db_path) as conn:
+        next_loan = conn.execute("SELECT IFNULL(MAX(loan_id), 0) + 1 FROM loan_agreements").fetchone()[0]
+        next_covenant = conn.execute("SELECT IFNULL(MAX(covenant_id), 0) + 1 FROM covenants").fetchone()[0]
+
+    for start in range(0, loans, batch_size):
+        batch = {'loans': [], 'covenants': [], 'financial_data': [], 'alerts': []}
+        for offset in range(start, min(start + batch_size, loans)):
+            loan, covenants, financials, alerts = _generate_loan(
+                rng, next_loan + offset, next_covenant + offset * covenants_per_loan,
+                covenants_per_loan, periods, as_of, alerts_per_loan,
+            )
+            batch['loans'].append(loan)
+            batch['covenants'].extend(covenants)
+            batch['financial_data'].extend(financials)
+            batch['alerts'].extend(alerts)
+
+        # One bounded transaction per batch of loans
+        with database.transaction(db_path) as conn:
+            conn.executemany("""
+                INSERT INTO loan_agreements
+                (loan_id, deal_name, borrower_name, principal_amount, interest_rate, status, origination_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, batch['loans'])
+            conn.executemany("""
+                INSERT INTO covenants
+                (covenant_id, loan_id, covenant_name, canonical_name, covenant_type, threshold_text, current_value,
+                 compliance_status, is_active, updated_at, source_document,
+                 threshold_operator, threshold_value, threshold_unit, actual_value,
+                 test_frequency, reporting_lag_days, next_test_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch['covenants'])
+            conn.executemany("""
+                INSERT INTO financial_data
+                (loan_id, reporting_period, total_debt, ebitda, interest_expense,
+                 current_assets, current_liabilities, net_worth, upload_date)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, batch['financial_data'])
+            conn.executemany("""
+                INSERT INTO alerts (loan_id, alert_type, message, status, created_at)
+                VALUES (?, ?, ?, ?, ?)
+            """, batch['alerts'])
+
+        for table, rows in batch.items():
+            counts[table] += len(rows)
+
+    with database.connection(db_path) as conn:
+        conn.execute("ANALYZE")
+    return counts
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic covenant portfolio")
+    parser.add_argument("db_path")
+    parser.add_argument("--loans", type=int, default=1000)
+    parser.add_argument("--covenants-per-loan", type=int, default=4)
+    parser.add_argument("--quarters", type=int, default=8)
+    parser.add_argument("--alerts-per-loan", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    if os.path.exists(args.db_path):
+        print(f"Appending to existing database {args.db_path}")
+    counts = generate_portfolio(
+        args.db_path, loans=args.loans, covenants_per_loan=args.covenants_per_loan,
+        quarters=args.quarters, alerts_per_loan=args.alerts_per_loan, seed=args.seed,
+    )
+    print(", ".join(f"{n:,} {table}" for table, n in counts.items()))
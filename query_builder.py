@@ -0,0 +1,240 @@
+"""
+🧩 COVENANT COMMAND CENTER - FILTER QUERY BUILDER
+Bound-parameter SELECTs with stable SQL text per filter shape
+
+Multiselect filters are bound as one JSON array parameter
+(`col IN (SELECT value FROM json_each(?))`), so the SQL text only depends on
+which filters are switched on - never on how many values are picked or what
+they contain. SQLite's statement cache can then reuse the prepared plan, and
+a quote in a deal name is just data.
+
+Pages are fetched with keyset pagination: each page starts strictly after
+the sort key of the previous page's last row, so page N costs the same as
+page 1 (no OFFSET scans).
+"""
+
+import json
+import math
+
+# Prefix of the hidden sort-key columns added to paginated results
+CURSOR_PREFIX = "_cursor_"
+
+
+class SelectQuery:
+    """Incrementally built SELECT with bound parameters"""
+
+    def __init__(self, columns_sql, from_sql):
+        self.columns_sql = columns_sql.strip()
+        self.from_sql = from_sql.strip()
+        self.conditions = []
+        self.params = []
+        self.sort_keys = []
+        self.group_exprs = []
+
+    def where(self, condition, *params):
+        """Add an AND condition with its bound parameters"""
+        self.conditions.append(condition)
+        self.params.extend(params)
+        return self
+
+    def where_in(self, column, values):
+        """Filter column to a list of values (skipped when the list is empty)"""
+        if values:
+            self.where(f"{column} IN (SELECT value FROM json_each(?))", json.dumps(list(values)))
+        return self
+
+    def where_equals(self, column, value):
+        """Filter column to a single value (skipped when value is None)"""
+        if value is not None:
+            self.where(f"{column} = ?", value)
+        return self
+
+    def group_by(self, *exprs):
+        """Aggregate per group; sort keys may then use aggregates (keyset bounds go in HAVING)"""
+        self.group_exprs = list(exprs)
+        return self
+
+    def order_by(self, *sort_keys):
+        """Set the sort keys as (expression, 'ASC' | 'DESC'); the last one must be unique"""
+        self.sort_keys = list(sort_keys)
+        return self
+
+    def _where_sql(self, extra_conditions=()):
+        conditions = self.conditions + list(extra_conditions)
+        return ("\nWHERE " + "\n AND ".join(conditions)) if conditions else ""
+
+    def _group_sql(self, having_conditions=()):
+        if not self.group_exprs:
+            return ""
+        sql = "\nGROUP BY " + ", ".join(self.group_exprs)
+        if having_conditions:
+            sql += "\nHAVING " + "\n AND ".join(having_conditions)
+        return sql
+
+    def _keyset_condition(self, after):
+        """Rows strictly after the `after` sort key, honouring each key's direction and SQLite's NULLs-first order"""
+        exprs = [expr for expr, _ in self.sort_keys]
+        ops = ['>' if direction.upper() == 'ASC' else '<' for _, direction in self.sort_keys]
+
+        if set(ops) == {'>'} and None not in after:
+            # Ascending, no NULL in the cursor: NULL keys sort before it, so a row-value
+            # comparison (which SQLite can range-scan directly) is exact
+            placeholders = ", ".join("?" for _ in exprs)
+            return f"({', '.join(exprs)}) > ({placeholders})", list(after)
+
+        # Otherwise expand the tie-breaks, with explicit NULL branches; the leading key is bounded for the index
+        condition, params = _at_or_after(exprs[0], ops[0], after[0])
+        branches = []
+        for i in range(len(exprs)):
+            terms = [_same(exprs[j], after[j]) for j in range(i)] + [_after(exprs[i], ops[i], after[i])]
+            branches.append("(" + " AND ".join(term for term, _ in terms) + ")")
+            params.extend(value for _, term_params in terms for value in term_params)
+        return f"{condition} AND ({' OR '.join(branches)})", params
+
+    def build(self, after=None, limit=None):
+        """Return (sql, params); with `limit`, the page after the `after` cursor"""
+        columns = self.columns_sql
+        extra_conditions, extra_params = [], []
+
+        if limit is not None:
+            # Expose the sort key so the caller can resume after the last row
+            cursor_columns = [f"{expr} AS {CURSOR_PREFIX}{i}" for i, (expr, _) in enumerate(self.sort_keys)]
+            columns = columns + ",\n" + ",\n".join(cursor_columns)
+            if after is not None:
+                condition, params = self._keyset_condition(after)
+                extra_conditions.append(condition)
+                extra_params.extend(params)
+
+        if self.group_exprs:
+            # Sort keys of a grouped query are per-group values: bound them after grouping
+            sql = f"SELECT\n{columns}\n{self.from_sql}{self._where_sql()}{self._group_sql(extra_conditions)}"
+        else:
+            sql = f"SELECT\n{columns}\n{self.from_sql}{self._where_sql(extra_conditions)}"
+        if self.sort_keys:
+            sql += "\nORDER BY " + ", ".join(f"{expr} {direction}" for expr, direction in self.sort_keys)
+        params = list(self.params) + extra_params
+        if limit is not None:
+            sql += "\nLIMIT ?"
+            params.append(limit)
+        return sql, params
+
+    def build_count(self, cap):
+        """Return (sql, params) counting matching rows (groups), but never more than cap + 1"""
+        sql = f"SELECT COUNT(*) AS n FROM (SELECT 1 {self.from_sql}{self._where_sql()}{self._group_sql()} LIMIT ?)"
+        return sql, list(self.params) + [cap + 1]
+
+
+# Keyset terms for one sort key; NULL sorts before every value (first ascending, last descending)
+def _same(expr, value):
+    return (f"{expr} IS NULL", []) if value is None else (f"{expr} = ?", [value])
+
+
+def _after(expr, op, value):
+    if value is None:
+        return (f"{expr} IS NOT NULL", []) if op == '>' else ("0", [])
+    return (f"{expr} > ?", [value]) if op == '>' else (f"({expr} < ? OR {expr} IS NULL)", [value])
+
+
+def _at_or_after(expr, op, value):
+    if value is None:
+        return ("1", []) if op == '>' else (f"{expr} IS NULL", [])
+    return (f"{expr} >= ?", [value]) if op == '>' else (f"({expr} <= ? OR {expr} IS NULL)", [value])
+
+
+def cursor_of(row):
+    """Sort-key cursor of a paginated result row (plain Python values, ready to bind)"""
+    values = (value.item() if hasattr(value, 'item') else value
+              for name, value in row.items() if name.startswith(CURSOR_PREFIX))
+    # pandas reads a NULL in a numeric column as NaN
+    return tuple(None if isinstance(value, float) and math.isnan(value) else value for value in values)
+
+
+def drop_cursor_columns(df):
+    """Result without the hidden sort-key columns"""
+    return df.loc[:, [c for c in df.columns if not c.startswith(CURSOR_PREFIX)]]
+
+
+def covenant_status_query(statuses=None, deal_names=None, covenant_types=None):
+    """Covenant Status page grid, filtered by status, loan and type"""
+    query = SelectQuery("""
+            l.deal_name as 'Loan',
+            l.borrower_name as 'Borrower',
+            c.covenant_name as 'Covenant Name',
+            c.covenant_type as 'Type',
+            c.compliance_status as 'Status',
+            c.current_value as 'Current Value',
+            c.threshold_text as 'Threshold',
+            ROUND(c.headroom * 100, 1) as 'Headroom %',
+            c.source_document as 'Source Document'
+    """, """
+        FROM covenants c
+        LEFT JOIN loan_agreements l ON c.loan_id = l.loan_id
+    """)
+    query.where("c.is_active = 1")
+    query.where_in("c.compliance_status", statuses)
+    query.where_in("l.deal_name", deal_names)
+    query.where_in("c.covenant_type", covenant_types)
+    # status_rank is an indexed generated column (BREACH, AT_RISK, COMPLIANT, other)
+    query.order_by(("c.status_rank", "ASC"), ("c.loan_id", "ASC"), ("c.covenant_id", "ASC"))
+    return query
+
+
+def alerts_query(alert_types=None, status=None):
+    """Alerts page list, filtered by alert type and status (None = all statuses)"""
+    query = SelectQuery("""
+            a.created_at as 'Date',
+            l.deal_name as 'Loan',
+            l.borrower_name as 'Borrower',
+            a.alert_type as 'Type',
+            a.message as 'Message',
+            a.status as 'Status'
+    """, """
+        FROM alerts a
+        JOIN loan_agreements l ON a.loan_id = l.loan_id
+    """)
+    query.where_in("a.alert_type", alert_types)
+    query.where_equals("a.status", status)
+    # type_rank is an indexed generated column (BREACH, CRITICAL, WARNING, other)
+    query.order_by(("a.type_rank", "ASC"), ("a.created_at", "DESC"), ("a.alert_id", "DESC"))
+    return query
+
+
+def alert_groups_query(alert_types=None, status=None):
+    """Alerts page feed: one row per loan and alert type with counts and the latest message"""
+    query = SelectQuery("""
+            l.deal_name as 'Loan',
+            l.borrower_name as 'Borrower',
+            a.alert_type as 'Type',
+            COUNT(*) as 'Alerts',
+            SUM(a.status = 'Active') as 'Active',
+            MAX(a.created_at) as 'Latest',
+            a.message as 'Latest Message',
+            a.loan_id as loan_id
+    """, """
+        FROM alerts a
+        JOIN loan_agreements l ON a.loan_id = l.loan_id
+    """)
+    query.where_in("a.alert_type", alert_types)
+    query.where_equals("a.status", status)
+    # With MAX(), SQLite takes a.message from the group's latest alert
+    query.group_by("a.loan_id", "a.alert_type")
+    query.order_by(
+        ("a.type_rank", "ASC"), ("MAX(a.created_at)", "DESC"), ("a.loan_id", "ASC"), ("a.alert_type", "ASC"),
+    )
+    return query
+
+
+def alert_details_query(loan_id, alert_type, status=None):
+    """Individual alerts behind one alert feed group, newest first"""
+    query = SelectQuery("""
+            a.created_at as 'Date',
+            a.message as 'Message',
+            a.status as 'Status'
+    """, """
+        FROM alerts a
+    """)
+    query.where_equals("a.loan_id", loan_id)
+    query.where_equals("a.alert_type", alert_type)
+    query.where_equals("a.status", status)
+    query.order_by(("a.created_at", "DESC"), ("a.alert_id", "DESC"))
+    return query
@@ -0,0 +1,154 @@
+"""
+⚡ COVENANT COMMAND CENTER - QUERY RESULT CACHE
+Process-wide DataFrame cache for read queries, invalidated by data changes
+
+Results are keyed on normalized SQL + parameters and tagged with the
+database's write generation (`data_generation`, bumped by triggers on every
+insert/update/delete). A rerun that finds the same generation is served
+from memory; any write makes every cached result for that database stale.
+Callers get their own copy of a cached DataFrame, so one session modifying
+its result can't change what another is served.
+"""
+
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+import pandas as pd
+
+import database
+
+MAX_ENTRIES = 256
+MAX_BYTES = 256 * 1024 * 1024  # 256MB of cached DataFrames per database
+
+
+def normalize_sql(query):
+    """Collapse whitespace so formatting differences share a cache entry"""
+    return " ".join(query.split())
+
+
+def params_key(params):
+    """Hashable cache key for query parameters (named parameters by name and value)"""
+    if isinstance(params, Mapping):
+        return tuple(sorted(params.items()))
+    return tuple(params or ())
+
+
+def get_data_generation(conn):
+    """Current write generation of the database (single primary-key read)"""
+    row = conn.execute("SELECT generation FROM data_generation WHERE generation_id = 1").fetchone()
+    return row[0] if row else 0
+
+
+class QueryCache:
+    """Size-bounded LRU of query results for one database"""
+
+    def __init__(self, max_entries=MAX_ENTRIES, max_bytes=MAX_BYTES):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.generation = None
+        self._entries = OrderedDict()  # key -> (DataFrame, size in bytes)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, generation):
+        """Cached result for key at this generation, or None"""
+        with self._lock:
+            if self.generation is not None and generation < self.generation:
+                # Reader on an older snapshot - don't let it wipe newer results
+                self.misses += 1
+                return None
+            if generation != self.generation:
+                # The data changed since these results were read - drop them all
+                if self._entries:
+                    self.invalidations += 1
+                self._entries.clear()
+                self._bytes = 0
+                self.generation = generation
+
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+    def put(self, key, generation, df):
+        """Store a result read at this generation, evicting least recently used entries"""
+        size = int(df.memory_usage(index=True, deep=True).sum())
+        if size > self.max_bytes:
+            return
+
+        with self._lock:
+            if generation != self.generation:
+                # A write landed while the query ran; the result may already be stale
+                return
+            if key in self._entries:
+                self._bytes -= self._entries.pop(key)[1]
+            self._entries[key] = (df, size)
+            self._bytes += size
+
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self):
+        """Hit/miss counters and current footprint"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups * 100) if lookups else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'generation': self.generation,
+            }
+
+    def clear(self):
+        """Drop every cached result"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+            self.generation = None
+
+
+# One cache per database file for the whole process
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_cache(db_path):
+    """Get the process-wide result cache for a database file"""
+    cache = _caches.get(db_path)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.setdefault(db_path, QueryCache())
+    return cache
+
+
+def cached_query(db_path, query, params=None):
+    """Run a read query, serving the result from cache while the data is unchanged; returns a copy the caller owns"""
+    cache = get_cache(db_path)
+    key = (normalize_sql(query), params_key(params))
+
+    with database.connection(db_path) as conn:
+        # Read the generation and the rows from the same snapshot
+        conn.execute("BEGIN")
+        try:
+            generation = get_data_generation(conn)
+            df = cache.get(key, generation)
+            if df is None:
+                df = pd.read_sql_query(query, conn, params=params)
+                cache.put(key, generation, df)
+        finally:
+            conn.execute("COMMIT")
+    return df.copy()
@@ -1,85 +1,211 @@
 """
 Scan Loan Documents Page for Streamlit
-Demo page showing AI extraction capabilities and competitive advantage
+Upload a loan agreement, extract its financial covenants and add them to a loan
 """
 
+import time
+from datetime import datetime
+
+import pandas as pd
 import streamlit as st
 
-def show_scan_documents_page():
-    """Display the Scan Loan Documents page with demo upload and feature explanations"""
-    
-    # Page header
-    st.markdown('<p class="main-header">📄 Scan Loan Documents</p>', unsafe_allow_html=True)
+import covenant_dedup
+import covenant_engine
+import job_queue
+from portfolio_data import ACTIVE_LOANS_QUERY, load_data
+
+REFRESH_INTERVAL = 1.0  # seconds between reruns while this session's jobs are in flight
+WATCH_LIMIT = 10 * 60  # seconds a session auto-refreshes after queueing before it needs a manual refresh
+
+
+def show_extraction_results(summary):
+    """Metrics and covenant table for one extraction run"""
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Pages Scanned", f"{summary['pages']:,}",
+                f"{summary['cached_pages']:,} unchanged" if summary['cached_pages'] else None, delta_color="off")
+    col2.metric("Covenants Found", len(summary['covenants']))
+    col3.metric("New / Updated", f"{summary['inserted']} / {summary['updated']}",
+                f"{summary['superseded']} superseded" if summary['superseded'] else None, delta_color="off")
+    col4.metric("Extraction Time", f"{summary['seconds']:.1f}s")
+
+    if not summary['covenants']:
+        st.warning("⚠️ No covenants with a readable threshold were found in this document.")
+        return
+    if summary.get('outranked'):
+        st.warning(f"⚠️ {summary['outranked']} covenant(s) in this document were outranked by a newer or more "
+                   f"authoritative statement from another document and are not monitored from it - "
+                   f"see Dedup Decisions.")
+
+    results_df = pd.DataFrame([
+        {
+            "Covenant": covenant['covenant_name'],
+            "As Written": covenant['term'],
+            "Threshold": covenant_engine.format_threshold(
+                covenant['operator'], covenant['value'], covenant['unit']),
+            "Page": covenant['page'],
+            "Section": covenant['section'].title(),
+            "Evidence": covenant['evidence'],
+        }
+        for covenant in summary['covenants']
+    ])
+    st.dataframe(results_df, use_container_width=True, hide_index=True)
+    st.caption(f"{summary['detections']:,} covenant statements across {summary['tables']:,} table rows "
+               f"and {summary['footnotes']:,} footnotes - {summary['dropped']:,} duplicate or superseded "
+               f"statements dropped")
+
+
+def show_dedup_log(db_path, loan_id):
+    """Recent dedup decisions for a loan: which statement of each covenant was kept, and why"""
+    log = load_data(db_path, covenant_dedup.DEDUP_LOG_QUERY, (int(loan_id),))
+    if log.empty:
+        return
+    with st.expander(f"🧾 Dedup Decisions ({len(log)})"):
+        st.dataframe(log, use_container_width=True, hide_index=True)
+
+
+def _job_label(job):
+    return f"#{job['job_id']} {job['source_document']} → {job['deal_name'] or 'loan ' + str(job['loan_id'])}"
+
+
+def show_jobs(db_path):
+    """Extraction queue: progress of jobs in flight, recent jobs, and the results of a finished one; returns the job_ids in flight"""
+    jobs = job_queue.list_jobs(db_path)
+    if not jobs:
+        return set()
+
+    st.markdown("### 🗂️ Extraction Jobs")
+    active = [job for job in jobs if job['status'] in job_queue.ACTIVE_STATUSES]
+    for job in reversed(active):
+        if job['status'] == 'queued':
+            st.progress(0.0, text=f"{_job_label(job)} - queued")
+        elif job['pages_total']:
+            st.progress(job['pages_done'] / job['pages_total'],
+                        text=f"{_job_label(job)} - page {job['pages_done']:,} of {job['pages_total']:,}")
+        else:
+            st.progress(0.0, text=f"{_job_label(job)} - reading document...")
+
+    jobs_df = pd.DataFrame([
+        {
+            "Job": job['job_id'],
+            "Document": job['source_document'],
+            "Loan": job['deal_name'],
+            "Status": job['status'].title(),
+            "Pages": f"{job['pages_done']:,} / {job['pages_total']:,}" if job['pages_total'] else "",
+            "Queued": datetime.fromtimestamp(job['created_at']).strftime('%Y-%m-%d %H:%M:%S'),
+            "Time": f"{job['finished_at'] - job['started_at']:.1f}s" if job['finished_at'] and job['started_at'] else "",
+        }
+        for job in jobs
+    ])
+    st.dataframe(jobs_df, use_container_width=True, hide_index=True)
+
+    finished = [job for job in jobs if job['status'] not in job_queue.ACTIVE_STATUSES]
+    if finished:
+        # The job this session queued last, once it's done; otherwise the newest finished job
+        labels = [_job_label(job) for job in finished]
+        ids = [job['job_id'] for job in finished]
+        queued = st.session_state.get('scan_last_job')
+        selected = st.selectbox("Show results for", labels, index=ids.index(queued) if queued in ids else 0,
+                                key=f"scan_job_select_{queued}")
+        job = finished[labels.index(selected)]
+        if job['status'] == 'failed':
+            st.error(f"❌ Could not read {job['source_document']}: {job['error']}")
+        else:
+            summary = job_queue.get_result(db_path, job['job_id'])
+            st.success(f"✅ Extraction complete - {summary['inserted'] + summary['updated']} covenant(s) "
+                       f"from {job['source_document']} saved to {job['deal_name']}.")
+            show_extraction_results(summary)
+            show_dedup_log(db_path, job['loan_id'])
+    return {job['job_id'] for job in active}
+
+
+def show_scan_documents_page(db_path):
+    """Display the Scan Loan Documents page: upload, extraction and feature explanations"""
     
-    # Demo banner
-    st.info("🎯 **DEMO MODE**: Upload functionality shown for demonstration. In production, documents are processed and saved to your portfolio.")
+    # Header with website link
+    col1, col2 = st.columns([3, 1])
+    with col1:
+        st.markdown('<p class="main-header">📄 Scan Loan Documents</p>', unsafe_allow_html=True)
+    with col2:
+        st.markdown(
+            '<p style="text-align: right; padding-top: 1rem;">'
+            '<a href="https://covenantcommandcenter.com" target="_blank" '
+            'style="color: #0066CC; text-decoration: none; font-weight: bold;">'
+            '🌐 Visit Website</a></p>',
+            unsafe_allow_html=True
+        )
     
     # Introduction
     st.markdown("""
-    ### AI-Powered Covenant Extraction
+    ### Covenant Extraction
     
-    Upload a loan agreement to see our AI extract covenants in real-time with **zero hallucinations**.
-    Our system reads every page including tables, footnotes, and handwritten amendments.
+    Upload a loan agreement and every page is read - running text, tables and footnotes.
+    Each covenant is saved to the selected loan with the page it came from and tested right away.
+    Documents are extracted in the background - keep working, or refresh the page; progress is kept.
     """)
     
     st.markdown("---")
     
-    # Upload section (demo only)
+    # Upload section
     st.markdown("### 📎 Upload Document")
     
+    loans = load_data(db_path, ACTIVE_LOANS_QUERY)
+    if loans.empty:
+        st.warning("⚠️ No active loans - add a loan before scanning its agreement.")
+        return
+    
     col1, col2 = st.columns([2, 1])
     
     with col1:
-        # File uploader (demo - not functional)
+        selected_loan = st.selectbox("Loan", loans['deal_name'].tolist(), key="scan_loan_select")
+        # Statements from a document with a later effective date supersede earlier ones
+        source_date = st.date_input("Document effective date", value=None, key="scan_source_date",
+                                    help="Agreement or amendment date - leave blank if unknown")
+        # A new key per queued file clears the uploader once its file has been spooled and released
         uploaded_file = st.file_uploader(
             "Choose a PDF or DOCX file",
             type=['pdf', 'docx'],
-            help="Demo mode: File will not be processed",
-            disabled=False  # Enable to show functionality
+            key=f"scan_file_uploader_{st.session_state.get('scan_upload_round', 0)}"
         )
         
         if uploaded_file:
             st.success(f"✅ File selected: {uploaded_file.name} ({uploaded_file.size:,} bytes)")
-            st.info("💡 **Demo Mode**: In production, this would extract covenants and add to your portfolio.")
     
     with col2:
         st.markdown("""
         **Supported formats:**
-        - ✅ PDF files
+        - ✅ PDF files (text layer, needs pypdf)
         - ✅ Word documents
-        - ✅ Scanned images
-        - ✅ Up to 500 pages
+        - ✅ Tables and footnotes
+        - ✅ 500+ pages
         """)
     
-    # Demo extraction button
+    # Extraction runs in the background job runner - the session only queues and watches
+    job_queue.get_runner(db_path)
     if uploaded_file:
-        if st.button("🚀 Start Extraction (Demo)", type="primary"):
-            with st.spinner("Extracting covenants..."):
-                import time
-                time.sleep(2)  # Simulate processing
-                
-                st.success("✅ Extraction complete! (Demo)")
-                
-                # Show sample results
-                st.markdown("#### Sample Results:")
-                
-                results_data = {
-                    "Covenant Name": [
-                        "Maximum Total Net Leverage Ratio",
-                        "Minimum Interest Coverage Ratio", 
-                        "Minimum EBITDA",
-                        "Maximum Capital Expenditures"
-                    ],
-                    "Threshold": ["≤ 4.50x", "≥ 3.00x", "≥ $5,000,000", "≤ $10,000,000"],
-                    "Type": ["Financial", "Financial", "Financial", "Financial"],
-                    "Source": ["AI Vision", "AI Vision", "String Search", "String Search"]
-                }
-                
-                import pandas as pd
-                results_df = pd.DataFrame(results_data)
-                st.dataframe(results_df, use_container_width=True)
-                
-                st.info("💡 In production, these covenants would be saved to your portfolio and monitored for compliance.")
+        if st.button("🚀 Extract Covenants", type="primary", key="scan_extract_btn"):
+            loan_id = loans.loc[loans['deal_name'] == selected_loan, 'loan_id'].iloc[0]
+            dated = load_data(db_path, covenant_dedup.DATED_STATEMENTS_QUERY, (int(loan_id), uploaded_file.name))
+            try:
+                if source_date is None and dated['dated'].iloc[0]:
+                    raise ValueError("this loan already has covenants from dated documents - "
+                                     "enter the document's effective date so it can be ranked against them")
+                job_id = job_queue.enqueue(
+                    db_path, loan_id, uploaded_file, source_date.isoformat() if source_date else None)
+            except (ValueError, OSError) as error:
+                st.error(f"❌ Could not queue {uploaded_file.name}: {error}")
+            else:
+                st.session_state['scan_last_job'] = job_id
+                st.session_state.setdefault('scan_my_jobs', set()).add(job_id)
+                st.session_state['scan_watch_until'] = time.time() + WATCH_LIMIT
+                st.session_state['scan_upload_round'] = st.session_state.get('scan_upload_round', 0) + 1
+                st.rerun()
+
+    jobs_in_flight = show_jobs(db_path)
+    # Only the jobs this session queued keep it refreshing, and only for WATCH_LIMIT
+    watching = (jobs_in_flight & st.session_state.get('scan_my_jobs', set())
+                and time.time() < st.session_state.get('scan_watch_until', 0))
+    if jobs_in_flight and not watching:
+        st.button("🔄 Refresh Progress", key="scan_refresh_jobs")
     
     st.markdown("---")
     
@@ -91,9 +217,9 @@ def show_scan_documents_page():
     with col1:
         st.markdown("""
         <div style="text-align: center; padding: 20px; background: #f0f8ff; border-radius: 10px;">
-            <h3>1️⃣ AI Vision</h3>
-            <p><strong>GPT-4o Extraction</strong></p>
-            <p>Reads every page including tables, footnotes, and amendments</p>
+            <h3>1️⃣ Page Extraction</h3>
+            <p><strong>Text, Tables, Footnotes</strong></p>
+            <p>Reads every page's text layer in parallel across CPU cores</p>
         </div>
         """, unsafe_allow_html=True)
     
@@ -109,37 +235,38 @@ def show_scan_documents_page():
     with col3:
         st.markdown("""
         <div style="text-align: center; padding: 20px; background: #fff5ee; border-radius: 10px;">
-            <h3>3️⃣ Validation</h3>
-            <p><strong>Zero Hallucinations</strong></p>
-            <p>Evidence-based protocol ensures accuracy</p>
+            <h3>3️⃣ Evidence</h3>
+            <p><strong>Threshold or Nothing</strong></p>
+            <p>Only statements with a readable threshold are saved, with their page and text</p>
         </div>
         """, unsafe_allow_html=True)
     
     st.markdown("""
     ### The Process:
     
-    1. **AI Vision Extraction**: GPT-4 Vision analyzes every page at 400 DPI, extracting text from:
+    1. **Page Extraction**: Each page's text layer is read - PDFs with pypdf, Word documents directly - including:
        - Main document body
-       - Financial covenant tables
-       - Footnotes and annotations
-       - Handwritten amendments
-       - Cross-references and schedules
+       - Financial covenant tables (row by row)
+       - Footnotes
+       
+       Scanned images without a text layer are not read (no OCR). Unchanged pages of a re-uploaded
+       or amended document are reused from a page cache.
     
-    2. **177-Term Mapping**: Our proprietary mapping table (36 hours of manual curation) normalizes covenant names:
+    2. **177-Term Mapping**: A curated mapping table normalizes covenant names:
        - "Total Net Leverage" → "Maximum Total Net Leverage Ratio"
-       - Handles 177+ covenant variations
+       - Handles 177 covenant variations
        - Maps alternative terms to standard definitions
     
-    3. **Zero-Hallucination Protocol**: Every extracted covenant must have:
-       - Verifiable text evidence
-       - Legible threshold value
-       - Clear operator (≥, ≤, etc.)
-       - Returns `null` if unreadable (never guesses)
+    3. **Evidence Rule**: A covenant is only saved when the same sentence or table row has:
+       - A recognised covenant name
+       - A legible threshold value
+       - A clear operator (≥, ≤, etc.), or the covenant's standard direction
+       - The page, section and source text it came from, shown with every result
     
-    4. **Deduplication**: Smart algorithm removes duplicates while preserving:
-       - Table overrides (different thresholds)
-       - Footnote modifications
-       - Amendment updates
+    4. **Deduplication**: One statement per covenant is kept for each loan:
+       - Newer documents (by effective date) supersede older ones
+       - Tables outrank footnotes, footnotes outrank running text
+       - Every dropped statement is logged with the reason
     """)
     
     st.markdown("---")
@@ -150,7 +277,7 @@ def show_scan_documents_page():
     st.markdown("""
     <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; border-radius: 15px; color: white; margin: 20px 0;">
         <h3 style="color: white; margin-top: 0;">Why We're Different</h3>
-        <p style="font-size: 18px; margin-bottom: 0;">Traditional covenant monitoring relies on <strong>manual human review</strong> at $100 per document with 2-3 day turnaround. We combine AI with human oversight to deliver 10-minute results with zero missed covenants.</p>
+        <p style="font-size: 18px; margin-bottom: 0;">Traditional covenant monitoring relies on <strong>manual human review</strong> at $100 per document with 2-3 day turnaround. Covenant Command Center reads the agreement for you, and every covenant it saves comes with the page and text it was found in, so review takes minutes.</p>
     </div>
     """, unsafe_allow_html=True)
     
@@ -179,14 +306,14 @@ def show_scan_documents_page():
             "❌ Black box"
         ],
         "Covenant Command Center": [
-            "✅ AI + Human oversight",
+            "✅ Automated extraction + your review",
             "$25 (unlimited)*",
             "10 minutes",
             "✅ Automatically detected",
-            "✅ AI Vision extraction",
-            "✅ Minimal (AI + validation)",
+            "✅ Table rows read automatically",
+            "✅ Low (source evidence on every result)",
             "$2,500 unlimited",
-            "~95% (zero hallucinations)",
+            "Only saves covenants with a readable threshold",
             "✅ Full transparency"
         ]
     }
@@ -198,21 +325,21 @@ def show_scan_documents_page():
     
     st.markdown("---")
     
-    # USPTO innovation section
-    st.markdown("## 🎓 Patent-Pending Innovation")
+    # Technology section
+    st.markdown("## 🎓 Under the Hood")
     
     st.markdown("""
     <div style="background: #f8f9fa; padding: 25px; border-left: 5px solid #0066cc; border-radius: 5px;">
-        <h3 style="color: #0066cc; margin-top: 0;">USPTO-Worthy Technology</h3>
+        <h3 style="color: #0066cc; margin-top: 0;">What the Extractor Does</h3>
         
-        <p>Our system represents a novel approach to financial covenant extraction combining:</p>
+        <p>Covenant extraction combines:</p>
         
         <ul style="font-size: 16px; line-height: 1.8;">
-            <li><strong>Multi-Modal AI Vision</strong>: First covenant extractor using GPT-4 Vision for table/footnote parsing</li>
-            <li><strong>Proprietary Mapping Database</strong>: 177-term mapping table with 36 hours of expert curation</li>
-            <li><strong>Zero-Hallucination Protocol</strong>: Evidence-based extraction that returns null when uncertain (industry-first)</li>
-            <li><strong>Hierarchical Authority System</strong>: Automatically prioritizes table data over main text, footnotes over definitions</li>
-            <li><strong>Real-Time Breach Detection</strong>: Immediate calculation and alerting upon data upload</li>
+            <li><strong>Parallel Page Reading</strong>: Text, table rows and footnotes of every page, spread across CPU cores</li>
+            <li><strong>Curated Mapping Table</strong>: 177 covenant terms matched in a single pass over each page</li>
+            <li><strong>Evidence Rule</strong>: A covenant is saved only with a legible threshold and the text it came from</li>
+            <li><strong>Source Authority</strong>: Newer documents supersede older ones; tables outrank footnotes and running text</li>
+            <li><strong>Real-Time Breach Detection</strong>: Extracted covenants are tested against the loan's latest financials right away</li>
         </ul>
     </div>
     """, unsafe_allow_html=True)
@@ -228,8 +355,8 @@ def show_scan_documents_page():
         st.markdown("""
         ### What You See:
         - ✅ Every extracted covenant with source document
-        - ✅ AI confidence scores (0-100%)
-        - ✅ Match type (AI Vision vs String Search)
+        - ✅ Page and section (text, table, footnote) of each covenant
+        - ✅ The covenant name as written in the agreement
         - ✅ Full text context for verification
         - ✅ Edit/delete capabilities
         - ✅ Audit trail of all changes
@@ -239,11 +366,11 @@ def show_scan_documents_page():
         st.markdown("""
         ### What You Control:
         - ✅ Review and approve extractions
-        - ✅ Override AI decisions
+        - ✅ Override extracted thresholds
         - ✅ Add manual covenants
         - ✅ Customize alert thresholds
         - ✅ Export to Excel/CSV anytime
-        - ✅ Access to raw extraction logs
+        - ✅ Access to deduplication decision logs
         """)
     
     st.info("""
@@ -307,7 +434,11 @@ def show_scan_documents_page():
     # Footer
     st.caption("Demo Version | Hackathon 2026 | covenantcommandcenter.com")
 
+    # Watch this session's jobs: rerun shortly to pick up their progress (any widget interaction still wins)
+    if watching:
+        time.sleep(REFRESH_INTERVAL)
+        st.rerun()
+
 
-# Add to your main streamlit_app.py:
 if __name__ == "__main__":
-    show_scan_documents_page()
+    show_scan_documents_page("covenant_demo.db")
@@ -0,0 +1,183 @@
+"""
+🛰️ COVENANT COMMAND CENTER - PORTFOLIO SNAPSHOT WORKER
+One background thread per database keeps the sidebar and banner data current
+
+The worker polls the write generation (`data_generation`) and, when it has
+moved (or the day has turned - upcoming tests are relative to today),
+reads the sidebar stats, the dashboard banner and the banner detail
+tables (their first BANNER_DETAIL_ROWS rows) in one read transaction. The
+result is published as an immutable PortfolioSnapshot. Sessions only read
+the latest published snapshot, so however many users are connected the
+portfolio is read once per change, and never on a session's own script
+thread. While reads keep failing the worker backs off, up to MAX_BACKOFF
+seconds between attempts.
+"""
+
+import atexit
+import threading
+import time
+from collections import namedtuple
+from datetime import date
+from types import MappingProxyType
+
+import database
+import portfolio_data
+import query_cache
+
+POLL_INTERVAL = 1.0  # seconds between generation checks
+MAX_BACKOFF = 60.0  # longest wait between retries while reads keep failing (doubles from POLL_INTERVAL)
+FIRST_SNAPSHOT_TIMEOUT = 30  # seconds a session waits for the very first snapshot
+REFRESH_TIMEOUT = 10  # seconds refresh() waits for a snapshot of the latest write
+
+# Published once, never modified - the DataFrames are shared between sessions, treat them as read-only
+PortfolioSnapshot = namedtuple('PortfolioSnapshot', [
+    'generation', 'taken_at', 'stats', 'banner', 'breach_details', 'missing_data_details',
+])
+
+
+def _frozen(value):
+    """Read-only copy of a dict/list structure (dicts -> mapping proxies, lists -> tuples)"""
+    if isinstance(value, dict):
+        return MappingProxyType({key: _frozen(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(_frozen(item) for item in value)
+    return value
+
+
+def read_snapshot(db_path):
+    """Read a consistent PortfolioSnapshot straight from the database"""
+    with database.connection(db_path) as conn:
+        # Everything in the snapshot comes from the same point in time as its generation
+        conn.execute("BEGIN")
+        try:
+            generation = query_cache.get_data_generation(conn)
+            state = portfolio_data.read_portfolio_state(conn)
+        finally:
+            conn.execute("COMMIT")
+    return PortfolioSnapshot(
+        generation=generation,
+        taken_at=time.time(),
+        stats=_frozen(state['stats']),
+        banner=_frozen(state['banner']),
+        breach_details=state['breach_details'],
+        missing_data_details=state['missing_data_details'],
+    )
+
+
+class SnapshotWorker:
+    """Background thread that republishes the portfolio snapshot whenever the data changes"""
+
+    def __init__(self, db_path, poll_interval=POLL_INTERVAL):
+        self.db_path = db_path
+        self.poll_interval = poll_interval
+        self.snapshot = None  # latest PortfolioSnapshot; replaced whole, never mutated
+        self.last_error = None
+        self.failures = 0  # consecutive failed polls
+        self.builds = 0
+        self._published = threading.Condition()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"snapshot-worker:{db_path}", daemon=True)
+
+    def start(self):
+        """Start polling (idempotent)"""
+        if not self._thread.is_alive() and not self._stop.is_set():
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=5):
+        """Stop polling and wait for an in-flight build to finish"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread.is_alive():
+            self._thread.join(timeout)
+
+    def _current_generation(self):
+        with database.connection(self.db_path) as conn:
+            return query_cache.get_data_generation(conn)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                snapshot = self.snapshot
+                if (snapshot is None or self._current_generation() != snapshot.generation
+                        or date.fromtimestamp(snapshot.taken_at) != date.today()):
+                    self._publish(read_snapshot(self.db_path))
+                self.last_error = None
+                self.failures = 0
+            except Exception as error:
+                # Keep serving the last good snapshot; retry less often while it keeps failing
+                self.last_error = error
+                self.failures += 1
+            self._wake.wait(self._next_wait())
+            self._wake.clear()
+
+    def _next_wait(self):
+        if not self.failures:
+            return self.poll_interval
+        return min(self.poll_interval * 2 ** min(self.failures, 16), MAX_BACKOFF)
+
+    def _publish(self, snapshot):
+        with self._published:
+            self.snapshot = snapshot
+            self.builds += 1
+            self._published.notify_all()
+
+    def get(self, timeout=FIRST_SNAPSHOT_TIMEOUT):
+        """Latest published snapshot (waits only until the first one exists)"""
+        snapshot = self.snapshot
+        if snapshot is not None:
+            return snapshot
+        with self._published:
+            self._published.wait_for(lambda: self.snapshot is not None, timeout)
+        if self.snapshot is None:
+            # Worker is stuck or failing - don't leave the page blank
+            return read_snapshot(self.db_path)
+        return self.snapshot
+
+    def refresh(self, timeout=REFRESH_TIMEOUT):
+        """Wake the worker now and wait for a snapshot that includes every write made so far"""
+        generation = self._current_generation()
+        self._wake.set()
+        with self._published:
+            self._published.wait_for(
+                lambda: self.snapshot is not None and self.snapshot.generation >= generation, timeout,
+            )
+        return self.get()
+
+
+# One worker per database file for the whole process (shared by all sessions)
+_workers = {}
+_workers_lock = threading.Lock()
+
+
+def get_worker(db_path):
+    """Get the process-wide snapshot worker for a database file, starting it on first use"""
+    worker = _workers.get(db_path)
+    if worker is None:
+        with _workers_lock:
+            worker = _workers.get(db_path)
+            if worker is None:
+                worker = _workers[db_path] = SnapshotWorker(db_path).start()
+    return worker
+
+
+def get_snapshot(db_path):
+    """Latest portfolio snapshot for a database (no database access once the worker is warm)"""
+    return get_worker(db_path).get()
+
+
+def refresh_snapshot(db_path):
+    """Publish a snapshot that reflects this session's writes before the page re-renders"""
+    return get_worker(db_path).refresh()
+
+
+def stop_all():
+    """Stop every worker (registered at exit, before the connection pools close)"""
+    with _workers_lock:
+        for worker in _workers.values():
+            worker.stop()
+        _workers.clear()
+
+
+atexit.register(stop_all)
@@ -6,79 +6,60 @@ Deploy to Streamlit Cloud in 5 minutes!
 """
 
 import streamlit as st
-import sqlite3
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime
 import os
 
+import assets
+import covenant_engine
+import exports
+import ingestion
+import migrations
+import query_builder
+import scan_documents_page
+import snapshot_worker
+import ui_components
+import upload_spool
+from portfolio_data import (
+    ACTIVE_LOANS_QUERY,
+    ALERT_SUMMARY_QUERY,
+    BREACHES_BY_BORROWER_QUERY,
+    COVENANT_TYPE_QUERY,
+    DASHBOARD_COVENANTS_QUERY,
+    LOAN_NAMES_QUERY,
+    LOAN_TEST_HISTORY_QUERY,
+    RECENT_ALERTS_QUERY,
+    STATUS_TREND_QUERY,
+    create_sample_database,
+    get_compliance_trend,
+    load_data,
+    rollup_month,
+)
+
 # Page configuration
 st.set_page_config(
     page_title="Covenant Command Center",
-    page_icon="https://covenantcommandcenter.com/logo.jpg",
+    page_icon=assets.page_icon(),
     layout="wide",
     initial_sidebar_state="expanded"
 )
 
-# Custom CSS for professional styling
-st.markdown("""
-<style>
-    .main-header {
-        font-size: 2.5rem;
-        font-weight: bold;
-        color: #0066CC;
-        margin-bottom: 1rem;
-    }
-    .metric-card {
-        background-color: #f0f2f6;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #0066CC;
-    }
-    .breach-alert {
-        background-color: #ffebee;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #d32f2f;
-        margin-bottom: 1rem;
-    }
-    .warning-alert {
-        background-color: #fff3e0;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #ff9800;
-        margin-bottom: 1rem;
-    }
-    .success-banner {
-        background-color: #e8f5e9;
-        padding: 1rem;
-        border-radius: 0.5rem;
-        border-left: 4px solid #4caf50;
-        margin-bottom: 1rem;
-    }
-</style>
-""", unsafe_allow_html=True)
+# Custom CSS for professional styling (bundled styles.css, read once per process)
+st.markdown(assets.stylesheet(), unsafe_allow_html=True)
 
 with st.sidebar:
-    # Logo at top of sidebar
-    try:
-        import requests
-        from PIL import Image
-        from io import BytesIO
-
-        response = requests.get("https://covenantcommandcenter.com/logo.jpg")
-        logo = Image.open(BytesIO(response.content))
-        st.image(logo,  width=120)
-    except:
-        # Fallback if logo fails to load
+    # Logo at top of sidebar (bundled logo.jpg, pre-sized and cached)
+    logo = assets.logo_image()
+    if logo is not None:
+        st.image(logo, width=assets.LOGO_WIDTH)
+    else:
         st.markdown("### 🏦 Covenant Command Center")
 
-    #st.markdown("---")
-    
 
 # Database connection
 @st.cache_resource
 def get_database_connection():
-    """Connect to SQLite database"""
+    """Connect to SQLite database and warm up the shared connection pool"""
     # For demo purposes, create a sample database
     db_path = "covenant_demo.db"
 
@@ -86,266 +67,15 @@ def get_database_connection():
     if not os.path.exists(db_path):
         create_sample_database(db_path)
 
-    return db_path
-
-
-def create_sample_database(db_path):
-    """Create sample database for demo"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-
-    # Create tables
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS loan_agreements (
-            loan_id INTEGER PRIMARY KEY,
-            deal_name TEXT,
-            borrower_name TEXT,
-            principal_amount REAL,
-            interest_rate REAL,
-            status TEXT,
-            origination_date TEXT
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS covenants (
-            covenant_id INTEGER PRIMARY KEY,
-            loan_id INTEGER,
-            covenant_name TEXT,
-            covenant_type TEXT,
-            threshold_text TEXT,
-            current_value TEXT,
-            compliance_status TEXT,
-            is_active INTEGER,
-            updated_at TEXT,
-            source_document TEXT
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS financial_data (
-            financial_id INTEGER PRIMARY KEY,
-            loan_id INTEGER,
-            reporting_period TEXT,
-            total_debt REAL,
-            ebitda REAL,
-            interest_expense REAL,
-            current_assets REAL,
-            current_liabilities REAL,
-            net_worth REAL,
-            upload_date TEXT
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS alerts (
-            alert_id INTEGER PRIMARY KEY,
-            loan_id INTEGER,
-            alert_type TEXT,
-            message TEXT,
-            status TEXT,
-            created_at TEXT
-        )
-    ''')
-
-    # Insert sample data
-    sample_loans = [
-        (1, 'Aerospace Credit Facility 2022', 'Aerospace Industries Inc', 50000000, 5.5, 'Active', '2022-01-15'),
-        (2, 'Manufacturing Term Loan', 'Global Manufacturing Corp', 30000000, 4.8, 'Active', '2021-06-20'),
-        (3, 'Tech Startup Revolver', 'TechCo Innovations', 15000000, 6.2, 'Active', '2023-03-10'),
-        (4, 'Real Estate Bridge Loan', 'Property Holdings LLC', 25000000, 5.0, 'Active', '2022-09-01'),
-    ]
-
-    cursor.executemany('''
-        INSERT OR IGNORE INTO loan_agreements 
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    ''', sample_loans)
-
-    sample_covenants = [
-        (1, 1, 'Maximum Leverage Ratio', 'Financial', '≤ 4.50x', '5.20x', 'BREACH', 1, datetime.now().isoformat(),
-         'Credit Agreement 2022.pdf'),
-        (2, 1, 'Minimum Interest Coverage Ratio', 'Financial', '≥ 3.00x', '2.85x', 'BREACH', 1,
-         datetime.now().isoformat(), 'Credit Agreement 2022.pdf'),
-        (3, 2, 'Maximum Leverage Ratio', 'Financial', '≤ 3.00x', '2.50x', 'COMPLIANT', 1, datetime.now().isoformat(),
-         'Term Loan Agreement.pdf'),
-        (4, 3, 'Minimum EBITDA', 'Financial', '≥ $5,000,000', '$6,200,000', 'COMPLIANT', 1, datetime.now().isoformat(),
-         'Revolver Agreement.pdf'),
-        (5, 4, 'Current Ratio', 'Financial', '≥ 1.20x', '1.15x', 'AT_RISK', 1, datetime.now().isoformat(),
-         'Bridge Loan Agreement.pdf'),
-    ]
-
-    cursor.executemany('''
-        INSERT OR IGNORE INTO covenants 
-        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    ''', sample_covenants)
-
-    sample_alerts = [
-        (1, 1, 'BREACH', 'Leverage Ratio breach detected: 5.20x (Limit: 4.50x)', 'Active', datetime.now().isoformat()),
-        (2, 1, 'BREACH', 'Interest Coverage breach detected: 2.85x (Required: 3.00x)', 'Active',
-         datetime.now().isoformat()),
-        (3, 4, 'WARNING', 'Current Ratio approaching threshold', 'Active', datetime.now().isoformat()),
-    ]
-
-    cursor.executemany('''
-        INSERT OR IGNORE INTO alerts 
-        VALUES (?, ?, ?, ?, ?, ?)
-    ''', sample_alerts)
-
-    conn.commit()
-    conn.close()
-
-
-def load_data(db_path, query):
-    """Load data from database"""
-    conn = sqlite3.connect(db_path)
-    df = pd.read_sql_query(query, conn)
-    conn.close()
-    return df
-
-
-def get_portfolio_stats(db_path):
-    """Get portfolio statistics"""
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    # Upgrade existing databases in place (also opens the first pooled connection)
+    migrations.migrate(db_path)
 
-    # Total loans
-    cursor.execute("SELECT COUNT(*) FROM loan_agreements WHERE status = 'Active'")
-    total_loans = cursor.fetchone()[0]
-
-    # Total exposure
-    cursor.execute("SELECT SUM(principal_amount) FROM loan_agreements WHERE status = 'Active'")
-    total_exposure = cursor.fetchone()[0] or 0
-
-    # Active breaches
-    cursor.execute("SELECT COUNT(*) FROM covenants WHERE compliance_status = 'BREACH' AND is_active = 1")
-    active_breaches = cursor.fetchone()[0]
-
-    # Compliance rate
-    cursor.execute("SELECT COUNT(*) FROM covenants WHERE is_active = 1")
-    total_covenants = cursor.fetchone()[0]
-
-    if total_covenants > 0:
-        compliance = ((total_covenants - active_breaches) / total_covenants) * 100
-    else:
-        compliance = 100.0
-
-    conn.close()
-
-    return {
-        'total_loans': total_loans,
-        'total_exposure': total_exposure,
-        'active_breaches': active_breaches,
-        'compliance': compliance
-    }
-
-
-def get_banner_status(db_path):
-    """
-    Returns banner with DUAL priorities:
-    1. BREACH alerts (RED - highest priority)
-    2. UPLOAD REMINDERS (YELLOW/ORANGE - missing data)
-    3. UPCOMING TESTS (BLUE - next 7 days)
-    4. ALL GOOD (GREEN - everything compliant)
-    """
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
-    
-    # Priority 1: Check for ACTIVE BREACHES
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM covenants 
-        WHERE compliance_status = 'BREACH' AND is_active = 1
-    """)
-    breach_count = cursor.fetchone()[0]
-    
-    # Priority 2: Check for MISSING FINANCIAL DATA
-    cursor.execute("""
-        SELECT COUNT(*) 
-        FROM covenants 
-        WHERE is_active = 1 
-        AND (current_value IS NULL OR current_value = '' OR current_value = 'N/A')
-    """)
-    missing_data_count = cursor.fetchone()[0]
-    
-    # Priority 3: Get UPCOMING TESTS (simulated)
-    cursor.execute("""
-        SELECT 
-            l.deal_name,
-            c.covenant_name,
-            'Quarterly' as test_frequency
-        FROM covenants c
-        JOIN loan_agreements l ON c.loan_id = l.loan_id
-        WHERE c.is_active = 1
-        AND c.compliance_status != 'BREACH'
-        LIMIT 3
-    """)
-    upcoming_tests = cursor.fetchall()
-    
-    # Get 30-DAY UPCOMING TESTS
-    cursor.execute("""
-        SELECT 
-            l.deal_name,
-            c.covenant_name,
-            c.covenant_type
-        FROM covenants c
-        JOIN loan_agreements l ON c.loan_id = l.loan_id
-        WHERE c.is_active = 1
-        ORDER BY l.deal_name, c.covenant_name
-        LIMIT 10
-    """)
-    upcoming_30_days = cursor.fetchall()
-    
-    conn.close()
-    
-    # RETURN BANNER CONFIG
-    if breach_count > 0:
-        return {
-            'type': 'error',
-            'icon': '🚨',
-            'title': f'{breach_count} COVENANT BREACH(ES) REQUIRE IMMEDIATE ATTENTION',
-            'message': 'Review breaches immediately and contact your lender. Breach alerts are automatically generated when financial data is uploaded.',
-            'priority': 1,
-            'count': breach_count,
-            'upcoming_30': upcoming_30_days
-        }
-    
-    elif missing_data_count > 0:
-        return {
-            'type': 'warning',
-            'icon': '⚠️',
-            'title': f'{missing_data_count} COVENANT(S) MISSING FINANCIAL DATA - UPLOAD REQUIRED',
-            'message': 'Upload quarterly financial statements to enable automatic covenant testing and breach detection. System will calculate compliance immediately upon upload.',
-            'priority': 2,
-            'count': missing_data_count,
-            'upcoming_30': upcoming_30_days
-        }
-    
-    elif len(upcoming_tests) > 0:
-        return {
-            'type': 'info',
-            'icon': '📅',
-            'title': f'{len(upcoming_tests)} COVENANT TEST(S) DUE IN NEXT 7 DAYS',
-            'message': 'Prepare financial statements for upcoming covenant tests. Upload data early to ensure timely compliance monitoring.',
-            'priority': 3,
-            'upcoming_tests': upcoming_tests,
-            'upcoming_30': upcoming_30_days
-        }
-    
-    else:
-        next_upload_days = 25
-        return {
-            'type': 'success',
-            'icon': '✅',
-            'title': 'ALL COVENANTS IN COMPLIANCE - NO IMMEDIATE ACTION REQUIRED',
-            'message': f'Next financial data upload due in approximately {next_upload_days} days. System is actively monitoring all covenants.',
-            'priority': 4,
-            'upcoming_30': upcoming_30_days
-        }
+    return db_path
 
 
-def show_dashboard_banner(db_path):
-    """Display the priority banner on dashboard"""
-    banner = get_banner_status(db_path)
+def show_dashboard_banner(snapshot):
+    """Display the priority banner on dashboard (from the published portfolio snapshot)"""
+    banner = snapshot.banner
     
     # Main banner
     if banner['type'] == 'error':
@@ -353,41 +83,18 @@ def show_dashboard_banner(db_path):
         st.markdown(f"**{banner['message']}**")
         
         with st.expander("🔍 View Breach Details"):
-            breach_query = """
-                SELECT 
-                    l.deal_name as 'Loan',
-                    c.covenant_name as 'Covenant',
-                    c.current_value as 'Current',
-                    c.threshold_text as 'Threshold'
-                FROM covenants c
-                JOIN loan_agreements l ON c.loan_id = l.loan_id
-                WHERE c.compliance_status = 'BREACH' AND c.is_active = 1
-            """
-            conn = sqlite3.connect(db_path)
-            breach_df = pd.read_sql_query(breach_query, conn)
-            conn.close()
-            st.dataframe(breach_df, use_container_width=True, hide_index=True)
+            st.dataframe(snapshot.breach_details, use_container_width=True, hide_index=True)
+            if banner['count'] > len(snapshot.breach_details):
+                st.caption(f"Showing the first {len(snapshot.breach_details)} of {banner['count']} breaches")
     
     elif banner['type'] == 'warning':
         st.warning(f"### {banner['icon']} {banner['title']}")
         st.markdown(f"**{banner['message']}**")
         
         with st.expander("📋 View Covenants Missing Data"):
-            missing_query = """
-                SELECT 
-                    l.deal_name as 'Loan',
-                    c.covenant_name as 'Covenant',
-                    c.covenant_type as 'Type',
-                    c.threshold_text as 'Threshold'
-                FROM covenants c
-                JOIN loan_agreements l ON c.loan_id = l.loan_id
-                WHERE c.is_active = 1 
-                AND (c.current_value IS NULL OR c.current_value = '' OR c.current_value = 'N/A')
-            """
-            conn = sqlite3.connect(db_path)
-            missing_df = pd.read_sql_query(missing_query, conn)
-            conn.close()
-            st.dataframe(missing_df, use_container_width=True, hide_index=True)
+            st.dataframe(snapshot.missing_data_details, use_container_width=True, hide_index=True)
+            if banner['count'] > len(snapshot.missing_data_details):
+                st.caption(f"Showing the first {len(snapshot.missing_data_details)} of {banner['count']} covenants")
             st.info("💡 **Tip:** Go to '📂 Upload Data' to submit financial statements")
     
     elif banner['type'] == 'info':
@@ -396,10 +103,11 @@ def show_dashboard_banner(db_path):
         
         with st.expander("📅 Upcoming Tests (Next 7 Days)"):
             if 'upcoming_tests' in banner:
-                for loan, covenant, freq in banner['upcoming_tests']:
-                    days = 3
-                    test_date = (datetime.now() + timedelta(days=days)).strftime('%b %d, %Y')
-                    st.write(f"• **{loan}** - {covenant} ({freq}) - Due: {test_date}")
+                for loan, covenant, _, freq, test_date in banner['upcoming_tests']:
+                    due = datetime.strptime(test_date, '%Y-%m-%d').strftime('%b %d, %Y')
+                    st.write(f"• **{loan}** - {covenant} ({freq}) - Due: {due}")
+                if banner['count'] > len(banner['upcoming_tests']):
+                    st.caption(f"Showing the first {len(banner['upcoming_tests'])} of {banner['count']:,} tests")
     
     else:
         st.success(f"### {banner['icon']} {banner['title']}")
@@ -411,24 +119,191 @@ def show_dashboard_banner(db_path):
     st.caption("Financial data uploads enable automatic covenant testing and breach alerts")
     
     if 'upcoming_30' in banner and banner['upcoming_30']:
+        today = datetime.now().date()
         upcoming_data = []
-        for i, (loan, covenant, cov_type) in enumerate(banner['upcoming_30']):
-            days_until = (i + 1) * 3
-            test_date = (datetime.now() + timedelta(days=days_until)).strftime('%b %d, %Y')
+        for loan, covenant, cov_type, freq, test_date in banner['upcoming_30']:
+            due = datetime.strptime(test_date, '%Y-%m-%d').date()
+            days_until = (due - today).days
             upcoming_data.append({
                 'Loan': loan,
                 'Covenant': covenant,
                 'Type': cov_type,
-                'Test Date': test_date,
-                'Days': f"{days_until} days"
+                'Frequency': freq,
+                'Test Date': due.strftime('%b %d, %Y'),
+                'Days': "Today" if days_until == 0 else f"{days_until} days"
             })
         
         upcoming_df = pd.DataFrame(upcoming_data)
         st.dataframe(upcoming_df, use_container_width=True, hide_index=True)
+        if banner['upcoming_30_count'] > len(upcoming_data):
+            st.caption(f"Showing the first {len(upcoming_data)} of {banner['upcoming_30_count']:,} tests due in the next 30 days")
     else:
         st.info("No upcoming covenant tests scheduled")
 
 
+# Keyset pagination settings for the list pages
+PAGE_SIZES = [25, 50, 100, 250]
+COUNT_ESTIMATE_CAP = 10_000
+
+# Analytics time periods (days back; None = all history)
+ANALYTICS_PERIODS = {
+    "Last 30 Days": 30,
+    "Last 90 Days": 90,
+    "Last 6 Months": 182,
+    "Last Year": 365,
+    "All Time": None,
+}
+
+# Alerts shown when an alert group is opened
+ALERT_DETAIL_LIMIT = 50
+
+
+def load_keyset_page(db_path, query, key, item_label):
+    """Load one keyset page of a SelectQuery and show page size / prev / next controls"""
+    cursors_key = f"{key}_cursors"
+    signature_key = f"{key}_signature"
+
+    col1, col2, col3, col4 = st.columns([1, 3, 1, 1])
+    with col1:
+        page_size = st.selectbox("Rows per page", PAGE_SIZES, index=1, key=f"{key}_page_size")
+
+    # New filters or page size -> back to the first page
+    sql, params = query.build()
+    signature = (sql, tuple(params), page_size)
+    if st.session_state.get(signature_key) != signature:
+        st.session_state[signature_key] = signature
+        st.session_state[cursors_key] = [None]
+    cursors = st.session_state[cursors_key]
+
+    # Fetch one extra row to know whether a next page exists
+    page_sql, page_params = query.build(after=cursors[-1], limit=page_size + 1)
+    page_df = load_data(db_path, page_sql, page_params)
+    has_next = len(page_df) > page_size
+    page_df = page_df.iloc[:page_size]
+
+    # Bounded count: exact up to the cap, "10,000+" beyond it
+    total = int(load_data(db_path, *query.build_count(COUNT_ESTIMATE_CAP))['n'].iloc[0])
+    total_label = f"{COUNT_ESTIMATE_CAP:,}+" if total > COUNT_ESTIMATE_CAP else f"{total:,}"
+    first_row = (len(cursors) - 1) * page_size
+
+    def next_page():
+        cursors.append(query_builder.cursor_of(page_df.iloc[-1]))
+
+    def previous_page():
+        cursors.pop()
+
+    with col2:
+        if len(page_df) > 0:
+            st.markdown(f"**Showing {first_row + 1:,}–{first_row + len(page_df):,} of {total_label} {item_label}(s)**")
+        else:
+            st.markdown(f"**Showing 0 {item_label}(s)**")
+    with col3:
+        st.button("◀ Previous", key=f"{key}_prev", disabled=len(cursors) == 1, on_click=previous_page)
+    with col4:
+        st.button("Next ▶", key=f"{key}_next", disabled=not has_next, on_click=next_page)
+
+    return query_builder.drop_cursor_columns(page_df)
+
+
+def offer_export(path, label, file_name, mime, key):
+    """Download button for a freshly built export file, which is then deleted"""
+    # Streamlit copies the file into its media store here, so it's offered on the run that
+    # built it only - later reruns don't read the export into memory again
+    try:
+        with open(path, 'rb') as f:
+            st.download_button(label=label, data=f, file_name=file_name, mime=mime, key=key)
+    finally:
+        os.remove(path)
+
+
+def show_query_export(db_path, query, key, file_stem):
+    """Export every row matching the current filters - built only when the user asks for it"""
+    sql, params = query.build()
+    col1, col2, col3 = st.columns([1, 1, 2])
+    with col1:
+        formats = {exports.FORMATS[f][0]: f for f in ['csv', 'parquet', 'arrow', 'xlsx']}
+        fmt = formats[st.selectbox(
+            "Export Format",
+            list(formats),
+            key=f"{key}_export_format",
+            label_visibility="collapsed"
+        )]
+
+    with col2:
+        prepare = st.button("⚙️ Prepare Export", key=f"{key}_export_prepare", use_container_width=True)
+
+    if prepare:
+        with st.spinner("Building export..."):
+            path, rows = exports.export_query(db_path, sql, params, fmt)
+        label, extension, mime = exports.FORMATS[fmt]
+        with col3:
+            offer_export(path, f"📥 Download {label} ({rows:,} rows)", f"{file_stem}{extension}", mime,
+                         f"{key}_export_download")
+
+
+def show_report_export(frames, fmt, key, button_label, file_stem):
+    """Button that builds a report file from page tables, then offers it for download"""
+    if st.button(button_label, key=key):
+        with st.spinner("Building report..."):
+            path = exports.export_frames(frames, fmt, "Covenant Command Center - Portfolio Analytics")
+        label, extension, mime = exports.FORMATS[fmt]
+        offer_export(path, f"📥 Download {label}", f"{file_stem}{extension}", mime, f"{key}_download")
+
+
+def show_bulk_upload(db_path):
+    """Bulk ingestion of a portfolio-wide financials extract (CSV/XLSX, one row per loan and period)"""
+    st.markdown("### 📦 Upload Portfolio Financials")
+    st.caption(
+        "One row per loan and reporting period. Loans are matched on loan_id or deal name; "
+        "recognised columns: " + ", ".join(ingestion.COLUMN_ALIASES) + ".")
+
+    # A new key per import clears the uploader once its file has been spooled and released
+    bulk_file = st.file_uploader(
+        "Choose a CSV or Excel (.xlsx) file",
+        type=['csv', 'xlsx'],
+        key=f"upload_bulk_file_{st.session_state.get('upload_bulk_round', 0)}"
+    )
+    if bulk_file is None:
+        return
+
+    if st.button("📥 Import File", type="primary", key="upload_bulk_import_btn"):
+        progress = st.empty()
+        st.session_state['upload_bulk_round'] = st.session_state.get('upload_bulk_round', 0) + 1
+        try:
+            # Read from a spooled copy on disk, a chunk of rows at a time
+            with st.spinner("Importing financials and re-testing covenants..."), \
+                    upload_spool.spooled(bulk_file) as path:
+                summary = ingestion.ingest_file(
+                    db_path, path, bulk_file.name,
+                    progress=lambda rows: progress.caption(f"📥 {rows:,} rows read..."),
+                )
+        except (ValueError, ImportError) as e:
+            st.error(f"❌ Could not import {bulk_file.name}: {e}")
+            return
+        progress.empty()
+        # Sidebar and banner pick up the import on the next rerun
+        snapshot_worker.refresh_snapshot(db_path)
+
+        retest = summary['retest'] or {'updated': 0, 'alerts': 0}
+        st.success(f"✅ Imported {summary['rows_written']:,} loan-period rows in {summary['seconds']:.1f}s")
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Rows Imported", f"{summary['rows_written']:,}")
+        with col2:
+            st.metric("Loans Re-tested", f"{summary['loans_touched']:,}")
+        with col3:
+            st.metric("Covenants Updated", f"{retest['updated']:,}")
+        with col4:
+            st.metric("Alerts Raised", f"{retest['alerts']:,}")
+
+        if summary['rows_rejected']:
+            st.warning(f"⚠️ {summary['rows_rejected']:,} row(s) skipped")
+            st.dataframe(
+                pd.DataFrame(summary['rejected_samples'], columns=['Row', 'Reason']),
+                use_container_width=True, hide_index=True
+            )
+
+
 # Initialize database
 db_path = get_database_connection()
 
@@ -451,7 +326,9 @@ with st.sidebar:
     
     st.markdown("---")
     st.markdown("### 🎯 Quick Stats")
-    stats = get_portfolio_stats(db_path)
+    # Published by the background snapshot worker - no database reads on this rerun
+    snapshot = snapshot_worker.get_snapshot(db_path)
+    stats = snapshot.stats
     st.metric("Total Loans", stats['total_loans'])
     st.metric("Active Breaches", stats['active_breaches'],
               delta=None if stats['active_breaches'] == 0 else f"-{stats['active_breaches']}", 
@@ -489,7 +366,7 @@ if page == "📊 Dashboard":
         st.markdown('<p style="text-align: right; padding-top: 1rem;"><a href="https://covenantcommandcenter.com" target="_blank" style="color: #0066CC; text-decoration: none; font-weight: bold;">🌐 Visit Website</a></p>', unsafe_allow_html=True)
 
     # Show priority banner system
-    show_dashboard_banner(db_path)
+    show_dashboard_banner(snapshot)
 
     st.markdown("---")
 
@@ -533,287 +410,23 @@ if page == "📊 Dashboard":
 
     # Covenant status table
     st.markdown("### 📋 Covenant Status by Loan")
-    covenant_query = """
-        SELECT 
-            l.deal_name as 'Loan',
-            l.borrower_name as 'Borrower',
-            c.covenant_name as 'Covenant',
-            c.covenant_type as 'Type',
-            c.compliance_status as 'Status',
-            c.current_value as 'Current Value',
-            c.threshold_text as 'Threshold'
-        FROM covenants c
-        LEFT JOIN loan_agreements l ON c.loan_id = l.loan_id
-        WHERE c.is_active = 1
-        ORDER BY 
-            CASE c.compliance_status
-                WHEN 'BREACH' THEN 1
-                WHEN 'AT_RISK' THEN 2
-                WHEN 'COMPLIANT' THEN 3
-                ELSE 4
-            END
-    """
-    covenant_df = load_data(db_path, covenant_query)
+    covenant_df = load_data(db_path, DASHBOARD_COVENANTS_QUERY)
 
 
     # Color code the status column
-    def highlight_status(row):
-        if row['Status'] == 'BREACH':
-            return ['background-color: #ffebee'] * len(row)
-        elif row['Status'] == 'AT_RISK':
-            return ['background-color: #fff3e0'] * len(row)
-        elif row['Status'] == 'COMPLIANT':
-            return ['background-color: #e8f5e9'] * len(row)
-        else:
-            return [''] * len(row)
-
-
-    styled_df = covenant_df.style.apply(highlight_status, axis=1)
-    st.dataframe(styled_df, use_container_width=True, hide_index=True)
+    ui_components.status_dataframe(covenant_df)
 
     # Recent alerts
     st.markdown("### 🔔 Recent Alerts")
-    alerts_query = """
-        SELECT 
-            a.created_at as 'Date',
-            l.deal_name as 'Loan',
-            a.alert_type as 'Type',
-            a.message as 'Message',
-            a.status as 'Status'
-        FROM alerts a
-        JOIN loan_agreements l ON a.loan_id = l.loan_id
-        ORDER BY a.created_at DESC
-        LIMIT 5
-    """
-    alerts_df = load_data(db_path, alerts_query)
+    alerts_df = load_data(db_path, RECENT_ALERTS_QUERY)
 
     if len(alerts_df) > 0:
-        for _, alert in alerts_df.iterrows():
-            if alert['Type'] == 'BREACH':
-                st.error(f"**{alert['Loan']}** - {alert['Message']}")
-            elif alert['Type'] == 'WARNING':
-                st.warning(f"**{alert['Loan']}** - {alert['Message']}")
-            else:
-                st.info(f"**{alert['Loan']}** - {alert['Message']}")
+        ui_components.alert_dataframe(alerts_df)
     else:
         st.info("No recent alerts")
 
 elif page == "📄 Scan Loan Documents":
-    # Header with website link
-    st.empty()  # ← ADD THIS LINE
-    col1, col2 = st.columns([3, 1])
-    with col1:
-        st.markdown('<p class="main-header">📄 Scan Loan Documents</p>', unsafe_allow_html=True)
-    with col2:
-        st.markdown(
-            '<p style="text-align: right; padding-top: 1rem;">'
-            '<a href="https://covenantcommandcenter.com" target="_blank" '
-            'style="color: #0066CC; text-decoration: none; font-weight: bold;">'
-            '🌐 Visit Website</a></p>',
-            unsafe_allow_html=True
-        )
-    
-    # Demo banner
-    st.info("🎯 **DEMO MODE**: Upload functionality shown for demonstration. In production, documents are processed and saved to your portfolio.")
-    
-    # Introduction
-    st.markdown("""
-    ### AI-Powered Covenant Extraction
-    
-    Upload a loan agreement to see our AI extract covenants in real-time with **zero hallucinations**.
-    Our system reads every page including tables, footnotes, and handwritten amendments.
-    """)
-    
-    st.markdown("---")
-    
-    # Upload section (demo only)
-    st.markdown("### 📎 Upload Document")
-    
-    col1, col2 = st.columns([2, 1])
-    
-    with col1:
-        uploaded_file = st.file_uploader(
-            "Choose a PDF or DOCX file",
-            type=['pdf', 'docx'],
-            help="Demo mode: File will not be processed"
-        )
-        
-        if uploaded_file:
-            st.success(f"✅ File selected: {uploaded_file.name} ({uploaded_file.size:,} bytes)")
-            st.info("💡 **Demo Mode**: In production, this would extract covenants and add to your portfolio.")
-    
-    with col2:
-        st.markdown("""
-        **Supported formats:**
-        - ✅ PDF files
-        - ✅ Word documents
-        - ✅ Scanned images
-        - ✅ Up to 500 pages
-        """)
-    
-    # Demo extraction button
-    if uploaded_file:
-        if st.button("🚀 Start Extraction (Demo)", type="primary"):
-            with st.spinner("Extracting covenants..."):
-                import time
-                time.sleep(2)
-                
-                st.success("✅ Extraction complete! (Demo)")
-                
-                st.markdown("#### Sample Results:")
-                results_data = {
-                    "Covenant Name": [
-                        "Maximum Total Net Leverage Ratio",
-                        "Minimum Interest Coverage Ratio", 
-                        "Minimum EBITDA",
-                        "Maximum Capital Expenditures"
-                    ],
-                    "Threshold": ["≤ 4.50x", "≥ 3.00x", "≥ $5,000,000", "≤ $10,000,000"],
-                    "Type": ["Financial", "Financial", "Financial", "Financial"],
-                    "Source": ["AI Vision", "AI Vision", "String Search", "String Search"]
-                }
-                
-                results_df = pd.DataFrame(results_data)
-                st.dataframe(results_df, use_container_width=True)
-                
-                st.info("💡 In production, these covenants would be saved to your portfolio.")
-    
-    st.markdown("---")
-    
-    # How it works
-    st.markdown("## 🤖 How It Works")
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.markdown("""
-        <div style="text-align: center; padding: 20px; background: #f0f8ff; border-radius: 10px;">
-            <h3>1️⃣ AI Vision</h3>
-            <p><strong>GPT-4o Extraction</strong></p>
-            <p>Reads tables, footnotes, amendments</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col2:
-        st.markdown("""
-        <div style="text-align: center; padding: 20px; background: #f0fff0; border-radius: 10px;">
-            <h3>2️⃣ Mapping Table</h3>
-            <p><strong>177 Terms</strong></p>
-            <p>Normalizes covenant names</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    with col3:
-        st.markdown("""
-        <div style="text-align: center; padding: 20px; background: #fff5ee; border-radius: 10px;">
-            <h3>3️⃣ Zero Hallucinations</h3>
-            <p><strong>Evidence-Based</strong></p>
-            <p>Validates accuracy</p>
-        </div>
-        """, unsafe_allow_html=True)
-    
-    st.markdown("---")
-    
-    # Competitive advantage
-    st.markdown("## 🏆 Competitive Advantage")
-    
-    st.markdown("""
-    <div style="background: linear-gradient(135deg, #667eea 0%, #764ba2 100%); padding: 30px; border-radius: 15px; color: white; margin: 20px 0;">
-        <h3 style="color: white; margin-top: 0;">Why We're Different</h3>
-        <p style="font-size: 18px;">Traditional monitoring: <strong>$100/document</strong> manual review, 2-3 days. 
-        <br>We deliver: <strong>10 minutes</strong>, zero missed covenants, <strong>full user control</strong>.</p>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    comparison_data = {
-        "Feature": ["Extraction", "Cost/Doc", "Time", "Footnotes", "Accuracy", "Control"],
-        "Traditional": ["❌ Manual", "$100", "2-3 days", "❌ Missed", "~85%", "❌ Black box"],
-        "Our Platform": ["✅ AI + Human", "$25*", "10 min", "✅ Detected", "~95%", "✅ Full transparency"]
-    }
-    st.dataframe(pd.DataFrame(comparison_data), use_container_width=True, hide_index=True)
-    st.caption("*Based on $2,500/month unlimited")
-    
-    st.markdown("---")
-    
-    # USPTO innovation
-    st.markdown("## 🎓 Patent-Pending Innovation")
-    
-    st.markdown("""
-    <div style="background: #f8f9fa; padding: 25px; border-left: 5px solid #0066cc; border-radius: 5px;">
-        <h3 style="color: #0066cc; margin-top: 0;">USPTO-Worthy Technology</h3>
-        <ul style="font-size: 16px; line-height: 1.8;">
-            <li><strong>Multi-Modal AI Vision</strong>: First covenant extractor using GPT-4 Vision</li>
-            <li><strong>Proprietary Mapping</strong>: 177-term database (36 hours curation)</li>
-            <li><strong>Zero-Hallucination Protocol</strong>: Returns null when uncertain (industry-first)</li>
-            <li><strong>Hierarchical Authority</strong>: Prioritizes table > footnotes > main text</li>
-            <li><strong>Real-Time Breach Detection</strong>: Immediate alerts upon upload</li>
-        </ul>
-    </div>
-    """, unsafe_allow_html=True)
-    
-    st.markdown("---")
-    
-    # User control
-    st.markdown("## 🔐 Full User Control")
-    
-    col1, col2 = st.columns(2)
-    
-    with col1:
-        st.markdown("""
-        ### What You See:
-        - ✅ Every covenant + source
-        - ✅ AI confidence scores
-        - ✅ Match type (AI/String)
-        - ✅ Full text context
-        - ✅ Audit trail
-        """)
-    
-    with col2:
-        st.markdown("""
-        ### What You Control:
-        - ✅ Review/approve extractions
-        - ✅ Override AI decisions
-        - ✅ Add manual covenants
-        - ✅ Customize alerts
-        - ✅ Export anytime
-        """)
-    
-    st.info("💡 **Unlike competitors' black box review, you see exactly how each covenant was extracted.**")
-    
-    st.markdown("---")
-    
-    # Impact
-    st.markdown("## 💰 Business Impact")
-    
-    col1, col2, col3 = st.columns(3)
-    
-    with col1:
-        st.metric("Time Savings", "100hrs → 10min", "99% faster")
-    
-    with col2:
-        st.metric("Cost Savings", "$271K/year", "Per avoided breach")
-    
-    with col3:
-        st.metric("Accuracy", "95%+", "Zero missed")
-    
-    st.markdown("""
-    ### Real-World Results:
-    - **500-page stress test**: 8 covenants in 60 minutes on low Wifi
-    - **Footnote saved $271K**: Detected subordinated debt exclusion
-    - **Table parsing**: Extracted springing covenant thresholds
-    - **Amendment tracking**: Found 3 modifications across 5 amendments
-    """)
-    
-    st.markdown("---")
-    
-    # CTA
-    st.markdown("""
-    <div style="background: linear-gradient(135deg, #f093fb 0%, #f5576c 100%); padding: 30px; border-radius: 15px; color: white; text-align: center;">
-        <h2 style="color: white;">Ready to Transform Covenant Monitoring?</h2>
-        <p style="font-size: 18px;">Beta: <strong>$99/month lifetime</strong> (normally $999/month)</p>
-        <p>🚀 Built in 21 days with AI | 🏆 Hackathon 2026 Finalist</p>
-    </div>
-    """, unsafe_allow_html=True)
+    scan_documents_page.show_scan_documents_page(db_path)
 
 elif page == "📋 Covenant Status":
     st.empty()  # ← ADD THIS LINE
@@ -829,8 +442,7 @@ elif page == "📋 Covenant Status":
         )
 
     with col2:
-        loan_query = "SELECT DISTINCT deal_name FROM loan_agreements ORDER BY deal_name"
-        loans = load_data(db_path, loan_query)
+        loans = load_data(db_path, LOAN_NAMES_QUERY)
         loan_filter = st.multiselect(
             "Filter by Loan",
             loans['deal_name'].tolist(),
@@ -844,70 +456,21 @@ elif page == "📋 Covenant Status":
             default=["Financial"]
         )
 
-    # Build query with filters
-    where_clauses = []
-    if status_filter:
-        status_list = "','".join(status_filter)
-        where_clauses.append(f"c.compliance_status IN ('{status_list}')")
-    if loan_filter:
-        loan_list = "','".join(loan_filter)
-        where_clauses.append(f"l.deal_name IN ('{loan_list}')")
-    if covenant_type_filter:
-        type_list = "','".join(covenant_type_filter)
-        where_clauses.append(f"c.covenant_type IN ('{type_list}')")
-
-    where_clause = " AND " + " AND ".join(where_clauses) if where_clauses else ""
-
-    covenant_query = f"""
-        SELECT 
-            l.deal_name as 'Loan',
-            l.borrower_name as 'Borrower',
-            c.covenant_name as 'Covenant Name',
-            c.covenant_type as 'Type',
-            c.compliance_status as 'Status',
-            c.current_value as 'Current Value',
-            c.threshold_text as 'Threshold',
-            c.source_document as 'Source Document'
-        FROM covenants c
-        LEFT JOIN loan_agreements l ON c.loan_id = l.loan_id
-        WHERE c.is_active = 1 {where_clause}
-        ORDER BY 
-            CASE c.compliance_status
-                WHEN 'BREACH' THEN 1
-                WHEN 'AT_RISK' THEN 2
-                WHEN 'COMPLIANT' THEN 3
-                ELSE 4
-            END,
-            l.deal_name
-    """
-
-    covenant_df = load_data(db_path, covenant_query)
-
-    st.markdown(f"**Showing {len(covenant_df)} covenant(s)**")
-
-
-    def highlight_status(row):
-        if row['Status'] == 'BREACH':
-            return ['background-color: #ffebee'] * len(row)
-        elif row['Status'] == 'AT_RISK':
-            return ['background-color: #fff3e0'] * len(row)
-        elif row['Status'] == 'COMPLIANT':
-            return ['background-color: #e8f5e9'] * len(row)
-        else:
-            return [''] * len(row)
+    # Build query with filters (bound parameters, stable SQL per filter shape)
+    covenant_query = query_builder.covenant_status_query(
+        statuses=status_filter,
+        deal_names=loan_filter,
+        covenant_types=covenant_type_filter,
+    )
 
+    # One keyset page at a time
+    covenant_df = load_keyset_page(db_path, covenant_query, "covenant_status", "covenant")
 
-    styled_df = covenant_df.style.apply(highlight_status, axis=1)
-    st.dataframe(styled_df, use_container_width=True, hide_index=True, height=600)
 
-    # Export button
-    csv = covenant_df.to_csv(index=False)
-    st.download_button(
-        label="📥 Export to CSV",
-        data=csv,
-        file_name="covenant_status.csv",
-        mime="text/csv"
-    )
+    ui_components.status_dataframe(covenant_df, height=600)
+
+    # Export (all matching covenants, not just this page)
+    show_query_export(db_path, covenant_query, "covenant_status", "covenant_status")
     
 elif page == "🚨 Alerts":
     # FORCE CLEAN SLATE
@@ -918,21 +481,13 @@ elif page == "🚨 Alerts":
     
     st.markdown('<p class="main-header">🚨 Alerts & Notifications</p>', unsafe_allow_html=True)
 
-    # Alert summary
-    alerts_summary_query = """
-        SELECT 
-            alert_type,
-            COUNT(*) as count
-        FROM alerts
-        WHERE status = 'Active'
-        GROUP BY alert_type
-    """
-    summary = load_data(db_path, alerts_summary_query)
+    # Alert summary (trigger-maintained counts)
+    summary = load_data(db_path, ALERT_SUMMARY_QUERY)
 
     col1, col2, col3 = st.columns(3)
-    breach_count = summary[summary['alert_type'] == 'BREACH']['count'].sum() if 'BREACH' in summary['alert_type'].values else 0
-    warning_count = summary[summary['alert_type'] == 'WARNING']['count'].sum() if 'WARNING' in summary['alert_type'].values else 0
-    info_count = summary[summary['alert_type'] == 'INFO']['count'].sum() if 'INFO' in summary['alert_type'].values else 0
+    breach_count = summary['active_breach_alerts'].sum()
+    warning_count = summary['active_warning_alerts'].sum()
+    info_count = summary['active_info_alerts'].sum()
 
     with col1:
         st.metric("🚨 Breach Alerts", int(breach_count))
@@ -955,63 +510,34 @@ elif page == "🚨 Alerts":
         key="alerts_status_filter"  # ← ADD UNIQUE KEY
     )
 
-    # Build query
-    type_clause = ""
-    if alert_type_filter:
-        type_list = "','".join(alert_type_filter)
-        type_clause = f"AND a.alert_type IN ('{type_list}')"
-
-    status_clause = "" if status_filter == "All" else f"AND a.status = '{status_filter}'"
-
-    alerts_query = f"""
-        SELECT 
-            a.created_at as 'Date',
-            l.deal_name as 'Loan',
-            l.borrower_name as 'Borrower',
-            a.alert_type as 'Type',
-            a.message as 'Message',
-            a.status as 'Status'
-        FROM alerts a
-        JOIN loan_agreements l ON a.loan_id = l.loan_id
-        WHERE 1=1 {type_clause} {status_clause}
-        ORDER BY 
-            CASE a.alert_type
-                WHEN 'BREACH' THEN 1
-                WHEN 'CRITICAL' THEN 2
-                WHEN 'WARNING' THEN 3
-                ELSE 4
-            END,
-            a.created_at DESC
-    """
-
-    alerts_df = load_data(db_path, alerts_query)
-
-    st.markdown(f"**Showing {len(alerts_df)} alert(s)**")
-
-    # Display alerts as cards
-    for idx, alert in alerts_df.iterrows():
-        with st.container():
-            if alert['Type'] == 'BREACH':
-                st.error(f"""
-                **🚨 {alert['Type']}** - {alert['Date'][:10]}  
-                **Loan:** {alert['Loan']} ({alert['Borrower']})  
-                **Message:** {alert['Message']}  
-                **Status:** {alert['Status']}
-                """)
-            elif alert['Type'] == 'WARNING':
-                st.warning(f"""
-                **⚠️ {alert['Type']}** - {alert['Date'][:10]}  
-                **Loan:** {alert['Loan']} ({alert['Borrower']})  
-                **Message:** {alert['Message']}  
-                **Status:** {alert['Status']}
-                """)
-            else:
-                st.info(f"""
-                **ℹ️ {alert['Type']}** - {alert['Date'][:10]}  
-                **Loan:** {alert['Loan']} ({alert['Borrower']})  
-                **Message:** {alert['Message']}  
-                **Status:** {alert['Status']}
-                """)
+    # Build queries (bound parameters, stable SQL per filter shape)
+    status_value = None if status_filter == "All" else status_filter
+    groups_query = query_builder.alert_groups_query(alert_types=alert_type_filter, status=status_value)
+    alerts_query = query_builder.alerts_query(alert_types=alert_type_filter, status=status_value)
+
+    # One keyset page of alert groups (loan + type) at a time, as a single table
+    groups_df = load_keyset_page(db_path, groups_query, "alerts", "alert group")
+    ui_components.alert_dataframe(groups_df.drop(columns=['loan_id']))
+
+    # Individual alerts only for the group the user opens
+    group_labels = [
+        f"{group['Loan']} - {group['Type']} ({group['Alerts']})" for _, group in groups_df.iterrows()
+    ]
+    selected_group = st.selectbox(
+        "Show alerts for",
+        ["—"] + group_labels,
+        key="alerts_detail_group"
+    )
+    if selected_group != "—":
+        group = groups_df.iloc[group_labels.index(selected_group)]
+        details_query = query_builder.alert_details_query(int(group['loan_id']), group['Type'], status_value)
+        details_df = load_data(db_path, *details_query.build(limit=ALERT_DETAIL_LIMIT))
+        st.dataframe(query_builder.drop_cursor_columns(details_df), use_container_width=True, hide_index=True)
+        if group['Alerts'] > ALERT_DETAIL_LIMIT:
+            st.caption(f"Showing the latest {ALERT_DETAIL_LIMIT} of {group['Alerts']:,} alerts - export for the full list")
+
+    # Export (all matching alerts, not just this page)
+    show_query_export(db_path, alerts_query, "alerts", "alerts")
 
 elif page == "📤 Upload Data":
     # FORCE CLEAN SLATE - same pattern as working Alerts page
@@ -1022,135 +548,151 @@ elif page == "📤 Upload Data":
         st.markdown('<p class="main-header">📤 Upload Financial Data</p>', unsafe_allow_html=True)
 
         st.info(
-            "This is a demo version. In the full application, you can upload quarterly financial statements to trigger covenant testing.")
-
-        # Loan selection
-        loan_query = "SELECT loan_id, deal_name, borrower_name FROM loan_agreements WHERE status = 'Active' ORDER BY deal_name"
-        loans = load_data(db_path, loan_query)
-
-        selected_loan = st.selectbox(
-            "Select Loan",
-            loans['deal_name'].tolist(),
-            key="upload_loan_select"  # ← Add unique key
+            "Submitted financials are saved for the selected loan and period. The loan's covenants are re-tested "
+            "and alerts are raised for any status change.")
+
+        upload_mode = st.radio(
+            "Upload Type",
+            ["Single Loan", "Portfolio File (bulk)"],
+            horizontal=True,
+            key="upload_mode"
         )
 
-        # Period selection
-        current_year = datetime.now().year
-        periods = [f"{year}-Q{q}" for year in range(current_year - 2, current_year + 1) for q in range(1, 5)]
-        selected_period = st.selectbox(
-            "Select Reporting Period", 
-            periods, 
-            index=len(periods) - 1,
-            key="upload_period_select"  # ← Add unique key
-        )
-
-        # File upload
-        st.markdown("### 📎 Upload Financial Statement")
-        uploaded_file = st.file_uploader(
-            "Choose an Excel or CSV file", 
-            type=['xlsx', 'xls', 'csv'],
-            key="upload_file_uploader"  # ← Add unique key
-        )
-
-        if uploaded_file is not None:
-            st.success(f"✅ File '{uploaded_file.name}' uploaded successfully!")
-
-            # In real version, would parse file and extract financial metrics
-            st.markdown("### 📊 Financial Metrics (Demo)")
-
-            col1, col2 = st.columns(2)
-            with col1:
-                total_debt = st.number_input(
-                    "Total Debt ($)", 
-                    value=45000000, 
-                    format="%d",
-                    key="upload_total_debt"  # ← Add unique key
-                )
-                ebitda = st.number_input(
-                    "EBITDA ($)", 
-                    value=8500000, 
-                    format="%d",
-                    key="upload_ebitda"  # ← Add unique key
-                )
-                interest_expense = st.number_input(
-                    "Interest Expense ($)", 
-                    value=3000000, 
-                    format="%d",
-                    key="upload_interest"  # ← Add unique key
-                )
-
-            with col2:
-                current_assets = st.number_input(
-                    "Current Assets ($)", 
-                    value=15000000, 
-                    format="%d",
-                    key="upload_current_assets"  # ← Add unique key
-                )
-                current_liabilities = st.number_input(
-                    "Current Liabilities ($)", 
-                    value=12000000, 
-                    format="%d",
-                    key="upload_current_liab"  # ← Add unique key
-                )
-                net_worth = st.number_input(
-                    "Net Worth ($)", 
-                    value=25000000, 
-                    format="%d",
-                    key="upload_net_worth"  # ← Add unique key
-                )
-
-            if st.button("🔍 Calculate Covenants", type="primary", key="upload_calculate_btn"):
-                with st.spinner("Analyzing financial data and testing covenants..."):
-                    import time
-                    time.sleep(2)  # Simulate processing
-
-                    st.success("✅ Covenant testing complete!")
-
-                    # Show sample results
-                    st.markdown("### 📋 Covenant Test Results")
-
-                    leverage = total_debt / ebitda if ebitda > 0 else 0
-                    interest_coverage = ebitda / interest_expense if interest_expense > 0 else 0
-                    current_ratio = current_assets / current_liabilities if current_liabilities > 0 else 0
-
-                    results = [
-                        {
-                            "Covenant": "Maximum Leverage Ratio", 
-                            "Threshold": "≤ 4.50x", 
-                            "Actual": f"{leverage:.2f}x",
-                            "Status": "BREACH" if leverage > 4.5 else "COMPLIANT"
-                        },
-                        {
-                            "Covenant": "Minimum Interest Coverage", 
-                            "Threshold": "≥ 3.00x",
-                            "Actual": f"{interest_coverage:.2f}x",
-                            "Status": "BREACH" if interest_coverage < 3.0 else "COMPLIANT"
-                        },
-                        {
-                            "Covenant": "Minimum Current Ratio", 
-                            "Threshold": "≥ 1.20x", 
-                            "Actual": f"{current_ratio:.2f}x",
-                            "Status": "COMPLIANT" if current_ratio >= 1.2 else "AT_RISK"
-                        },
-                    ]
-
-                    results_df = pd.DataFrame(results)
-
-                    def highlight_status(row):
-                        if row['Status'] == 'BREACH':
-                            return ['background-color: #ffebee'] * len(row)
-                        elif row['Status'] == 'AT_RISK':
-                            return ['background-color: #fff3e0'] * len(row)
+        if upload_mode == "Portfolio File (bulk)":
+            show_bulk_upload(db_path)
+        else:
+            # Loan selection
+            loans = load_data(db_path, ACTIVE_LOANS_QUERY)
+
+            selected_loan = st.selectbox(
+                "Select Loan",
+                loans['deal_name'].tolist(),
+                key="upload_loan_select"  # ← Add unique key
+            )
+
+            # Period selection
+            current_year = datetime.now().year
+            periods = [f"{year}-Q{q}" for year in range(current_year - 2, current_year + 1) for q in range(1, 5)]
+            selected_period = st.selectbox(
+                "Select Reporting Period", 
+                periods, 
+                index=len(periods) - 1,
+                key="upload_period_select"  # ← Add unique key
+            )
+
+            # File upload
+            st.markdown("### 📎 Upload Financial Statement")
+            upload_round = st.session_state.get('upload_file_round', 0)
+            uploaded_file = st.file_uploader(
+                "Choose an Excel or CSV file", 
+                type=['xlsx', 'xls', 'csv'],
+                key=f"upload_file_uploader_{upload_round}"
+            )
+            if uploaded_file is not None:
+                # The form only uses the file's name: keep it, drop Streamlit's in-memory copy and clear the uploader
+                st.session_state['upload_file_name'] = uploaded_file.name
+                upload_spool.release_upload(uploaded_file)
+                st.session_state['upload_file_round'] = upload_round + 1
+                st.rerun()
+
+            uploaded_name = st.session_state.get('upload_file_name')
+            if uploaded_name is not None:
+                st.success(f"✅ File '{uploaded_name}' uploaded successfully!")
+
+                # In real version, would parse file and extract financial metrics
+                st.markdown("### 📊 Financial Metrics (Demo)")
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    total_debt = st.number_input(
+                        "Total Debt ($)", 
+                        value=45000000, 
+                        format="%d",
+                        key="upload_total_debt"  # ← Add unique key
+                    )
+                    ebitda = st.number_input(
+                        "EBITDA ($)", 
+                        value=8500000, 
+                        format="%d",
+                        key="upload_ebitda"  # ← Add unique key
+                    )
+                    interest_expense = st.number_input(
+                        "Interest Expense ($)", 
+                        value=3000000, 
+                        format="%d",
+                        key="upload_interest"  # ← Add unique key
+                    )
+
+                with col2:
+                    current_assets = st.number_input(
+                        "Current Assets ($)", 
+                        value=15000000, 
+                        format="%d",
+                        key="upload_current_assets"  # ← Add unique key
+                    )
+                    current_liabilities = st.number_input(
+                        "Current Liabilities ($)", 
+                        value=12000000, 
+                        format="%d",
+                        key="upload_current_liab"  # ← Add unique key
+                    )
+                    net_worth = st.number_input(
+                        "Net Worth ($)", 
+                        value=25000000, 
+                        format="%d",
+                        key="upload_net_worth"  # ← Add unique key
+                    )
+
+                if st.button("🔍 Calculate Covenants", type="primary", key="upload_calculate_btn"):
+                    with st.spinner("Analyzing financial data and testing covenants..."):
+                        loan_id = loans.loc[loans['deal_name'] == selected_loan, 'loan_id'].iloc[0]
+                        upload = covenant_engine.record_financials(db_path, loan_id, selected_period, {
+                            'total_debt': total_debt,
+                            'ebitda': ebitda,
+                            'interest_expense': interest_expense,
+                            'current_assets': current_assets,
+                            'current_liabilities': current_liabilities,
+                            'net_worth': net_worth,
+                        })
+                        snapshot_worker.refresh_snapshot(db_path)
+                        tested = upload['results']
+
+                        if upload['is_latest']:
+                            st.success(f"✅ Financials saved and covenant testing complete! "
+                                       f"{upload['updated']} covenant(s) updated.")
                         else:
-                            return ['background-color: #e8f5e9'] * len(row)
-
-                    styled_results = results_df.style.apply(highlight_status, axis=1)
-                    st.dataframe(styled_results, use_container_width=True, hide_index=True)
-
-                    # Show breach alert if any
-                    breaches = results_df[results_df['Status'] == 'BREACH']
-                    if len(breaches) > 0:
-                        st.error(f"🚨 {len(breaches)} covenant breach(es) detected! Alerts have been sent to stakeholders.")
+                            st.info(f"💾 Financials saved for {selected_period}. Covenants are tested against "
+                                    f"the loan's latest period, so current statuses were not changed.")
+
+                        # Show test results for this loan's covenants
+                        st.markdown("### 📋 Covenant Test Results")
+
+                        results_df = pd.DataFrame({
+                            "Covenant": tested['covenant_name'],
+                            "Threshold": tested['threshold_text'],
+                            "Actual": [covenant_engine.format_value(v, u)
+                                       for v, u in zip(tested['tested_value'], tested['threshold_unit'])],
+                            "Status": tested['tested_status'],
+                        })
+
+                        ui_components.status_dataframe(results_df)
+
+                        # Show the alerts raised by status changes, if any
+                        breaches = [message for _, alert_type, message in upload['alerts'] if alert_type == 'BREACH']
+                        if breaches:
+                            st.error(f"🚨 {len(breaches)} new covenant breach(es) detected! Alerts have been raised.")
+                        for _, alert_type, message in upload['alerts']:
+                            st.caption(f"🔔 {alert_type}: {message}")
+
+                        # Every period this loan has been tested for, including restated ones
+                        history = load_data(db_path, LOAN_TEST_HISTORY_QUERY, [int(loan_id)])
+                        if len(history):
+                            st.markdown("### 🕑 Test History")
+                            actual = [covenant_engine.format_value(v, u)
+                                      for v, u in zip(history['tested_value'], history['threshold_unit'])]
+                            history = history.drop(columns=['tested_value', 'threshold_unit'])
+                            history.insert(2, 'Actual', actual)
+                            ui_components.status_dataframe(history)
 
 elif page == "📊 Analytics":
     # FORCE CLEAN SLATE
@@ -1163,66 +705,76 @@ elif page == "📊 Analytics":
         # Time period filter
         time_period = st.selectbox(
             "Time Period",
-            ["Last 30 Days", "Last 90 Days", "Last 6 Months", "Last Year", "All Time"],
+            list(ANALYTICS_PERIODS),
             key="analytics_time_period"  # ← Add unique key
         )
+        period_days = ANALYTICS_PERIODS[time_period]
+        end_month = rollup_month()
+        start_month = rollup_month(period_days) if period_days else '0000-00'
 
         # Portfolio size metrics
         st.markdown("### 📈 Portfolio Overview")
-        
+
+        trend_counts = load_data(db_path, STATUS_TREND_QUERY, [start_month, start_month])
+        opening_month = trend_counts['month'].min() if len(trend_counts) else None
+        opening_covenants = (
+            int(trend_counts.loc[trend_counts['month'] == opening_month, 'covenants'].sum()) if opening_month else None
+        )
+
         col1, col2, col3, col4 = st.columns(4)
         with col1:
-            st.metric("Total Loans", "47", delta="3")
+            st.metric("Total Loans", f"{stats['total_loans']:,}")
         with col2:
-            st.metric("Total Exposure", "$2.8B", delta="$150M")
+            st.metric("Total Exposure", f"${stats['total_exposure'] / 1e9:.1f}B")
         with col3:
-            st.metric("Avg. Loan Size", "$59.6M", delta="2%")
+            avg_size = stats['total_exposure'] / stats['total_loans'] if stats['total_loans'] else 0
+            st.metric("Avg. Loan Size", f"${avg_size / 1e6:.1f}M")
         with col4:
-            st.metric("Active Covenants", "423", delta="12")
+            st.metric(
+                "Active Covenants", f"{stats['active_covenants']:,}",
+                delta=None if opening_covenants is None else f"{stats['active_covenants'] - opening_covenants:+,}"
+            )
 
-        # Covenant compliance trend
+        # Covenant compliance trend (month-end % of active covenants)
         st.markdown("### 📉 Covenant Compliance Trend")
-        
-        trend_data = pd.DataFrame({
-            'Month': ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun'],
-            'Compliant': [95, 94, 96, 93, 95, 94],
-            'At Risk': [3, 4, 2, 5, 3, 4],
-            'Breach': [2, 2, 2, 2, 2, 2]
-        })
-        
-        st.line_chart(trend_data.set_index('Month'))
+
+        trend_start = start_month if period_days else (opening_month or end_month)
+        trend_data = get_compliance_trend(db_path, trend_start, end_month)
+        if len(trend_data):
+            st.line_chart(trend_data)
+        else:
+            st.info("No covenant history yet")
 
         # Covenant type distribution
         st.markdown("### 📊 Covenant Type Distribution")
-        
-        covenant_types = pd.DataFrame({
-            'Type': ['Leverage Ratio', 'Interest Coverage', 'Current Ratio', 'Net Worth', 'Debt Service Coverage'],
-            'Count': [89, 76, 68, 54, 46]
-        })
-        
+
+        covenant_types = load_data(db_path, COVENANT_TYPE_QUERY)
         st.bar_chart(covenant_types.set_index('Type'))
 
         # Top breaches by borrower
-        st.markdown("### 🚨 Breach Frequency by Borrower (Last 12 Months)")
-        
-        breach_data = pd.DataFrame({
-            'Borrower': ['ABC Corp', 'XYZ Industries', 'Tech Innovations Inc', '123 Manufacturing', 'Global Services LLC'],
-            'Total Breaches': [5, 4, 3, 3, 2],
-            'Current Status': ['At Risk', 'Compliant', 'At Risk', 'Compliant', 'Compliant']
-        })
-        
-        st.dataframe(breach_data, use_container_width=True, hide_index=True)
+        st.markdown(f"### 🚨 Breach Frequency by Borrower ({time_period})")
+
+        breach_data = load_data(db_path, BREACHES_BY_BORROWER_QUERY, [start_month])
+        if len(breach_data):
+            st.dataframe(breach_data, use_container_width=True, hide_index=True)
+        else:
+            st.success("No new breaches in this period")
+
+        trend_data = trend_data.reset_index()
 
         # Export options
         st.markdown("### 📥 Export Analytics")
         
+        analytics_frames = {
+            'Compliance Trend': trend_data,
+            'Covenant Types': covenant_types,
+            'Breaches by Borrower': breach_data,
+        }
         export_col1, export_col2 = st.columns(2)
         with export_col1:
-            if st.button("📊 Export to Excel", key="analytics_export_excel"):
-                st.success("Excel report generated! (Demo mode)")
+            show_report_export(analytics_frames, 'xlsx', "analytics_export_excel", "📊 Export to Excel", "portfolio_analytics")
         with export_col2:
-            if st.button("📄 Generate PDF Report", key="analytics_export_pdf"):
-                st.success("PDF report generated! (Demo mode)")
+            show_report_export(analytics_frames, 'pdf', "analytics_export_pdf", "📄 Generate PDF Report", "portfolio_analytics")
 
 # Footer
 st.markdown("---")
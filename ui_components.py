@@ -0,0 +1,83 @@
+"""
+🎨 COVENANT COMMAND CENTER - UI COMPONENTS
+Shared rendering helpers for the Streamlit pages
+
+Status grids are coloured with one whole-frame Styler pass (CSS built
+column-wise from the status column, no per-row callbacks). Above
+STYLED_ROW_LIMIT rows the Styler is skipped entirely and the status is
+marked with an icon instead, so large grids render as plain DataFrames.
+Alert lists render as one table rather than one widget per alert.
+"""
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+# Row background per compliance status
+STATUS_COLORS = {
+    'BREACH': '#ffebee',
+    'AT_RISK': '#fff3e0',
+    'COMPLIANT': '#e8f5e9',
+}
+
+# Status marker used when a grid is too large to style
+STATUS_ICONS = {
+    'BREACH': '🔴',
+    'AT_RISK': '🟠',
+    'COMPLIANT': '🟢',
+}
+
+# Styler output grows with rows x columns; beyond this, render unstyled
+STYLED_ROW_LIMIT = 1000
+
+
+def status_css(df, status_column='Status'):
+    """CSS for every cell of df, coloured by the row's status (one vectorized pass)"""
+    css = df[status_column].map(STATUS_COLORS)
+    css = ('background-color: ' + css).fillna('')
+    return pd.DataFrame(
+        np.repeat(css.to_numpy()[:, None], df.shape[1], axis=1),
+        index=df.index,
+        columns=df.columns,
+    )
+
+
+def style_status(df, status_column='Status'):
+    """Styler colouring whole rows by status"""
+    return df.style.apply(status_css, axis=None, status_column=status_column)
+
+
+def mark_status(df, status_column='Status'):
+    """Copy of df with an icon in front of each status (unstyled alternative to style_status)"""
+    icons = df[status_column].map(STATUS_ICONS).fillna('⚪')
+    return df.assign(**{status_column: icons + ' ' + df[status_column].fillna('').astype(str)})
+
+
+def status_dataframe(df, status_column='Status', row_limit=STYLED_ROW_LIMIT, **kwargs):
+    """st.dataframe for a grid with a status column - styled when small, icon-marked when large"""
+    kwargs.setdefault('use_container_width', True)
+    kwargs.setdefault('hide_index', True)
+    if status_column not in df.columns or len(df) == 0:
+        return st.dataframe(df, **kwargs)
+    if len(df) <= row_limit:
+        return st.dataframe(style_status(df, status_column), **kwargs)
+    return st.dataframe(mark_status(df, status_column), **kwargs)
+
+
+# Alert type marker for alert tables
+ALERT_ICONS = {
+    'BREACH': '🚨',
+    'CRITICAL': '🛑',
+    'WARNING': '⚠️',
+    'INFO': 'ℹ️',
+}
+
+
+def alert_dataframe(df, type_column='Type', **kwargs):
+    """One st.dataframe for a list of alerts or alert groups, with the type marked by an icon"""
+    kwargs.setdefault('use_container_width', True)
+    kwargs.setdefault('hide_index', True)
+    if type_column in df.columns and len(df):
+        icons = df[type_column].map(ALERT_ICONS).fillna('🔔')
+        df = df.assign(**{type_column: icons + ' ' + df[type_column].fillna('').astype(str)})
+    return st.dataframe(df, **kwargs)
@@ -0,0 +1,128 @@
+"""
+📦 COVENANT COMMAND CENTER - UPLOAD SPOOL
+Moves uploaded files out of the server's memory into managed temp files
+
+Streamlit keeps every uploaded file in memory for as long as its widget
+holds it. Before a large upload is processed it is copied to disk in
+fixed-size chunks, and Streamlit's in-memory copy is dropped, so the
+pipeline reads the document from the spooled file a piece at a time and
+memory per upload stays at a few MB however large the document is.
+
+Spooled files live in one directory under the system temp dir. Each is
+deleted when its with-block ends; anything left behind by a crashed
+process is swept once it is STALE_AFTER seconds old, and live files are
+removed at interpreter exit.
+"""
+
+import atexit
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+SPOOL_DIR = os.path.join(tempfile.gettempdir(), "covenant_uploads")
+CHUNK_SIZE = 1024 * 1024  # bytes copied at a time
+STALE_AFTER = 6 * 60 * 60  # seconds before an orphaned spool file is swept
+
+# Spool files in use by this process (removed at exit if still present)
+_active = set()
+_active_lock = threading.Lock()
+_swept = False
+
+
+def sweep_stale(max_age=STALE_AFTER):
+    """Delete spool files older than max_age that no live upload is using; returns files removed"""
+    removed = 0
+    now = time.time()
+    try:
+        entries = list(os.scandir(SPOOL_DIR))
+    except FileNotFoundError:
+        return 0
+    for entry in entries:
+        try:
+            if entry.path not in _active and now - entry.stat().st_mtime > max_age:
+                os.unlink(entry.path)
+                removed += 1
+        except OSError:
+            pass  # another process removed it first
+    return removed
+
+
+def release_upload(uploaded_file):
+    """Drop Streamlit's in-memory copy of an uploaded file (best effort; returns True if dropped)"""
+    try:
+        from streamlit.runtime import get_instance
+        from streamlit.runtime.scriptrunner import get_script_run_ctx
+
+        ctx = get_script_run_ctx()
+        get_instance().uploaded_file_mgr.remove_file(session_id=ctx.session_id, file_id=uploaded_file.file_id)
+    except Exception:  # not running under a Streamlit server, or an upload manager without remove_file
+        return False
+    return True
+
+
+def spool(uploaded_file, release=True, directory=None):
+    """Copy an uploaded file (any binary file object with a .name) to a new spool file; returns its path
+
+    With a directory the copy is made there and belongs to the caller: it is
+    never swept or removed at exit (queued jobs outlive the process).
+    """
+    global _swept
+    os.makedirs(directory or SPOOL_DIR, exist_ok=True)
+    if directory is None and not _swept:
+        _swept = True
+        sweep_stale()
+
+    extension = os.path.splitext(getattr(uploaded_file, 'name', '') or '')[1].lower()
+    fd, path = tempfile.mkstemp(prefix="upload-", suffix=extension, dir=directory or SPOOL_DIR)
+    with _active_lock:
+        _active.add(path)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            uploaded_file.seek(0)
+            shutil.copyfileobj(uploaded_file, f, CHUNK_SIZE)
+    except BaseException:
+        discard(path)
+        raise
+    if directory is not None:
+        with _active_lock:
+            _active.discard(path)
+
+    if release:
+        release_upload(uploaded_file)
+        # The file object's own buffer goes with it once the caller drops it
+        uploaded_file.close()
+    return path
+
+
+def discard(path):
+    """Delete a spool file"""
+    with _active_lock:
+        _active.discard(path)
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+@contextmanager
+def spooled(uploaded_file, release=True):
+    """Spool an upload for the duration of a with-block: `with spooled(upload) as path:`"""
+    path = spool(uploaded_file, release)
+    try:
+        yield path
+    finally:
+        discard(path)
+
+
+def discard_all():
+    """Delete every spool file this process still has (registered at exit)"""
+    with _active_lock:
+        paths = list(_active)
+    for path in paths:
+        discard(path)
+
+
+atexit.register(discard_all)